@@ -0,0 +1,148 @@
+import numpy as np
+
+
+class AmountIndex:
+    """Sorted view of an analysis' amounts for fast range, threshold and top-k queries
+
+    Built once per analysis: amounts are sorted into a float64 array with
+    argsort back-pointers to the original records and a prefix sum, so the
+    count and total of any value range take two binary searches instead of
+    a scan. Missing amounts (NaN) are left out.
+    """
+
+    def __init__(self, amounts, pages=None):
+        values = np.asarray(amounts, dtype=np.float64)
+        keep = ~np.isnan(values)
+        positions = np.flatnonzero(keep)  # Record number of every indexed amount
+        values = values[keep]
+        order = np.argsort(values, kind='stable')
+        self.sorted = values[order]
+        self.order = positions[order]  # Sorted slot -> original record number
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.sorted)])
+        self.pages = None
+        if pages is not None:
+            self.pages = np.asarray(_page_values(pages), dtype=np.float64)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build an index from amount records (dicts with 'amount' and optionally 'page')"""
+        return cls(
+            [record['amount'] for record in records],
+            pages=[record.get('page') for record in records]
+        )
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build an index from a frame with an 'amount' and optionally a 'page' column"""
+        return cls(
+            frame['amount'].to_numpy(dtype=np.float64),
+            pages=frame['page'].to_numpy(dtype=np.float64) if 'page' in frame else None
+        )
+
+    @classmethod
+    def from_store(cls, store):
+        """Build an index from an AmountStore, with prefix sums exact to the minor unit
+
+        The prefix sum is accumulated in int64 minor units, so range totals
+        do not drift however many amounts are indexed.
+        """
+        index = cls.__new__(cls)
+        order = np.argsort(store.minor, kind='stable')
+        minor = store.minor[order]
+        index.sorted = minor / store.scale
+        index.order = order
+        if len(minor) and int(np.abs(minor).max()) * len(minor) < 2 ** 63:
+            index.prefix = np.concatenate([[0], np.cumsum(minor)]) / store.scale
+        else:
+            index.prefix = np.concatenate([[0.0], np.cumsum(index.sorted)])
+        index.pages = None
+        if store.page is not None:
+            index.pages = np.where(store.page > 0, store.page, np.nan)
+        return index
+
+    def scaled(self, rate):
+        """Return an index of the same records with every amount multiplied by a positive rate
+
+        Scaling keeps the sort order, so nothing is sorted again (used for
+        currency conversion).
+        """
+        index = AmountIndex.__new__(AmountIndex)
+        index.sorted = self.sorted * rate
+        index.order = self.order
+        index.prefix = self.prefix * rate
+        index.pages = self.pages
+        return index
+
+    def __len__(self):
+        return len(self.sorted)
+
+    @property
+    def nbytes(self):
+        pages_bytes = self.pages.nbytes if self.pages is not None else 0
+        return self.sorted.nbytes + self.order.nbytes + self.prefix.nbytes + pages_bytes
+
+    @property
+    def total(self):
+        return float(self.prefix[-1])
+
+    @property
+    def mean(self):
+        return self.total / len(self) if len(self) else 0.0
+
+    @property
+    def min(self):
+        return float(self.sorted[0]) if len(self) else 0.0
+
+    @property
+    def max(self):
+        return float(self.sorted[-1]) if len(self) else 0.0
+
+    def summary(self):
+        """Count, total, average, min and max of all indexed amounts"""
+        return {'count': len(self), 'total': self.total, 'average': self.mean, 'min': self.min, 'max': self.max}
+
+    def _slice_stats(self, start, stop):
+        stop = max(start, stop)
+        return int(stop - start), float(self.prefix[stop] - self.prefix[start])
+
+    def between(self, low, high):
+        """Count and total of amounts with low <= amount <= high"""
+        start = np.searchsorted(self.sorted, low, side='left')
+        stop = np.searchsorted(self.sorted, high, side='right')
+        return self._slice_stats(start, stop)
+
+    def above(self, threshold):
+        """Count and total of amounts strictly greater than threshold"""
+        return self._slice_stats(np.searchsorted(self.sorted, threshold, side='right'), len(self))
+
+    def below(self, threshold):
+        """Count and total of amounts strictly less than threshold"""
+        return self._slice_stats(0, np.searchsorted(self.sorted, threshold, side='left'))
+
+    def top(self, k):
+        """Record numbers and amounts of the k largest amounts, largest first"""
+        k = min(max(0, k), len(self))
+        # Take the k largest, including every record tied with the k-th, then keep ties in record order
+        start = np.searchsorted(self.sorted, self.sorted[len(self) - k], side='left') if k else len(self)
+        records, values = self.order[start:], self.sorted[start:]
+        keep = np.lexsort((records, -values))[:k]
+        return records[keep], values[keep]
+
+    def argmax(self):
+        """Record number of the first record holding the largest amount"""
+        return int(self.order[np.searchsorted(self.sorted, self.sorted[-1], side='left')])
+
+    def argmin(self):
+        """Record number of the first record holding the smallest amount"""
+        return int(self.order[0])
+
+    def page(self, record):
+        """Page of an original record, or None if unknown"""
+        if self.pages is None or np.isnan(self.pages[record]):
+            return None
+        return int(self.pages[record])
+
+
+def _page_values(pages):
+    """Turn page numbers (None for unknown) into floats with NaN for unknown"""
+    return [np.nan if page is None else page for page in pages]
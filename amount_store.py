@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+# Amounts are held in minor units (paise, cents): decimal digits of each currency's minor unit
+# (ISO 4217), DEFAULT_MINOR_DIGITS for currencies not listed
+MINOR_DIGITS = {'JPY': 0}
+DEFAULT_MINOR_DIGITS = 2
+# Larger numbers do not fit in int64 minor units; they are account or card numbers, not money
+MAX_AMOUNT = 10 ** 16
+# Where an amount was found, stored as a one-byte code per amount
+SOURCES = ['text', 'table']
+# Fields of an amount record, in output order; a store only has the provenance fields it was built with
+RECORD_FIELDS = ['table', 'page', 'column', 'row', 'date', 'amount', 'source']
+NUMBER_FIELDS = ['table', 'page', 'row']
+LABEL_FIELDS = ['column', 'date']
+
+
+def minor_units(currency=None):
+    """Minor units in one unit of a currency: 100 paise or cents, but 1 for yen"""
+    return 10 ** MINOR_DIGITS.get(currency, DEFAULT_MINOR_DIGITS)
+
+
+def to_minor(amounts, currency=None):
+    """Round amounts to int64 minor units of a currency"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * minor_units(currency)).astype(np.int64)
+
+
+def exact_sum(minor):
+    """Sum of int64 minor units as a Python int, without int64 overflow"""
+    minor = np.asarray(minor, dtype=np.int64)
+    if len(minor) == 0:
+        return 0
+    if int(np.abs(minor).max()) * len(minor) < 2 ** 63:
+        return int(minor.sum())
+    return sum(minor.tolist())
+
+
+def _numbers(values):
+    """int32 page/table/row numbers, 0 where unknown"""
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+    return numbers.fillna(0).to_numpy(dtype=np.int32)
+
+
+def _sources(values, count):
+    """int8 codes into SOURCES for one source name or one per amount"""
+    if isinstance(values, str):
+        return np.full(count, SOURCES.index(values), dtype=np.int8)
+    codes = pd.Index(SOURCES).get_indexer(pd.Series(values, dtype=object))
+    if (codes < 0).any():
+        raise ValueError(f"Unknown amount source in {sorted(set(np.asarray(values, dtype=object)[codes < 0]), key=str)}")
+    return codes.astype(np.int8)
+
+
+class AmountStore:
+    """Amounts of a document as int64 minor units with parallel provenance arrays
+
+    minor holds every amount in minor units, so totals are exact integer
+    sums rather than drifting float sums. Instead of a dict per amount the
+    provenance sits in small arrays of the same length: page, table and row
+    numbers as int32 (0 when unknown), the source as an int8 code into
+    SOURCES, and table column names and transaction dates as categoricals.
+    Fields a store was not built with are None. The currency sets the size of
+    the minor unit (None for the default of two decimals). out_of_range
+    counts amounts left out for being too large to be money.
+    """
+
+    def __init__(self, minor, table=None, page=None, column=None, row=None, date=None, source=None, currency=None, out_of_range=0):
+        self.minor = np.asarray(minor, dtype=np.int64)
+        self.currency = currency
+        self.scale = minor_units(currency)
+        self.out_of_range = out_of_range
+        self.table = table
+        self.page = page
+        self.column = column
+        self.row = row
+        self.date = date
+        self.source = source
+
+    @classmethod
+    def empty(cls, currency=None):
+        return cls(np.empty(0, dtype=np.int64), currency=currency)
+
+    @classmethod
+    def from_columns(cls, amounts, source=None, currency=None, **fields):
+        """Build a store from an amount array and provenance columns (lists or arrays, one value per amount)
+
+        source is a name from SOURCES for every amount or one name per
+        amount. Missing amounts are left out; amounts too large to be money
+        are left out too, counted in out_of_range and reported.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        keep = np.abs(amounts) < MAX_AMOUNT  # Also drops NaN
+        out_of_range = int((~keep & ~np.isnan(amounts)).sum())
+        if out_of_range:
+            print(f"Left out {out_of_range} amounts of {MAX_AMOUNT:,} or more (account or card numbers rather than money)")
+        encoded = {}
+        for name, values in fields.items():
+            if name in NUMBER_FIELDS:
+                encoded[name] = _numbers(values)[keep]
+            elif name in LABEL_FIELDS:
+                encoded[name] = pd.Categorical(pd.Series(values, dtype=object)[keep])
+            else:
+                raise ValueError(f"Unknown amount field: {name}")
+        if source is not None:
+            encoded['source'] = _sources(source, len(amounts))[keep]
+        return cls(to_minor(amounts[keep], currency), currency=currency, out_of_range=out_of_range, **encoded)
+
+    @classmethod
+    def from_records(cls, records, source=None, currency=None):
+        """Build a store from amount records (dicts with 'amount' and any of the other RECORD_FIELDS)"""
+        if not records:
+            return cls.empty(currency)
+        keys = set().union(*(record.keys() for record in records))
+        fields = {
+            name: [record.get(name) for record in records]
+            for name in NUMBER_FIELDS + LABEL_FIELDS if name in keys
+        }
+        if 'source' in keys:
+            source = [record.get('source', source) for record in records]
+        return cls.from_columns([record['amount'] for record in records], source=source, currency=currency, **fields)
+
+    @classmethod
+    def concat(cls, stores, currency=None):
+        """One store with the amounts of several, in order; fields missing from some stores are unknown there
+
+        The stores must share a currency, as their minor units would differ;
+        currency is the currency of the result when there are no stores.
+        """
+        stores = list(stores)
+        currencies = {store.currency for store in stores}
+        if len(currencies) > 1:
+            raise ValueError(f"Cannot combine amounts in {sorted(currencies, key=str)}")
+        if currencies:
+            currency = currencies.pop()
+        out_of_range = sum(store.out_of_range for store in stores)
+        stores = [store for store in stores if len(store)]
+        if not stores:
+            return cls(np.empty(0, dtype=np.int64), currency=currency, out_of_range=out_of_range)
+        fields = {}
+        for name in NUMBER_FIELDS:
+            if any(getattr(store, name) is not None for store in stores):
+                fields[name] = np.concatenate([
+                    getattr(store, name) if getattr(store, name) is not None else np.zeros(len(store), dtype=np.int32)
+                    for store in stores
+                ])
+        for name in LABEL_FIELDS:
+            if any(getattr(store, name) is not None for store in stores):
+                fields[name] = pd.Categorical(pd.concat([
+                    pd.Series(getattr(store, name) if getattr(store, name) is not None else [None] * len(store), dtype=object)
+                    for store in stores
+                ], ignore_index=True))
+        if any(store.source is not None for store in stores):
+            if any(store.source is None for store in stores):
+                raise ValueError("Cannot combine amounts with and without a source")
+            fields['source'] = np.concatenate([store.source for store in stores])
+        return cls(np.concatenate([store.minor for store in stores]), currency=currency, out_of_range=out_of_range, **fields)
+
+    def __len__(self):
+        return len(self.minor)
+
+    @property
+    def fields(self):
+        """The record fields this store has, in RECORD_FIELDS order"""
+        return [name for name in RECORD_FIELDS if name == 'amount' or getattr(self, name) is not None]
+
+    @property
+    def nbytes(self):
+        total = self.minor.nbytes
+        for name in NUMBER_FIELDS + ['source']:
+            if getattr(self, name) is not None:
+                total += getattr(self, name).nbytes
+        for name in LABEL_FIELDS:
+            if getattr(self, name) is not None:
+                total += getattr(self, name).codes.nbytes + int(getattr(self, name).categories.memory_usage(deep=True))
+        return total
+
+    @property
+    def amounts(self):
+        """The amounts as float64 units"""
+        return self.minor / self.scale
+
+    @property
+    def total_minor(self):
+        return exact_sum(self.minor)
+
+    @property
+    def total(self):
+        return self.total_minor / self.scale
+
+    def summary(self):
+        """Count, total, average, min and max, the total and average from the exact sum"""
+        if not len(self):
+            return {'count': 0, 'total': 0, 'average': 0, 'min': 0, 'max': 0}
+        total = self.total_minor
+        return {
+            'count': len(self),
+            'total': total / self.scale,
+            'average': total / len(self) / self.scale,
+            'min': int(self.minor.min()) / self.scale,
+            'max': int(self.minor.max()) / self.scale
+        }
+
+    def _column_values(self, name, missing):
+        """One field as an array for a frame (missing where unknown), or as Python values for records"""
+        if name == 'amount':
+            return self.amounts
+        values = getattr(self, name)
+        if name == 'source':
+            return np.array(SOURCES, dtype=object)[values]
+        if name in NUMBER_FIELDS:
+            if values.all():
+                return values.astype(np.int64)
+            return np.where(values > 0, values, np.nan) if missing is np.nan else np.where(values > 0, values.astype(object), missing)
+        labels = np.asarray(values.astype(object), dtype=object)
+        return np.where(pd.isna(labels), missing, labels)
+
+    def to_frame(self):
+        """The amounts as a DataFrame with one column per field (NaN/None where unknown)"""
+        return pd.DataFrame({
+            name: self._column_values(name, None if name in LABEL_FIELDS else np.nan)
+            for name in self.fields
+        })
+
+    def records(self):
+        """The amounts as JSON-friendly dicts, one per amount (None where unknown)"""
+        names = self.fields
+        columns = [self._column_values(name, None).tolist() for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
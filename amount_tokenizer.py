@@ -0,0 +1,89 @@
+import re
+
+# Currency markers recognised next to a number, mapped to currency codes
+CURRENCY_MARKERS = {
+    '₹': 'INR',
+    'RS': 'INR',
+    'RS.': 'INR',
+    'INR': 'INR',
+    '$': 'USD',
+    'US$': 'USD',
+    'USD': 'USD',
+    '€': 'EUR',
+    'EUR': 'EUR',
+    '£': 'GBP',
+    'GBP': 'GBP',
+    '¥': 'JPY',
+    'JPY': 'JPY',
+    'C$': 'CAD',
+    'CAD': 'CAD',
+    'A$': 'AUD',
+    'AUD': 'AUD',
+    'CNY': 'CNY',
+}
+# Codes may be written with a trailing dot, as in Rs.500 or INR.1,234.56
+CURRENCY_MARKERS.update({marker + '.': code for marker, code in list(CURRENCY_MARKERS.items()) if marker.isalpha()})
+
+_MARKER = r'(?:US\$|[CA]\$|[₹$€£¥]|(?<![A-Za-z])(?i:(?:rs|usd|inr|eur|gbp|jpy|cad|aud|cny)(?![A-Za-z])\.?))'
+
+# One pattern for every supported format, so the text is scanned only once:
+#   ₹1,234.56 / 1,234.56₹ / $1,234.56 / USD 1,234.56 / 1,234.56 INR / 1234.56
+#   plus Indian lakh grouping such as 1,23,456.78 and 12,34,56,789.00
+AMOUNT_PATTERN = (
+    r'(?:(?P<prefix>' + _MARKER + r')\s*'
+    r'|(?<![\d.,]))'                            # without a prefix, never start inside another number
+    r'(?P<number>'
+    r'\d{1,2}(?:,\d{2})+,\d{3}'                 # 1,23,456 (lakh / crore grouping)
+    r'|\d{1,3}(?:,\d{3})+'                      # 1,234,567 (thousands grouping)
+    r'|\d+'                                     # 1234567 (no grouping)
+    r')(?!\d)'
+    r'(?P<fraction>\.\d+)?'
+    r'(?:\s*(?P<suffix>' + _MARKER + r')(?!\s*\d))?'  # suffix unless it prefixes the next number
+)
+
+AMOUNT_TOKEN_RE = re.compile(AMOUNT_PATTERN)
+
+# Same pattern with the whole match captured, for pandas .str.extractall
+AMOUNT_CELL_RE = re.compile(r'(?P<raw_text>' + AMOUNT_PATTERN + r')')
+
+
+def marker_to_currency(marker):
+    """Map a matched currency marker to its currency code (None when absent)"""
+    if not marker:
+        return None
+    return CURRENCY_MARKERS.get(marker.upper())
+
+
+def parse_amount(number, fraction=None):
+    """Convert the number/fraction groups of a match into a float"""
+    value = number.replace(',', '')
+    if fraction:
+        value += fraction
+    return float(value)
+
+
+def tokenize_amounts(text, require_decimals=False):
+    """Scan text once and return (amount, currency, raw_text, start, end) tuples
+
+    Every number is emitted at most once, together with the currency marker
+    found directly before or after it. Zero amounts are skipped. With
+    require_decimals only numbers carrying a decimal part are returned.
+    """
+    tokens = []
+    if not text:
+        return tokens
+
+    for match in AMOUNT_TOKEN_RE.finditer(text):
+        number, fraction = match.group('number', 'fraction')
+        if require_decimals and not fraction:
+            continue
+        try:
+            amount = parse_amount(number, fraction)
+        except ValueError:
+            continue
+        if amount <= 0:
+            continue
+        currency = marker_to_currency(match.group('prefix') or match.group('suffix'))
+        tokens.append((amount, currency, match.group(0), match.start(), match.end()))
+
+    return tokens
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# How long an analysis stays queryable after its last use, and how much memory all analyses may take
+ANALYSIS_TTL = float(os.environ.get('PDF_ANALYZER_ANALYSIS_TTL', 60 * 60))
+ANALYSIS_STORE_MAX_BYTES = int(os.environ.get('PDF_ANALYZER_ANALYSIS_STORE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Rough per-entry bookkeeping cost on top of the amount index
+ENTRY_OVERHEAD_BYTES = 4096
+
+
+class StoredAnalysis:
+    """The parts of an analysis that later queries need: its AmountIndex and summaries"""
+
+    def __init__(self, index, display_currency, metrics=None, cr_dr_analysis=None):
+        self.index = index
+        self.display_currency = display_currency
+        self.metrics = metrics
+        self.cr_dr_analysis = cr_dr_analysis
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + ENTRY_OVERHEAD_BYTES
+
+
+class AnalysisStore:
+    """In-memory store of recent analyses with TTL and memory-bounded LRU eviction
+
+    Entries expire ttl seconds after they were last used. When the estimated
+    size of all entries grows past max_bytes the least recently used entries
+    are dropped first. The store lives in the server process, so with several
+    server processes a query must reach the process that ran the analysis.
+    """
+
+    def __init__(self, ttl=ANALYSIS_TTL, max_bytes=ANALYSIS_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()  # analysis_id -> (expires_at, StoredAnalysis)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, analysis):
+        """Store an analysis and return its id"""
+        analysis_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[analysis_id] = (time.monotonic() + self.ttl, analysis)
+            self._nbytes += analysis.nbytes
+            self._evict()
+        return analysis_id
+
+    def get(self, analysis_id):
+        """Return a stored analysis and extend its lifetime, or None if unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is None:
+                return None
+            expires_at, analysis = entry
+            if expires_at < time.monotonic():
+                self._remove(analysis_id)
+                return None
+            self._entries[analysis_id] = (time.monotonic() + self.ttl, analysis)
+            self._entries.move_to_end(analysis_id)
+            return analysis
+
+    def delete(self, analysis_id):
+        with self._lock:
+            if analysis_id in self._entries:
+                self._remove(analysis_id)
+
+    def _remove(self, analysis_id):
+        _, analysis = self._entries.pop(analysis_id)
+        self._nbytes -= analysis.nbytes
+
+    def _evict(self):
+        now = time.monotonic()
+        for analysis_id in [key for key, (expires_at, _) in self._entries.items() if expires_at < now]:
+            self._remove(analysis_id)
+        # Always keep the newest entry, even if it alone is over the cap
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._nbytes, 'evictions': self.evictions}
+
+
+# Shared by the API endpoints and the background job worker
+ANALYSIS_STORE = AnalysisStore()
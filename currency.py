@@ -0,0 +1,269 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Currency exchange rates (you can update these or fetch from an API)
+CURRENCY_RATES = {
+    'INR': 1.0,  # Base currency (Indian Rupees)
+    'USD': 0.012,  # 1 INR = 0.012 USD (approximate)
+    'EUR': 0.011,  # 1 INR = 0.011 EUR (approximate)
+    'GBP': 0.0095,  # 1 INR = 0.0095 GBP (approximate)
+    'JPY': 1.8,    # 1 INR = 1.8 JPY (approximate)
+    'CAD': 0.016,  # 1 INR = 0.016 CAD (approximate)
+    'AUD': 0.018,  # 1 INR = 0.018 AUD (approximate)
+    'CNY': 0.086,  # 1 INR = 0.086 CNY (approximate)
+}
+
+# Historical rates: a CSV of date,currency,rate rows (or date plus one column per currency),
+# rates in units per INR. Without the file every amount is converted at CURRENCY_RATES
+# (noted once in the log); set the variable to an empty string to use them without the note.
+RATE_HISTORY_FILE = os.environ.get(
+    'PDF_ANALYZER_RATE_HISTORY',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exchange_rates.csv')
+)
+BASE_CURRENCY = 'INR'
+
+
+def parse_dates(dates):
+    """Parse ISO (YYYY-MM-DD) dates, and others as they appear in statements (day first); unparseable ones become NaT"""
+    dates = pd.Series(dates, dtype=object)
+    parsed = pd.to_datetime(dates, errors='coerce', format='%Y-%m-%d')
+    rest = parsed.isna() & dates.notna()
+    if rest.any():
+        # Each distinct value on its own: pandas would otherwise apply the format of the first date to all
+        values = dates[rest].astype(str)
+        lookup = {value: pd.to_datetime(value, errors='coerce', dayfirst=True) for value in values.unique()}
+        parsed[rest] = pd.to_datetime(values.map(lookup))
+    return parsed.astype('datetime64[ns]')  # One resolution, as merge_asof needs matching keys
+
+
+class RateHistory:
+    """Exchange rates by date, held in memory for vectorized as-of lookups
+
+    table has a sorted, unique 'date' column and one column of rates (units
+    per INR) for every currency. Gaps are filled with the last known rate,
+    and currencies missing from the file keep their CURRENCY_RATES value.
+    A date before the first row uses the first row; an unknown date uses
+    the latest rates.
+    """
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self.currencies = [column for column in self.table.columns if column != 'date']
+        self.positions = pd.Index(self.currencies)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build a history from long (date, currency, rate) or wide (date, one column per currency) rows"""
+        frame = frame.rename(columns={column: str(column).strip().lower() for column in frame.columns if str(column).strip().lower() in ('date', 'currency', 'rate')})
+        if {'date', 'currency', 'rate'} <= set(frame.columns):
+            frame = frame.pivot_table(index='date', columns='currency', values='rate', aggfunc='last').reset_index()
+        frame = frame.assign(date=parse_dates(frame['date']).to_numpy())
+        frame = frame.dropna(subset=['date']).sort_values('date', kind='stable').drop_duplicates('date', keep='last')
+        if frame.empty:
+            raise ValueError("Exchange rate history has no dated rows")
+        rates = frame.drop(columns='date').apply(pd.to_numeric, errors='coerce').ffill().bfill()
+        for currency, rate in CURRENCY_RATES.items():
+            if currency not in rates:
+                rates[currency] = rate
+        rates[BASE_CURRENCY] = 1.0
+        return cls(pd.concat([frame[['date']].reset_index(drop=True), rates.reset_index(drop=True)], axis=1))
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls.from_frame(pd.read_csv(path))
+
+    def latest(self):
+        """The most recent rate of every currency"""
+        return {currency: float(rate) for currency, rate in self.table[self.currencies].iloc[-1].items()}
+
+    def rates_at(self, dates):
+        """Rates in effect on each date, as an array with one row per date and one column per currency
+
+        One as-of join (pandas.merge_asof) over the dates sorted once,
+        instead of a lookup per transaction.
+        """
+        dates = parse_dates(dates)
+        rates = np.empty((len(dates), len(self.currencies)), dtype=np.float64)
+        rates[:] = self.table[self.currencies].iloc[-1].to_numpy(dtype=np.float64)
+        known = dates.notna().to_numpy()
+        if known.any():
+            left = pd.DataFrame({'date': dates[known].to_numpy(), 'position': np.flatnonzero(known)}).sort_values('date', kind='stable')
+            matched = pd.merge_asof(left, self.table, on='date', direction='backward')
+            matched_rates = matched[self.currencies].to_numpy(dtype=np.float64)
+            early = np.isnan(matched_rates[:, 0])
+            matched_rates[early] = self.table[self.currencies].iloc[0].to_numpy(dtype=np.float64)
+            rates[matched['position'].to_numpy()] = matched_rates
+        return rates
+
+    def _column(self, currency):
+        try:
+            return self.positions.get_loc(currency)
+        except KeyError:
+            raise KeyError(f"Unknown currency: {currency}") from None
+
+    def factors(self, dates, from_currency, to_currency):
+        """Per-amount conversion factors for amounts dated dates
+
+        from_currency is a currency code or an array of codes, one per amount.
+        """
+        rates = self.rates_at(dates)
+        to_rates = rates[:, self._column(to_currency)]
+        if isinstance(from_currency, str):
+            from_rates = rates[:, self._column(from_currency)]
+        else:
+            columns = self.positions.get_indexer(np.asarray(from_currency, dtype=object))
+            if (columns < 0).any():
+                raise KeyError(f"Unknown currency in {sorted(set(np.asarray(from_currency, dtype=object)[columns < 0]))}")
+            from_rates = rates[np.arange(len(rates)), columns]
+        return to_rates / from_rates
+
+    def convert(self, amounts, dates, from_currency, to_currency):
+        """Convert amounts (array or Series) at the rates of their dates"""
+        factors = self.factors(dates, from_currency, to_currency)
+        if isinstance(amounts, pd.Series):
+            return amounts * factors
+        return np.asarray(amounts, dtype=np.float64) * factors
+
+
+_rate_history = None
+_rate_history_loaded = False
+_rate_history_lock = threading.Lock()
+
+
+def get_rate_history():
+    """Return the RateHistory loaded from RATE_HISTORY_FILE, or None if there is none
+
+    The file is looked up once per process, so a missing file is reported once.
+    """
+    global _rate_history, _rate_history_loaded
+    with _rate_history_lock:
+        if not _rate_history_loaded:
+            _rate_history_loaded = True
+            if RATE_HISTORY_FILE and os.path.exists(RATE_HISTORY_FILE):
+                try:
+                    _rate_history = RateHistory.from_csv(RATE_HISTORY_FILE)
+                except Exception as e:
+                    print(f"Error loading exchange rate history {RATE_HISTORY_FILE}: {e}")
+            elif RATE_HISTORY_FILE:
+                print(f"No exchange rate history at {RATE_HISTORY_FILE}, converting at the built-in rates")
+        return _rate_history
+
+
+def set_rate_history(history):
+    """Use a RateHistory (e.g. from a user-supplied file) instead of RATE_HISTORY_FILE; None for static rates"""
+    global _rate_history, _rate_history_loaded
+    with _rate_history_lock:
+        _rate_history = history
+        _rate_history_loaded = True
+    refresh_rates()
+
+
+def get_exchange_rates():
+    """Current exchange rates: the latest historical rates if a history is loaded, otherwise the static ones"""
+    history = get_rate_history()
+    if history is None:
+        return CURRENCY_RATES
+    return {**CURRENCY_RATES, **history.latest()}
+
+
+class RateMatrix:
+    """Conversion factors between every pair of currencies, computed once
+
+    rates gives the units of each currency per unit of the base currency
+    (INR). factors[i, j] converts an amount in currencies[i] into
+    currencies[j], so converting a whole column is one multiplication, and
+    a column of mixed source currencies is one gather plus a multiplication.
+    """
+
+    def __init__(self, rates):
+        self.currencies = list(rates)
+        self.positions = pd.Index(self.currencies)
+        per_base = np.array([rates[currency] for currency in self.currencies], dtype=np.float64)
+        self.factors = per_base[np.newaxis, :] / per_base[:, np.newaxis]
+
+    def _position(self, currency):
+        try:
+            return self.positions.get_loc(currency)
+        except KeyError:
+            raise KeyError(f"Unknown currency: {currency}") from None
+
+    def rate(self, from_currency, to_currency):
+        """Factor converting one unit of from_currency into to_currency"""
+        if from_currency == to_currency:
+            return 1.0
+        return float(self.factors[self._position(from_currency), self._position(to_currency)])
+
+    def convert(self, amounts, from_currency, to_currency):
+        """Convert a scalar, NumPy array or pandas Series
+
+        from_currency is a currency code, or an array of codes (one per
+        amount) for amounts in mixed currencies.
+        """
+        if isinstance(from_currency, str):
+            if from_currency == to_currency:
+                return amounts
+            return amounts * self.rate(from_currency, to_currency)
+        positions = self.positions.get_indexer(np.asarray(from_currency, dtype=object))
+        if (positions < 0).any():
+            raise KeyError(f"Unknown currency in {sorted(set(np.asarray(from_currency, dtype=object)[positions < 0]))}")
+        factors = self.factors[positions, self._position(to_currency)]
+        if isinstance(amounts, pd.Series):
+            return amounts * factors
+        return np.asarray(amounts, dtype=np.float64) * factors
+
+
+_rate_matrix = None
+_rate_matrix_lock = threading.Lock()
+
+
+def get_rate_matrix():
+    """Return the shared RateMatrix, built from get_exchange_rates() on first use"""
+    global _rate_matrix
+    with _rate_matrix_lock:
+        if _rate_matrix is None:
+            _rate_matrix = RateMatrix(get_exchange_rates())
+        return _rate_matrix
+
+
+def refresh_rates():
+    """Rebuild the shared RateMatrix, e.g. after the exchange rates were updated"""
+    global _rate_matrix
+    with _rate_matrix_lock:
+        _rate_matrix = RateMatrix(get_exchange_rates())
+        return _rate_matrix
+
+
+def convert_currency(amount, from_currency='INR', to_currency='INR'):
+    """Convert an amount (or a NumPy/pandas column of amounts) from one currency to another"""
+    return get_rate_matrix().convert(amount, from_currency, to_currency)
+
+
+def convert_currency_asof(amounts, dates, from_currency='INR', to_currency='INR'):
+    """Convert amounts at the historical rates of their dates (current rates without a rate history)"""
+    if isinstance(from_currency, str) and from_currency == to_currency:
+        return amounts
+    history = get_rate_history()
+    if history is None or dates is None:
+        return convert_currency(amounts, from_currency, to_currency)
+    return history.convert(amounts, dates, from_currency, to_currency)
+
+
+def convert_amount_frame(frame, from_currency='INR', to_currency='INR', column='amount', date_column='date'):
+    """Return frame with its amount column in to_currency, for display
+
+    Rows with a date column are converted at the rates of their dates when
+    a rate history is loaded. The frame itself is left alone (stored
+    results stay in the PDF currency); the original amounts are kept as
+    original_amount.
+    """
+    if from_currency == to_currency or column not in frame:
+        return frame
+    dates = frame[date_column] if date_column in frame else None
+    return frame.assign(**{
+        'original_amount': frame[column],
+        column: convert_currency_asof(frame[column], dates, from_currency, to_currency),
+        'display_currency': to_currency
+    })
@@ -0,0 +1,168 @@
+import io
+import os
+import shutil
+
+import pandas as pd
+from openpyxl import Workbook
+
+# Output formats for extracted statements:
+#   'xlsx'    - one workbook: a sheet per raw table plus Text_Amounts and Table_Amounts
+#   'parquet' - a directory of Parquet files: text_amounts, table_amounts and tables (raw table cells, long format)
+#   'arrow'   - the same directory layout as Arrow IPC files
+EXPORT_FORMATS = ['xlsx', 'parquet', 'arrow']
+# Formats of a single dataset offered as a download
+DOWNLOAD_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file')
+}
+
+# Excel limits sheet names to 31 characters
+EXCEL_SHEET_NAME_LENGTH = 31
+
+
+def pyarrow_available():
+    """Check whether the columnar formats (Parquet, Arrow IPC) can be written"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def available_formats(formats):
+    """The formats of a list that can be written with the installed packages"""
+    return [fmt for fmt in formats if fmt in ('xlsx', 'csv') or pyarrow_available()]
+
+
+def table_cells(tables):
+    """Flatten raw tables into one long-format frame: table, page, row, column, value
+
+    Raw tables have arbitrary headers and mixed cell types, so every cell
+    becomes a string; this keeps hundreds of tables in a single columnar file.
+    """
+    frames = []
+    for i, df in enumerate(tables):
+        df = df.reset_index(drop=True)
+        cells = df.astype(object).where(df.notna(), None)
+        long = cells.melt(var_name='column', value_name='value', ignore_index=False).reset_index(names='row')
+        long = long.dropna(subset=['value'])
+        frames.append(pd.DataFrame({
+            'table': df.attrs.get('table', i + 1),
+            'page': df.attrs.get('page'),
+            'row': long['row'].to_numpy() + 1,
+            'column': long['column'].astype(str).to_numpy(),
+            'value': long['value'].astype(str).to_numpy()
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['table', 'page', 'row', 'column', 'value'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def columnar_frame(frame):
+    """Prepare a frame for Parquet/Arrow: string column names and no mixed-type object columns"""
+    frame = frame.reset_index(drop=True)
+    frame.columns = [str(column) for column in frame.columns]
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            frame[column] = frame[column].map(lambda value: None if pd.isna(value) else str(value))
+    return frame
+
+
+def write_dataset(frame, path, fmt):
+    """Write one frame as a Parquet or Arrow IPC file"""
+    frame = columnar_frame(frame)
+    if fmt == 'parquet':
+        frame.to_parquet(path, index=False)
+    elif fmt == 'arrow':
+        frame.to_feather(path)  # Feather v2 is the Arrow IPC file format
+    else:
+        raise ValueError(f"Unknown dataset format: {fmt}")
+
+
+def frame_to_bytes(frame, fmt='csv'):
+    """Serialize a frame for a download button"""
+    if fmt == 'csv':
+        return frame.to_csv(index=False).encode('utf-8')
+    buffer = io.BytesIO()
+    write_dataset(frame, buffer, fmt)
+    return buffer.getvalue()
+
+
+def _excel_rows(frame):
+    """Header and rows of a frame as plain Python values (NaN as empty cells)"""
+    yield [str(column) for column in frame.columns]
+    values = frame.astype(object).where(frame.notna(), None)
+    yield from (list(row) for row in values.itertuples(index=False, name=None))
+
+
+def write_excel(path, sheets):
+    """Write (sheet name, frame) pairs with openpyxl's write-only mode
+
+    Rows are streamed to the file sheet by sheet instead of building every
+    cell object of the workbook in memory first, so workbooks with hundreds
+    of sheets stay cheap.
+    """
+    workbook = Workbook(write_only=True)
+    for name, frame in sheets:
+        sheet = workbook.create_sheet(title=name[:EXCEL_SHEET_NAME_LENGTH])
+        for row in _excel_rows(frame):
+            sheet.append(row)
+    # A workbook needs at least one sheet
+    if not sheets:
+        workbook.create_sheet(title='No_Amounts')
+    workbook.save(path)
+
+
+def statement_sheets(tables, text_amounts, table_amounts):
+    """Excel layout of a statement: raw tables, then the text and table amounts"""
+    sheets = [(f"Table_{i+1}", df) for i, df in enumerate(tables)]
+    if text_amounts:
+        sheets.append(("Text_Amounts", pd.DataFrame(text_amounts)))
+    if table_amounts:
+        sheets.append(("Table_Amounts", pd.DataFrame(table_amounts)))
+    return sheets
+
+
+def statement_datasets(tables, text_amounts, table_amounts):
+    """Columnar layout of a statement: one dataset per kind of record"""
+    return {
+        'text_amounts': pd.DataFrame(text_amounts, columns=None if text_amounts else ['page', 'amount']),
+        'table_amounts': pd.DataFrame(table_amounts, columns=None if table_amounts else ['table', 'column', 'row', 'amount']),
+        'tables': table_cells(tables)
+    }
+
+
+def export_path(output_stem, fmt='xlsx'):
+    """Where export_statement writes: output_stem.xlsx, or the directory output_stem for columnar formats"""
+    return output_stem + '.xlsx' if fmt == 'xlsx' else output_stem
+
+
+def export_statement(output_stem, tables, text_amounts, table_amounts, fmt='xlsx'):
+    """Write the extraction results of one statement and return the output path
+
+    Output is written under a temporary name and moved into place once
+    complete, so an interrupted export never leaves a partial result behind.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    output_path = export_path(output_stem, fmt)
+    if fmt == 'xlsx':
+        partial_path = output_stem + '.partial.xlsx'
+        write_excel(partial_path, statement_sheets(tables, text_amounts, table_amounts))
+        os.replace(partial_path, output_path)
+        return output_path
+
+    # Every file is written first, then moved into the directory (which may hold other formats too)
+    partial_path = output_stem + '.partial'
+    shutil.rmtree(partial_path, ignore_errors=True)
+    os.makedirs(partial_path)
+    names = []
+    for name, frame in statement_datasets(tables, text_amounts, table_amounts).items():
+        names.append(f"{name}.{fmt}")
+        write_dataset(frame, os.path.join(partial_path, names[-1]), fmt)
+    os.makedirs(output_path, exist_ok=True)
+    for name in names:
+        os.replace(os.path.join(partial_path, name), os.path.join(output_path, name))
+    os.rmdir(partial_path)
+    return output_path
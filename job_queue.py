@@ -0,0 +1,321 @@
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+# Where queued PDFs and the job database live, how many jobs run at once and how long finished jobs are kept
+JOBS_DIR = os.environ.get('PDF_ANALYZER_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'pdf_analyzer_jobs'))
+JOB_WORKERS = int(os.environ.get('PDF_ANALYZER_JOB_WORKERS', 1))
+JOB_TTL = float(os.environ.get('PDF_ANALYZER_JOB_TTL', 24 * 60 * 60))
+# How often a job is started before a job whose worker keeps dying is marked failed
+JOB_MAX_ATTEMPTS = int(os.environ.get('PDF_ANALYZER_JOB_MAX_ATTEMPTS', 3))
+
+JOB_STATUSES = ['queued', 'running', 'done', 'failed']
+# How often idle workers look for jobs submitted by other processes sharing the database
+POLL_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    params TEXT,
+    stage TEXT,
+    progress TEXT,
+    error TEXT,
+    result TEXT,
+    worker_pid INTEGER,
+    worker_token TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+# Columns added after the first release, added to older databases on open
+MIGRATIONS = {
+    'worker_token': 'ALTER TABLE jobs ADD COLUMN worker_token TEXT',
+    'attempts': 'ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0'
+}
+
+
+def _pid_alive(pid):
+    """Check whether a local process id is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Durable local job queue backed by SQLite, with in-process worker threads
+
+    Uploaded PDFs are written to the jobs directory and their jobs recorded in
+    a SQLite database, so no external broker is needed and several server
+    processes on one machine can share the queue. Each job is handed to
+    handler(pdf_path, params, progress), where progress(stage, done, total)
+    records per-stage progress; the handler's return value must be JSON
+    serializable and becomes the job result. Jobs left running by a process
+    that died are queued again on start(), until they have been started
+    max_attempts times. The jobs directory must be owned by us and closed to
+    other users, since it holds uploaded statements.
+    """
+
+    def __init__(self, handler, directory=JOBS_DIR, workers=JOB_WORKERS, ttl=JOB_TTL, max_attempts=JOB_MAX_ATTEMPTS):
+        self.handler = handler
+        self.directory = directory
+        self.db_path = os.path.join(directory, 'jobs.sqlite3')
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.max_attempts = max(1, max_attempts)
+        # Identifies this queue's run in worker_token: pids are reused, tokens are not
+        self.token = uuid.uuid4().hex
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        """Open a connection (one per call: SQLite connections are not shared across threads)"""
+        with self._init_lock:
+            if not self._initialized:
+                self._private_directory()
+                with sqlite3.connect(self.db_path) as connection:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(SCHEMA)
+                    columns = {row[1] for row in connection.execute('PRAGMA table_info(jobs)')}
+                    for column, statement in MIGRATIONS.items():
+                        if column not in columns:
+                            connection.execute(statement)
+                self._initialized = True
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _private_directory(self):
+        """Create the jobs directory if needed and check that only we can write to it"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        info = os.lstat(self.directory)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"Jobs directory {self.directory} is not a directory")
+        if hasattr(os, 'geteuid') and info.st_uid != os.geteuid():
+            raise PermissionError(f"Jobs directory {self.directory} is owned by another user")
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"Jobs directory {self.directory} is writable by other users")
+
+    def _pdf_path(self, job_id):
+        return os.path.join(self.directory, job_id + '.pdf')
+
+    def _remove_pdf(self, job_id):
+        try:
+            os.unlink(self._pdf_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, document, params=None):
+        """Queue a PdfDocument for analysis and return its job id
+
+        The PDF is moved (or copied) into the jobs directory, so the queue
+        never needs the whole file in memory.
+        """
+        job_id = uuid.uuid4().hex
+        connection = self._connect()
+        try:
+            document.save(self._pdf_path(job_id))
+            filename = document.name
+            connection.execute(
+                'INSERT INTO jobs (id, status, filename, params, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', filename, json.dumps(params or {}), json.dumps({}), time.time())
+            )
+        finally:
+            connection.close()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the status of a job (without its result), or None if unknown"""
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'filename': row['filename'],
+            'stage': row['stage'],
+            'progress': json.loads(row['progress'] or '{}'),
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+    def result(self, job_id):
+        """Return the result of a finished job, or None if there is none (yet)"""
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT result FROM jobs WHERE id = ? AND status = ?', (job_id, 'done')).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row['result']) if row is not None else None
+
+    def update_progress(self, job_id, stage, done, total):
+        """Record progress of one stage of a running job"""
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT progress FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            progress = json.loads(row['progress'] or '{}') if row is not None else {}
+            progress[stage] = {'done': done, 'total': total}
+            connection.execute('UPDATE jobs SET stage = ?, progress = ? WHERE id = ?', (stage, json.dumps(progress), job_id))
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def _claim(self):
+        """Atomically take the oldest queued job, or return None"""
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT id, filename, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', ('queued',)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    'UPDATE jobs SET status = ?, worker_pid = ?, worker_token = ?, attempts = attempts + 1, started_at = ? WHERE id = ?',
+                    ('running', os.getpid(), self.token, time.time(), row['id'])
+                )
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return row['id'], row['filename'], json.loads(row['params'] or '{}')
+
+    def _finish(self, job_id, status, result=None, error=None):
+        connection = self._connect()
+        try:
+            connection.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+        finally:
+            connection.close()
+        self._remove_pdf(job_id)
+
+    def _run(self, job_id, filename, params):
+        def progress(stage, done, total):
+            self.update_progress(job_id, stage, done, total)
+
+        try:
+            result = self.handler(self._pdf_path(job_id), dict(params, filename=filename), progress)
+            self._finish(job_id, 'done', result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job_id, 'failed', error=str(e))
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run(*job)
+
+    def recover(self):
+        """Queue again jobs left running by queues that no longer run
+
+        A job is orphaned when its worker process is gone, or when it carries
+        our pid but not our token: it was left by an earlier process that had
+        the same pid, as a server restarted in a container usually does
+        (pid 1). Orphans that were already started max_attempts times are
+        marked failed instead, so a PDF that kills its worker is not retried
+        forever.
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT id, worker_pid, worker_token, attempts FROM jobs WHERE status = ?', ('running',)
+            ).fetchall()
+            for row in rows:
+                pid, token = row['worker_pid'], row['worker_token']
+                if token == self.token:
+                    continue
+                if pid is not None and pid != os.getpid() and _pid_alive(pid):
+                    continue
+                if row['attempts'] >= self.max_attempts:
+                    connection.execute(
+                        'UPDATE jobs SET status = ?, error = ?, finished_at = ?, worker_pid = NULL, worker_token = NULL WHERE id = ? AND status = ?',
+                        ('failed', f"Worker stopped during the job {row['attempts']} times", time.time(), row['id'], 'running')
+                    )
+                    self._remove_pdf(row['id'])
+                else:
+                    connection.execute(
+                        'UPDATE jobs SET status = ?, worker_pid = NULL, worker_token = NULL WHERE id = ? AND status = ?',
+                        ('queued', row['id'], 'running')
+                    )
+        finally:
+            connection.close()
+
+    def purge(self):
+        """Delete finished jobs older than the TTL"""
+        connection = self._connect()
+        try:
+            connection.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                ('done', 'failed', time.time() - self.ttl)
+            )
+        finally:
+            connection.close()
+
+    def start(self):
+        """Recover orphaned jobs and start the worker threads"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        try:
+            self.recover()
+            self.purge()
+        except Exception as e:
+            print(f"Job queue recovery error: {e}")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Ask the workers to stop after their current job"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Count jobs by status"""
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        finally:
+            connection.close()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
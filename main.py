@@ -1,27 +1,136 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import pandas as pd
-import tabula
-import PyPDF2
+import numpy as np
 import re
-import tempfile
 import os
 from typing import Optional
 import json
+import asyncio
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 # Import our existing functions
 from pdf_analyzer_app import (
     extract_amounts_from_text, 
     extract_table_amounts_with_types,
+    scan_table_amounts,
+    row_dates,
+    classify_transaction_type,
+    aggregate_amounts,
     analyze_cr_dr_data,
-    convert_currency,
     format_currency,
     CURRENCY_SYMBOLS,
-    CURRENCY_RATES
+    EXTRACTOR_VERSION
 )
+from currency import convert_amount_frame, convert_currency_asof
+from pdf_document import PdfDocument
+from result_cache import RESULT_CACHE, cache_key
+from pdf_text import iter_page_texts, shutdown_text_pool
+from tabula_backend import get_table_extractor, read_pdf_tables
+from job_queue import JobQueue
+from analysis_store import ANALYSIS_STORE, StoredAnalysis
+from amount_index import AmountIndex
+from amount_store import AmountStore
+from upload_stream import DocumentSpool, UploadError, UploadTooLarge, read_upload_form
 
-app = FastAPI(title="PDF Financial Analyzer API", version="1.0.0")
+# Analysis runs off the event loop on a bounded executor:
+#   PDF_ANALYZER_EXECUTOR   - 'thread' or 'process'
+#   PDF_ANALYZER_WORKERS    - analyses running at the same time
+#   PDF_ANALYZER_QUEUE_SIZE - further analyses allowed to wait; beyond that requests get a 503
+ANALYSIS_EXECUTOR = os.environ.get('PDF_ANALYZER_EXECUTOR', 'thread')
+ANALYSIS_WORKERS = int(os.environ.get('PDF_ANALYZER_WORKERS', 4))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('PDF_ANALYZER_QUEUE_SIZE', 8))
+BUSY_RETRY_AFTER = 5
+
+# Uploads are parsed from the request stream as they arrive; up to PDF_ANALYZER_UPLOAD_MEMORY_BYTES
+# stay in memory, larger ones are spooled to disk, and anything over PDF_ANALYZER_UPLOAD_MAX_BYTES gets a 413
+UPLOAD_MAX_BYTES = int(os.environ.get('PDF_ANALYZER_UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+UPLOAD_MEMORY_BYTES = int(os.environ.get('PDF_ANALYZER_UPLOAD_MEMORY_BYTES', 4 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Allowance for multipart boundaries and form fields when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+# /analyze/batch: each PDF is still held to UPLOAD_MAX_BYTES, the whole batch (all uploads, or all
+# PDFs unpacked from a ZIP) to PDF_ANALYZER_BATCH_MAX_BYTES and PDF_ANALYZER_BATCH_MAX_FILES documents
+BATCH_MAX_FILES = int(os.environ.get('PDF_ANALYZER_BATCH_MAX_FILES', 100))
+BATCH_MAX_BYTES = int(os.environ.get('PDF_ANALYZER_BATCH_MAX_BYTES', 1024 * 1024 * 1024))
+# Documents of one batch analyzed at the same time; each holds an analysis slot while it runs
+BATCH_WORKERS = max(1, min(int(os.environ.get('PDF_ANALYZER_BATCH_WORKERS', 2)), ANALYSIS_WORKERS))
+
+_analysis_executor = None
+_analyses_in_flight = 0  # Only touched on the event loop thread
+
+def get_analysis_executor():
+    """Return the executor that runs PDF analysis, creating it on first use"""
+    global _analysis_executor
+    if _analysis_executor is None:
+        if ANALYSIS_EXECUTOR == 'process':
+            _analysis_executor = ProcessPoolExecutor(
+                max_workers=ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            _analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+    return _analysis_executor
+
+# Routes admitted by the analysis slot middleware before their upload is read
+ANALYSIS_ROUTES = {'/analyze', '/analyze/stream', '/analyze/batch'}
+
+class AnalysisSlot:
+    """One admitted analysis, counted against the admission limit until released
+    
+    The middleware releases the slot when the response starts unless the
+    endpoint took it over (handed_off), e.g. to hold it while a stream runs.
+    release() may be called more than once.
+    """
+    
+    def __init__(self):
+        global _analyses_in_flight
+        _analyses_in_flight += 1
+        self.handed_off = False
+        self._released = False
+    
+    def release(self):
+        global _analyses_in_flight
+        if not self._released:
+            self._released = True
+            _analyses_in_flight -= 1
+
+def analysis_busy():
+    """Whether every analysis worker and queue place is taken"""
+    return _analyses_in_flight >= ANALYSIS_WORKERS + ANALYSIS_QUEUE_SIZE
+
+def reserve_analysis_slots(wanted):
+    """Take up to `wanted` further analysis slots, as many as admission still allows"""
+    slots = []
+    while len(slots) < wanted and not analysis_busy():
+        slots.append(AnalysisSlot())
+    return slots
+
+async def run_analysis(fn, *args):
+    """Run a blocking analysis function on the analysis executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_analysis_executor(), fn, *args)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start the table extraction JVM in the background so the first request doesn't pay for it
+    extractor = get_table_extractor(concurrency=ANALYSIS_WORKERS + JOB_QUEUE.workers)
+    threading.Thread(target=extractor.warm_up, daemon=True).start()
+    JOB_QUEUE.start()
+    yield
+    JOB_QUEUE.stop()
+    if _analysis_executor is not None:
+        _analysis_executor.shutdown(wait=False, cancel_futures=True)
+    extractor.shutdown()
+    shutdown_text_pool()
+
+app = FastAPI(title="PDF Financial Analyzer API", version="1.0.0", lifespan=lifespan)
 
 # HTML template for the web interface
 HTML_TEMPLATE = """
@@ -167,15 +276,49 @@ HTML_TEMPLATE = """
             document.getElementById('loading').style.display = 'block';
             
             try {
-                const response = await fetch('/analyze', {
+                // Stream the analysis so metrics update while pages are still being read
+                const response = await fetch('/analyze/stream', {
                     method: 'POST',
                     body: formData
                 });
+                if (!response.ok) {
+                    const error = await response.json();
+                    throw new Error(error.detail);
+                }
                 
-                const data = await response.json();
-                currentData = data;
                 currentCurrency = displayCurrency;
-                displayResults(data);
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                const amounts = [];
+                let buffer = '';
+                let summary = null;
+                
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\n');
+                    buffer = lines.pop();
+                    
+                    for (const line of lines) {
+                        if (!line.trim()) continue;
+                        const event = JSON.parse(line);
+                        if (event.type === 'amounts') {
+                            event.amounts.forEach(item => amounts.push(item));
+                            document.getElementById('results').style.display = 'block';
+                            displayMetrics(event.running);
+                        } else if (event.type === 'summary') {
+                            summary = event;
+                        } else if (event.type === 'error') {
+                            throw new Error(event.detail);
+                        }
+                    }
+                }
+                
+                if (summary) {
+                    currentData = { ...summary, amounts: amounts };
+                    displayResults(currentData);
+                }
                 
             } catch (error) {
                 alert('Error analyzing PDF: ' + error.message);
@@ -184,15 +327,12 @@ HTML_TEMPLATE = """
             document.getElementById('loading').style.display = 'none';
         });
 
-        function displayResults(data) {
-            document.getElementById('results').style.display = 'block';
-            
-            // Display metrics
+        function displayMetrics(values) {
             const metrics = [
-                { title: '💰 Total Amount', value: data.metrics.total_formatted },
-                { title: '📊 Records', value: data.metrics.count },
-                { title: '📈 Average', value: data.metrics.avg_formatted },
-                { title: '🔝 Highest', value: data.metrics.max_formatted }
+                { title: '💰 Total Amount', value: values.total_formatted },
+                { title: '📊 Records', value: values.count },
+                { title: '📈 Average', value: values.avg_formatted },
+                { title: '🔝 Highest', value: values.max_formatted }
             ];
             
             const metricsHTML = metrics.map(metric => `
@@ -205,6 +345,13 @@ HTML_TEMPLATE = """
             `).join('');
             
             document.getElementById('metricsRow').innerHTML = metricsHTML;
+        }
+
+        function displayResults(data) {
+            document.getElementById('results').style.display = 'block';
+            
+            // Display metrics
+            displayMetrics(data.metrics);
             
             // Display summary
             document.getElementById('summaryContent').innerHTML = `
@@ -253,8 +400,7 @@ HTML_TEMPLATE = """
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({
                         query: query,
-                        data: currentData,
-                        display_currency: currentCurrency
+                        analysis_id: currentData.analysis_id
                     })
                 });
                 
@@ -262,7 +408,7 @@ HTML_TEMPLATE = """
                 document.getElementById('queryResult').innerHTML = `
                     <div class="alert alert-info">
                         <strong>Q:</strong> ${query}<br>
-                        <strong>A:</strong> ${result.answer}
+                        <strong>A:</strong> ${result.answer || result.detail}
                     </div>
                 `;
                 
@@ -277,156 +423,747 @@ HTML_TEMPLATE = """
 </html>
 """
 
+def upload_too_large_message(limit=UPLOAD_MAX_BYTES):
+    return f"Upload exceeds the limit of {limit:,} bytes"
+
+@app.middleware("http")
+async def admit_analysis(request, call_next):
+    """Take an analysis slot for the analysis routes, or answer 503 before the upload is read"""
+    if request.method != 'POST' or request.url.path not in ANALYSIS_ROUTES:
+        return await call_next(request)
+    if analysis_busy():
+        return JSONResponse(
+            status_code=503,
+            content={'detail': "Server is busy analyzing other documents, please retry shortly"},
+            headers={'Retry-After': str(BUSY_RETRY_AFTER)}
+        )
+    slot = AnalysisSlot()
+    request.state.analysis_slot = slot
+    try:
+        return await call_next(request)
+    finally:
+        if not slot.handed_off:
+            slot.release()
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """Reject requests whose declared size is over the upload limit before the body is read"""
+    length = request.headers.get('content-length', '')
+    limit = BATCH_MAX_BYTES if request.url.path == '/analyze/batch' else UPLOAD_MAX_BYTES
+    if request.method == 'POST' and length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+        return JSONResponse(status_code=413, content={'detail': upload_too_large_message(limit)})
+    return await call_next(request)
+
+async def read_upload(request, file_limits, max_bytes=UPLOAD_MAX_BYTES, max_files=1, memory_bytes=UPLOAD_MEMORY_BYTES):
+    """Parse the multipart upload of a request straight from its stream
+    
+    Hashing, spooling and the size limits apply while the bytes arrive, so
+    oversized uploads get a 413 early even without a Content-Length, and the
+    body is written to disk at most once. See read_upload_form for fields,
+    files and file_limits.
+    """
+    try:
+        return await read_upload_form(
+            request.stream(),
+            request.headers.get('content-type'),
+            max_bytes + MULTIPART_OVERHEAD,
+            file_limits,
+            memory_bytes,
+            max_files=max_files
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def read_pdf_upload(request):
+    """Read the single-PDF upload of /analyze, /analyze/stream and /jobs as (document, form fields)"""
+    fields, files = await read_upload(request, {'.pdf': UPLOAD_MAX_BYTES})
+    document = files[0][2] if files else None
+    if document is None:
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    return document, fields
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     return HTML_TEMPLATE
 
-@app.post("/analyze")
-async def analyze_pdf(
-    file: UploadFile = File(...),
-    source_currency: str = Form("INR"),
-    display_currency: str = Form("INR")
-):
-    """Analyze uploaded PDF and extract financial data"""
-    
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+def convert_amount_records(records, source_currency, display_currency):
+    """Copies of amount records in the display currency, converted as one array
+    
+    Records with a transaction date are converted at the rate of that date
+    when an exchange rate history is loaded.
+    """
+    values = np.array([item['amount'] for item in records], dtype=float)
+    values = convert_currency_asof(values, [item.get('date') for item in records], source_currency, display_currency)
+    return [{**item, 'amount': value} for item, value in zip(records, values.tolist())]
+
+def build_cr_dr_response(analysis, display_currency):
+    """Turn a CR/DR analysis already in the display currency into a JSON-friendly dict"""
+    response = {}
+    for key in ['credit', 'debit', 'unknown']:
+        stats = analysis[key]
+        response[key] = {'count': stats['count']}
+        for field in ['total', 'average', 'max', 'min']:
+            value = float(stats[field])
+            response[key][field] = value
+            response[key][f'{field}_formatted'] = format_currency(value, display_currency)
+    
+    net_balance = response['credit']['total'] - response['debit']['total']
+    response['net_balance'] = net_balance
+    response['net_balance_formatted'] = format_currency(net_balance, display_currency)
+    return response
+
+def extract_pdf(document, source_currency, progress=None, on_amounts=None):
+    """Run text and table extraction on a PdfDocument
+    
+    Amounts stay in the source currency, in AmountStores, so the result can
+    be cached compactly and converted to any display currency afterwards. progress, if given, is
+    called as progress(stage, done, total) for the 'text' and 'tables' stages.
+    on_amounts, if given, is called as on_amounts(source, page, amounts) with
+    the amount records of each page as soon as they are known: text amounts
+    page by page while reading, table amounts once the tables are done.
+    """
+    def stage_progress(stage):
+        return (lambda done, total: progress(stage, done, total)) if progress else None
+    
+    # Process PDF with text extraction (page-parallel for large documents)
+    text_amounts = []
+    page_count = document.page_count
+    text_progress = stage_progress('text')
+    
+    for page_num, text in enumerate(iter_page_texts(document.source, reader=document.reader)):
+        amounts = extract_amounts_from_text(text, source_currency)
+        
+        page_amounts = [
+            {'page': page_num + 1, 'amount': amount_data['original_amount'], 'source': 'text'}
+            for amount_data in amounts
+        ]
+        text_amounts.extend(page_amounts)
+        if on_amounts:
+            on_amounts('text', page_num + 1, page_amounts)
+        if text_progress:
+            text_progress(page_num + 1, page_count)
     
+    # Process tables
+    table_stores = []
+    transaction_frames = []
+    failed_pages = []
+    tables_ok = True
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
+        # tabula needs a file on disk; the document writes it at most once
+        dfs = read_pdf_tables(document.path(), page_count, failed_pages=failed_pages, progress=stage_progress('tables'))
         
-        # Process PDF with text extraction
-        all_amounts = []
-        with open(tmp_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            page_count = len(pdf_reader.pages)
+        for i, df in enumerate(dfs):
+            # Classify CR/DR transactions in this table
+            transactions = classify_transaction_type(df, i + 1)
+            if not transactions.empty:
+                transaction_frames.append(transactions)
             
-            for page_num in range(page_count):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                amounts = extract_amounts_from_text(text, source_currency)
-                
-                for amount_data in amounts:
-                    converted_amount = convert_currency(
-                        amount_data['original_amount'], 
-                        source_currency, 
-                        display_currency
-                    )
-                    all_amounts.append({
-                        'page': page_num + 1,
-                        'amount': converted_amount,
-                        'source': 'text'
-                    })
-        
-        # Process tables
-        table_amounts = []
-        transactions = []
+            # Extract amounts from all table cells in bulk
+            amounts_frame = scan_table_amounts(df, i + 1)
+            table_stores.append(AmountStore.from_columns(
+                amounts_frame['amount'].to_numpy(dtype=float),
+                source='table',
+                currency=source_currency,
+                table=[i + 1] * len(amounts_frame),
+                page=[df.attrs.get('page')] * len(amounts_frame),
+                date=row_dates(amounts_frame['row'].to_numpy(), transactions)
+            ))
+    except Exception as e:
+        print(f"Table extraction error: {e}")
+        tables_ok = False
+    
+    table_amounts = AmountStore.concat(table_stores, currency=source_currency)
+    if on_amounts:
+        emit_amounts_by_page('table', table_amounts.records(), on_amounts)
+    
+    return {
+        'page_count': page_count,
+        'text_amounts': AmountStore.from_records(text_amounts, currency=source_currency),
+        'table_amounts': table_amounts,
+        'transactions': pd.concat(transaction_frames, ignore_index=True) if transaction_frames else None,
+        'failed_pages': failed_pages,
+        'tables_ok': tables_ok and not failed_pages
+    }
+
+def emit_amounts_by_page(source, amounts, on_amounts):
+    """Call on_amounts(source, page, amounts) once per page, in page order (unknown pages last)"""
+    by_page = {}
+    for item in amounts:
+        by_page.setdefault(item.get('page'), []).append(item)
+    for page in sorted(by_page, key=lambda page: (page is None, page or 0)):
+        on_amounts(source, page, by_page[page])
+
+def extract_pdf_cached(document, source_currency, progress=None, on_amounts=None):
+    """Return the extraction result for a PDF, reusing the result cache when possible
+    
+    On a cache hit progress and on_amounts are replayed from the stored result.
+    """
+    key = cache_key(
+        document.digest,
+        EXTRACTOR_VERSION,
+        pipeline='api',
+        source_currency=source_currency,
+        table_backend=get_table_extractor().backend  # Results of different table backends are kept apart
+    )
+    extracted = RESULT_CACHE.get(key)
+    if extracted is None:
+        extracted = extract_pdf(document, source_currency, progress=progress, on_amounts=on_amounts)
+        if extracted['tables_ok']:
+            RESULT_CACHE.put(key, extracted)
+        return extracted
+    
+    if on_amounts:
+        emit_amounts_by_page('text', extracted['text_amounts'].records(), on_amounts)
+        emit_amounts_by_page('table', extracted['table_amounts'].records(), on_amounts)
+    if progress:
+        for stage in ['text', 'tables']:
+            progress(stage, extracted['page_count'], extracted['page_count'])
+    return extracted
+
+def build_analysis_response(extracted, source_currency, display_currency):
+    """Build the /analyze response body in the display currency"""
+    amounts = AmountStore.concat([extracted['text_amounts'], extracted['table_amounts']])
+    combined_amounts = convert_amount_records(amounts.records(), source_currency, display_currency)
+    
+    # Calculate metrics in a single pass; in the PDF currency the totals are exact minor-unit sums
+    if source_currency == display_currency:
+        summary = amounts.summary()
+    else:
+        summary = aggregate_amounts(pd.DataFrame({'amount': [item['amount'] for item in combined_amounts]}))
+    metrics = {
+        'count': int(summary['count']),
+        'total': float(summary['total']),
+        'avg': float(summary['average']),
+        'max': float(summary['max']),
+        'min': float(summary['min']),
+        'total_formatted': format_currency(summary['total'], display_currency),
+        'avg_formatted': format_currency(summary['average'], display_currency),
+        'max_formatted': format_currency(summary['max'], display_currency),
+        'min_formatted': format_currency(summary['min'], display_currency)
+    }
+    
+    # Credit/Debit aggregates (transactions are classified in the source currency
+    # and converted first, each at the rate of its date)
+    cr_dr_analysis = None
+    if extracted['transactions'] is not None:
+        cr_dr_analysis = build_cr_dr_response(
+            analyze_cr_dr_data(convert_amount_frame(extracted['transactions'], source_currency, display_currency)),
+            display_currency
+        )
+    
+    return {
+        'success': True,
+        'amounts': combined_amounts,
+        'metrics': metrics,
+        'cr_dr_analysis': cr_dr_analysis,
+        'page_count': extracted['page_count'],
+        'table_failed_pages': extracted['failed_pages'],
+        'out_of_range_amounts': amounts.out_of_range,
+        'source_currency': source_currency,
+        'display_currency': display_currency
+    }
+
+def analyze_upload(pdf_source, filename, digest, source_currency, display_currency):
+    """Extract and analyze an uploaded PDF given as bytes or a path (blocking; runs on the analysis executor)"""
+    with PdfDocument.from_source(pdf_source, name=filename, digest=digest) as document:
+        extracted = extract_pdf_cached(document, source_currency)
+    return build_analysis_response(extracted, source_currency, display_currency)
+
+def remember_analysis(response):
+    """Keep what /query needs on the server and tag the response with its analysis_id"""
+    stored = StoredAnalysis(
+        AmountIndex.from_records(response['amounts']),
+        response['display_currency'],
+        metrics=response['metrics'],
+        cr_dr_analysis=response['cr_dr_analysis']
+    )
+    response['analysis_id'] = ANALYSIS_STORE.put(stored)
+    return response
+
+def run_analysis_job(pdf_path, params, progress):
+    """Job queue handler: analyze a queued PDF with per-stage progress"""
+    source_currency = params.get('source_currency', 'INR')
+    display_currency = params.get('display_currency', 'INR')
+    with PdfDocument.from_path(pdf_path) as document:
+        extracted = extract_pdf_cached(document, source_currency, progress=progress)
+    progress('analysis', 0, 1)
+    response = remember_analysis(build_analysis_response(extracted, source_currency, display_currency))
+    progress('analysis', 1, 1)
+    return response
+
+# Background analysis for documents too large to finish within a request timeout
+JOB_QUEUE = JobQueue(run_analysis_job)
+
+# Streaming responses: NDJSON lines or Server-Sent Events
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+class StreamCancelled(Exception):
+    """Raised inside a streamed analysis once its client has gone away"""
+
+def get_thread_executor():
+    """Executor for analyses that report back while they run (these need a thread, not a process)"""
+    executor = get_analysis_executor()
+    return executor if isinstance(executor, ThreadPoolExecutor) else None  # None = the loop's default thread pool
+
+def encode_stream_event(event, stream_format):
+    """Serialize one stream event as an NDJSON line or an SSE message"""
+    payload = json.dumps(event, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
+    if stream_format == 'sse':
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+def stream_analysis(document, source_currency, display_currency, emit, cancelled):
+    """Analyze a PdfDocument, reporting progress through emit(event) (blocking; closes the document)
+    
+    Events, in order: 'start'; an 'amounts' batch per page (text amounts while
+    pages are read, then table amounts) carrying running metrics; 'progress'
+    for the table pass; and a closing 'summary', which is the /analyze
+    response without the amounts already sent in the batches.
+    """
+    running = {'count': 0, 'total': 0.0, 'min': None, 'max': None}
+    
+    def send(event):
+        if cancelled.is_set():
+            raise StreamCancelled()
+        emit(event)
+    
+    def on_amounts(source, page, amounts):
+        converted = convert_amount_records(amounts, source_currency, display_currency)
+        values = [item['amount'] for item in converted]
+        if values:
+            running['count'] += len(values)
+            running['total'] += sum(values)
+            running['min'] = min(values + ([running['min']] if running['min'] is not None else []))
+            running['max'] = max(values + ([running['max']] if running['max'] is not None else []))
+        average = running['total'] / running['count'] if running['count'] else 0
+        send({
+            'type': 'amounts',
+            'source': source,
+            'page': page,
+            'amounts': converted,
+            'running': {
+                'count': running['count'],
+                'total': running['total'],
+                'avg': average,
+                'max': running['max'] or 0,
+                'min': running['min'] or 0,
+                'total_formatted': format_currency(running['total'], display_currency),
+                'avg_formatted': format_currency(average, display_currency),
+                'max_formatted': format_currency(running['max'] or 0, display_currency),
+                'min_formatted': format_currency(running['min'] or 0, display_currency)
+            }
+        })
+    
+    def progress(stage, done, total):
+        # Text progress is implied by the per-page amounts batches
+        if stage != 'text':
+            send({'type': 'progress', 'stage': stage, 'done': done, 'total': total})
+    
+    with document:
+        send({'type': 'start', 'filename': document.name, 'page_count': document.page_count})
+        extracted = extract_pdf_cached(document, source_currency, progress=progress, on_amounts=on_amounts)
+    
+    response = remember_analysis(build_analysis_response(extracted, source_currency, display_currency))
+    response.pop('amounts')
+    send({**response, 'type': 'summary'})
+
+# Batch analysis: many PDFs per request, uploaded side by side or inside ZIP archives
+def batch_failure(filename, error):
+    """Result entry of a batch document that could not be analyzed"""
+    return {'filename': filename, 'success': False, 'error': error}
+
+def read_archive_member(archive, info):
+    """Copy one ZIP member into a PdfDocument spooled to disk, like batch uploads (blocking)"""
+    spool = DocumentSpool(info.filename, 0)
+    try:
+        with archive.open(info) as member:
+            for chunk in iter(lambda: member.read(UPLOAD_CHUNK_BYTES), b''):
+                spool.write(chunk)
+    except BaseException:
+        spool.discard()
+        raise
+    return spool.finish()
+
+def unpack_pdf_archive(archive, max_files, max_bytes):
+    """Unpack the PDFs of an uploaded ZIP archive (blocking)
+    
+    Returns one entry per PDF member in archive order: a PdfDocument, or a
+    batch_failure for members that are too large or cannot be read. Going
+    over max_files documents or max_bytes in total rejects the whole batch.
+    """
+    entries = []
+    total_bytes = 0
+    try:
+        with archive.stream() as stream, zipfile.ZipFile(stream) as zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.pdf') or info.filename.startswith('__MACOSX/'):
+                    continue
+                if len(entries) >= max_files:
+                    raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {BATCH_MAX_FILES} documents")
+                if info.file_size > UPLOAD_MAX_BYTES:
+                    entries.append(batch_failure(info.filename, upload_too_large_message()))
+                    continue
+                total_bytes += info.file_size
+                if total_bytes > max_bytes:
+                    raise HTTPException(status_code=413, detail=upload_too_large_message(BATCH_MAX_BYTES))
+                try:
+                    entries.append(read_archive_member(zip_file, info))
+                except Exception as e:
+                    entries.append(batch_failure(info.filename, f"Error reading from archive: {str(e)}"))
+    except BaseException as e:
+        close_batch_entries(entries)
+        if isinstance(e, zipfile.BadZipFile):
+            raise HTTPException(status_code=400, detail=f"{archive.name} is not a valid ZIP archive")
+        raise
+    return entries
+
+def close_batch_entries(entries):
+    for entry in entries:
+        if isinstance(entry, PdfDocument):
+            entry.close()
+
+async def analyze_batch_entry(entry, semaphore, source_currency, display_currency):
+    """Analyze one batch document on the analysis executor, turning errors into a failure entry"""
+    if not isinstance(entry, PdfDocument):
+        return entry
+    with entry:
+        async with semaphore:
+            try:
+                response = await run_analysis(
+                    analyze_upload,
+                    entry.source,
+                    entry.name,
+                    entry.digest,
+                    source_currency,
+                    display_currency
+                )
+            except Exception as e:
+                return batch_failure(entry.name, f"Error processing PDF: {str(e)}")
+    return {'filename': entry.name, **remember_analysis(response)}
+
+def combine_stats(parts, average_key):
+    """Merge count/total/average/max/min summaries of several documents"""
+    parts = [part for part in parts if part['count']]
+    count = sum(part['count'] for part in parts)
+    total = sum(part['total'] for part in parts)
+    return {
+        'count': count,
+        'total': total,
+        average_key: total / count if count else 0,
+        'max': max((part['max'] for part in parts), default=0),
+        'min': min((part['min'] for part in parts), default=0)
+    }
+
+def format_stats(stats, display_currency):
+    """Add *_formatted fields for the money values of a summary"""
+    formatted = {f'{field}_formatted': format_currency(value, display_currency) for field, value in stats.items() if field != 'count'}
+    return {**stats, **formatted}
+
+def build_batch_summary(results, display_currency):
+    """Combined metrics and CR/DR analysis over the documents of a batch that succeeded
+    
+    The combined amounts are stored like a single analysis, so its
+    analysis_id can be used with /query to ask about the whole batch.
+    """
+    succeeded = [result for result in results if result['success']]
+    metrics = format_stats(combine_stats([result['metrics'] for result in succeeded], 'avg'), display_currency)
+    
+    cr_dr_analysis = None
+    analyses = [result['cr_dr_analysis'] for result in succeeded if result['cr_dr_analysis']]
+    if analyses:
+        cr_dr_analysis = {
+            key: format_stats(combine_stats([analysis[key] for analysis in analyses], 'average'), display_currency)
+            for key in ['credit', 'debit', 'unknown']
+        }
+        net_balance = cr_dr_analysis['credit']['total'] - cr_dr_analysis['debit']['total']
+        cr_dr_analysis['net_balance'] = net_balance
+        cr_dr_analysis['net_balance_formatted'] = format_currency(net_balance, display_currency)
+    
+    index = AmountIndex([item['amount'] for result in succeeded for item in result['amounts']])
+    analysis_id = ANALYSIS_STORE.put(StoredAnalysis(index, display_currency, metrics=metrics, cr_dr_analysis=cr_dr_analysis))
+    return {
+        'documents': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'page_count': sum(result['page_count'] for result in succeeded),
+        'metrics': metrics,
+        'cr_dr_analysis': cr_dr_analysis,
+        'display_currency': display_currency,
+        'analysis_id': analysis_id
+    }
+
+@app.get("/health")
+async def health():
+    """Report table extraction backend health and analysis load"""
+    status = await asyncio.get_running_loop().run_in_executor(None, get_table_extractor().health_check)
+    status['analysis'] = {
+        'executor': ANALYSIS_EXECUTOR,
+        'in_flight': _analyses_in_flight,
+        'limit': ANALYSIS_WORKERS + ANALYSIS_QUEUE_SIZE
+    }
+    status['jobs'] = await asyncio.get_running_loop().run_in_executor(None, JOB_QUEUE.stats)
+    status['analysis_store'] = ANALYSIS_STORE.stats()
+    return status
+
+@app.post("/analyze")
+async def analyze_pdf(request: Request):
+    """Analyze uploaded PDF and extract financial data
+    
+    Form fields: file (the PDF), source_currency and display_currency (default INR).
+    """
+    
+    document, fields = await read_pdf_upload(request)
+    source_currency = fields.get('source_currency', 'INR')
+    display_currency = fields.get('display_currency', 'INR')
+    with document:
         try:
-            dfs = tabula.read_pdf(tmp_path, pages='all', multiple_tables=True)
+            response = await run_analysis(
+                analyze_upload,
+                document.source,
+                document.name,
+                document.digest,
+                source_currency,
+                display_currency
+            )
+            return remember_analysis(response)
             
-            for i, df in enumerate(dfs):
-                # Extract amounts from tables
-                for col in df.columns:
-                    for idx, value in enumerate(df[col]):
-                        if pd.notna(value):
-                            value_str = str(value)
-                            amounts = extract_amounts_from_text(value_str, source_currency)
-                            for amount_data in amounts:
-                                converted_amount = convert_currency(
-                                    amount_data['original_amount'],
-                                    source_currency,
-                                    display_currency
-                                )
-                                table_amounts.append({
-                                    'table': i+1,
-                                    'amount': converted_amount,
-                                    'source': 'table'
-                                })
         except Exception as e:
-            print(f"Table extraction error: {e}")
-        
-        # Combine all amounts
-        combined_amounts = all_amounts + table_amounts
-        
-        # Calculate metrics
-        amounts_only = [item['amount'] for item in combined_amounts]
-        metrics = {
-            'count': len(amounts_only),
-            'total': sum(amounts_only) if amounts_only else 0,
-            'avg': sum(amounts_only) / len(amounts_only) if amounts_only else 0,
-            'max': max(amounts_only) if amounts_only else 0,
-            'min': min(amounts_only) if amounts_only else 0,
-            'total_formatted': format_currency(sum(amounts_only) if amounts_only else 0, display_currency),
-            'avg_formatted': format_currency(sum(amounts_only) / len(amounts_only) if amounts_only else 0, display_currency),
-            'max_formatted': format_currency(max(amounts_only) if amounts_only else 0, display_currency),
-            'min_formatted': format_currency(min(amounts_only) if amounts_only else 0, display_currency)
-        }
-        
-        # Clean up temp file
-        os.unlink(tmp_path)
-        
-        return {
-            'success': True,
-            'amounts': combined_amounts,
-            'metrics': metrics,
-            'page_count': page_count,
-            'source_currency': source_currency,
-            'display_currency': display_currency
-        }
-        
-    except Exception as e:
-        # Clean up temp file if it exists
-        if 'tmp_path' in locals():
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-        
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+
+@app.post("/analyze/stream")
+async def analyze_pdf_stream(request: Request):
+    """Analyze uploaded PDF, streaming page-level results as NDJSON or Server-Sent Events
+    
+    Takes the form fields of /analyze plus stream_format (ndjson or sse, default ndjson).
+    """
+    
+    document, fields = await read_pdf_upload(request)
+    source_currency = fields.get('source_currency', 'INR')
+    display_currency = fields.get('display_currency', 'INR')
+    stream_format = fields.get('stream_format', 'ndjson')
+    if stream_format not in STREAM_FORMATS:
+        document.close()
+        raise HTTPException(status_code=400, detail=f"stream_format must be one of {', '.join(STREAM_FORMATS)}")
+    
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+    
+    def emit(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+    
+    slot = request.state.analysis_slot
+    
+    def run():
+        try:
+            stream_analysis(document, source_currency, display_currency, emit, cancelled)
+        except StreamCancelled:
+            pass
+        except Exception as e:
+            emit({'type': 'error', 'detail': f"Error processing PDF: {str(e)}"})
+        finally:
+            document.close()
+            loop.call_soon_threadsafe(slot.release)
+            emit(None)  # End of stream
+    
+    # Started here rather than in the generator, which may never run if the client goes away early
+    try:
+        worker = loop.run_in_executor(get_thread_executor(), run)
+    except BaseException:
+        document.close()
+        raise
+    # The slot is held until the analysis itself ends, so run() releases it
+    slot.handed_off = True
+    
+    async def event_stream():
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield encode_stream_event(event, stream_format)
+            await worker
+        finally:
+            # Stops the analysis at its next event if the client disconnected
+            cancelled.set()
+    
+    return StreamingResponse(event_stream(), media_type=STREAM_FORMATS[stream_format])
+
+@app.post("/analyze/batch")
+async def analyze_pdf_batch(request: Request):
+    """Analyze several PDFs (uploaded side by side or in ZIP archives) and combine the results
+    
+    Form fields: files (repeated, PDFs or ZIP archives), source_currency and
+    display_currency. Up to BATCH_WORKERS documents run concurrently on the
+    analysis executor, reusing the warm table extractor: the request's own
+    analysis slot covers one, and a slot for each further one is reserved
+    through admission before the documents start, so a batch never runs
+    more documents than admission has counted. Documents are
+    spooled to disk rather than held in memory. A document that fails is
+    reported in its result entry and does not stop the rest of the batch.
+    """
+    
+    loop = asyncio.get_running_loop()
+    fields, files = await read_upload(
+        request,
+        {'.pdf': UPLOAD_MAX_BYTES, '.zip': BATCH_MAX_BYTES},
+        max_bytes=BATCH_MAX_BYTES,
+        max_files=BATCH_MAX_FILES,
+        memory_bytes=0
+    )
+    source_currency = fields.get('source_currency', 'INR')
+    display_currency = fields.get('display_currency', 'INR')
+    entries = []
+    try:
+        for index, (_, filename, upload) in enumerate(files):
+            remaining_bytes = BATCH_MAX_BYTES - sum(entry.size for entry in entries if isinstance(entry, PdfDocument))
+            if upload is None:
+                entries.append(batch_failure(filename, "Only PDF and ZIP files are supported"))
+            elif filename.lower().endswith('.zip'):
+                with upload:
+                    entries.extend(await loop.run_in_executor(
+                        None, unpack_pdf_archive, upload, BATCH_MAX_FILES - len(entries), remaining_bytes
+                    ))
+            else:
+                entries.append(upload)
+                if len(entries) > BATCH_MAX_FILES:
+                    raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {BATCH_MAX_FILES} documents")
+                if upload.size > remaining_bytes:
+                    raise HTTPException(status_code=413, detail=upload_too_large_message(BATCH_MAX_BYTES))
+            files[index] = None  # Now owned by entries
+    except BaseException:
+        close_batch_entries(entries)
+        close_batch_entries(upload for _, _, upload in filter(None, files))
+        raise
+    
+    if not any(isinstance(entry, PdfDocument) for entry in entries):
+        close_batch_entries(entries)
+        raise HTTPException(status_code=400, detail="No PDF files found in the batch")
+    
+    # Each running document takes an executor worker and an analysis slot of its own
+    document_count = sum(isinstance(entry, PdfDocument) for entry in entries)
+    extra_slots = reserve_analysis_slots(min(BATCH_WORKERS, document_count) - 1)
+    semaphore = asyncio.Semaphore(1 + len(extra_slots))
+    try:
+        results = await asyncio.gather(*[
+            analyze_batch_entry(entry, semaphore, source_currency, display_currency)
+            for entry in entries
+        ])
+    finally:
+        for slot in extra_slots:
+            slot.release()
+    
+    return {
+        'success': True,
+        'results': results,
+        'summary': build_batch_summary(results, display_currency)
+    }
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request):
+    """Queue a PDF for background analysis and return its job id immediately
+    
+    Takes the form fields of /analyze.
+    """
+    
+    document, fields = await read_pdf_upload(request)
+    source_currency = fields.get('source_currency', 'INR')
+    display_currency = fields.get('display_currency', 'INR')
+    with document:
+        job_id = await asyncio.get_running_loop().run_in_executor(
+            None,
+            JOB_QUEUE.submit,
+            document,
+            {'source_currency': source_currency, 'display_currency': display_currency}
+        )
+    return {
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/jobs/{job_id}',
+        'result_url': f'/jobs/{job_id}/result'
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the status and per-stage progress of a job"""
+    job = await asyncio.get_running_loop().run_in_executor(None, JOB_QUEUE.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Return the analysis of a finished job"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, JOB_QUEUE.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {job['error']}")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return await loop.run_in_executor(None, JOB_QUEUE.result, job_id)
+
+def answer_amount_query(query, index, display_currency):
+    """Answer a simple question about an analysis from its AmountIndex"""
+    numbers = [float(number) for number in re.findall(r'\d+(?:\.\d+)?', query)]
+    top_match = re.search(r'\b(top|largest|biggest)\s+(\d+)', query)
+    
+    if top_match:
+        _, values = index.top(int(top_match.group(2)))
+        answer = f"Top {len(values)} Amounts: " + ", ".join(format_currency(value, display_currency) for value in values)
+    elif any(word in query for word in ['total', 'sum']):
+        answer = f"Total Amount: {format_currency(index.total, display_currency)}"
+    elif any(word in query for word in ['count', 'how many', 'number']) and not numbers:
+        answer = f"Total Records: {len(index)} amounts found"
+    elif any(word in query for word in ['average', 'mean']):
+        answer = f"Average Amount: {format_currency(index.mean, display_currency)}"
+    elif any(word in query for word in ['highest', 'maximum', 'max']):
+        answer = f"Highest Amount: {format_currency(index.max, display_currency)}"
+    elif any(word in query for word in ['lowest', 'minimum', 'min']):
+        answer = f"Lowest Amount: {format_currency(index.min, display_currency)}"
+    elif 'between' in query and len(numbers) >= 2:
+        count, total = index.between(numbers[0], numbers[1])
+        answer = f"Amounts between {format_currency(numbers[0], display_currency)} - {format_currency(numbers[1], display_currency)}: {count} records, Total: {format_currency(total, display_currency)}"
+    elif any(word in query for word in ['greater than', 'more than', 'above']) and numbers:
+        count, total = index.above(numbers[0])
+        answer = f"Amounts above {format_currency(numbers[0], display_currency)}: {count} records, Total: {format_currency(total, display_currency)}"
+    elif any(word in query for word in ['less than', 'below', 'under']) and numbers:
+        count, total = index.below(numbers[0])
+        answer = f"Amounts below {format_currency(numbers[0], display_currency)}: {count} records, Total: {format_currency(total, display_currency)}"
+    else:
+        # Default summary
+        answer = f"""Summary: {len(index)} records, Total: {format_currency(index.total, display_currency)}, Average: {format_currency(index.mean, display_currency)}"""
+    return answer
 
 @app.post("/query")
 async def process_query(request: dict):
-    """Process natural language queries about the data"""
+    """Process natural language queries about an analysis
     
-    try:
-        query = request.get('query', '').lower()
+    Expects {analysis_id, query} with the id returned by /analyze. Requests
+    that still send the full {data, display_currency} are answered as before.
+    """
+    
+    query = request.get('query', '').lower()
+    analysis_id = request.get('analysis_id')
+    if analysis_id:
+        analysis = ANALYSIS_STORE.get(analysis_id)
+        if analysis is None:
+            raise HTTPException(status_code=404, detail="Analysis not found or expired, please upload the PDF again")
+        index = analysis.index
+        display_currency = analysis.display_currency
+    else:
         data = request.get('data', {})
+        index = AmountIndex.from_records(data.get('amounts', []))
         display_currency = request.get('display_currency', 'INR')
-        
-        amounts = data.get('amounts', [])
-        if not amounts:
-            return {'answer': 'No data available to analyze.'}
-        
-        amounts_only = [item['amount'] for item in amounts]
-        
-        # Simple query processing
-        if any(word in query for word in ['total', 'sum']):
-            total = sum(amounts_only)
-            answer = f"Total Amount: {format_currency(total, display_currency)}"
-        elif any(word in query for word in ['count', 'how many', 'number']):
-            count = len(amounts_only)
-            answer = f"Total Records: {count} amounts found"
-        elif any(word in query for word in ['average', 'mean']):
-            avg = sum(amounts_only) / len(amounts_only)
-            answer = f"Average Amount: {format_currency(avg, display_currency)}"
-        elif any(word in query for word in ['highest', 'maximum', 'max']):
-            max_amount = max(amounts_only)
-            answer = f"Highest Amount: {format_currency(max_amount, display_currency)}"
-        elif any(word in query for word in ['lowest', 'minimum', 'min']):
-            min_amount = min(amounts_only)
-            answer = f"Lowest Amount: {format_currency(min_amount, display_currency)}"
-        else:
-            # Default summary
-            total = sum(amounts_only)
-            count = len(amounts_only)
-            avg = total / count
-            answer = f"""Summary: {count} records, Total: {format_currency(total, display_currency)}, Average: {format_currency(avg, display_currency)}"""
-        
-        return {'answer': answer}
+    
+    if len(index) == 0:
+        return {'answer': 'No data available to analyze.'}
+    
+    try:
+        return {'answer': answer_amount_query(query, index, display_currency)}
         
     except Exception as e:
         return {'answer': f'Error processing query: {str(e)}'}
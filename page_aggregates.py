@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the per-page table; the money columns scale with the currency rate
+PAGE_FIELDS = ['count', 'total', 'min', 'max', 'cr_count', 'cr_total', 'dr_count', 'dr_total']
+MONEY_FIELDS = ['total', 'min', 'max', 'cr_total', 'dr_total']
+# Columns that add up across pages and get prefix sums for range queries
+ADDITIVE_FIELDS = ['count', 'total', 'cr_count', 'cr_total', 'dr_count', 'dr_total']
+
+
+def _page_numbers(frame):
+    """Numeric page column of a frame, with unknown pages dropped"""
+    if frame is None or frame.empty or 'page' not in frame.columns:
+        return pd.DataFrame({'page': pd.Series(dtype=int), 'amount': pd.Series(dtype=float)})
+    pages = pd.to_numeric(frame['page'], errors='coerce')
+    known = pages.notna().to_numpy()
+    result = pd.DataFrame({
+        'page': pages[known].astype(int).to_numpy(),
+        'amount': frame['amount'].to_numpy(dtype=float)[known]
+    })
+    if 'type' in frame.columns:
+        result['type'] = frame['type'].to_numpy()[known]
+    return result
+
+
+class PageAggregates:
+    """Per-page amount statistics computed once per document
+
+    table is a DataFrame indexed by page number (1..page_count, pages
+    without amounts included) with the amount count, total, min and max and
+    the CR/DR transaction counts and totals of every page. Prefix sums over
+    the additive columns answer page-range totals with two lookups; range
+    min/max read one row per page.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._prefix = {
+            field: np.concatenate([[0.0], np.cumsum(table[field].to_numpy(dtype=float))])
+            for field in ADDITIVE_FIELDS
+        }
+
+    @classmethod
+    def build(cls, amounts, transactions=None, page_count=0):
+        """Aggregate amount records (page, amount) and classified transactions (page, amount, type) by page"""
+        amounts = _page_numbers(amounts)
+        transactions = _page_numbers(transactions)
+        last_page = max([page_count] + [int(frame['page'].max()) for frame in [amounts, transactions] if len(frame)])
+        pages = pd.RangeIndex(1, last_page + 1, name='page')
+
+        table = amounts.groupby('page')['amount'].agg(['count', 'sum', 'min', 'max']).rename(columns={'sum': 'total'})
+        table = table.reindex(pages)
+        table[['count', 'total']] = table[['count', 'total']].fillna(0)
+
+        for trans_type, prefix in [('CR', 'cr'), ('DR', 'dr')]:
+            typed = transactions[transactions['type'] == trans_type] if 'type' in transactions.columns else transactions.iloc[0:0]
+            stats = typed.groupby('page')['amount'].agg(['count', 'sum']).reindex(pages).fillna(0)
+            table[f'{prefix}_count'] = stats['count']
+            table[f'{prefix}_total'] = stats['sum']
+
+        table = table.astype({'count': int, 'cr_count': int, 'dr_count': int})
+        return cls(table[PAGE_FIELDS])
+
+    @property
+    def page_count(self):
+        return len(self.table)
+
+    def scaled(self, rate):
+        """Return a copy with the money columns multiplied by a currency rate"""
+        table = self.table.copy()
+        table[MONEY_FIELDS] = table[MONEY_FIELDS] * rate
+        return PageAggregates(table)
+
+    def pages_with_amounts(self):
+        """The per-page table restricted to pages that have amounts"""
+        return self.table[self.table['count'] > 0]
+
+    def range_stats(self, first, last):
+        """Statistics of pages first..last (1-based, inclusive), clipped to the document"""
+        first = max(1, first)
+        last = min(self.page_count, last)
+        if last < first:
+            return dict({field: 0 for field in PAGE_FIELDS}, first=first, last=last)
+        stats = {
+            field: float(self._prefix[field][last] - self._prefix[field][first - 1])
+            for field in ADDITIVE_FIELDS
+        }
+        for field in ['count', 'cr_count', 'dr_count']:
+            stats[field] = int(stats[field])
+        rows = self.table.iloc[first - 1:last]
+        stats['min'] = float(rows['min'].min()) if stats['count'] else 0.0
+        stats['max'] = float(rows['max'].max()) if stats['count'] else 0.0
+        stats['first'] = first
+        stats['last'] = last
+        return stats
+
+    def page_stats(self, page):
+        """Statistics of a single page"""
+        return self.range_stats(page, page)
+
+    def busiest_page(self):
+        """Page with the most amounts, or None if there are none"""
+        if not self.page_count or self.table['count'].max() == 0:
+            return None
+        return int(self.table['count'].idxmax())
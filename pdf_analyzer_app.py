@@ -2,28 +2,56 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import tabula
-import PyPDF2
 import re
-import os
-import tempfile
 from decimal import Decimal
 import numpy as np
 from datetime import datetime
 import io
+import time
 import requests
 
-# Currency exchange rates (you can update these or fetch from an API)
-CURRENCY_RATES = {
-    'INR': 1.0,  # Base currency (Indian Rupees)
-    'USD': 0.012,  # 1 INR = 0.012 USD (approximate)
-    'EUR': 0.011,  # 1 INR = 0.011 EUR (approximate)
-    'GBP': 0.0095,  # 1 INR = 0.0095 GBP (approximate)
-    'JPY': 1.8,    # 1 INR = 1.8 JPY (approximate)
-    'CAD': 0.016,  # 1 INR = 0.016 CAD (approximate)
-    'AUD': 0.018,  # 1 INR = 0.018 AUD (approximate)
-    'CNY': 0.086,  # 1 INR = 0.086 CNY (approximate)
+from amount_tokenizer import AMOUNT_CELL_RE, CURRENCY_MARKERS, tokenize_amounts
+from result_cache import RESULT_CACHE, cache_key, pdf_digest
+from pdf_document import PdfDocument
+from pdf_text import extract_page_texts, iter_page_texts
+from amount_index import AmountIndex
+from amount_store import AmountStore
+from page_aggregates import PageAggregates
+from exporters import DOWNLOAD_FORMATS, available_formats, frame_to_bytes
+from currency import convert_amount_frame, convert_currency, get_rate_history, get_rate_matrix
+from tabula_backend import get_table_extractor, read_pdf_tables
+
+# Session state slot holding the processed results of the current upload
+PROCESSED_PDF_STATE_KEY = 'processed_pdf'
+
+# Seconds between updates of the partial results while processing progressively
+PROGRESSIVE_RENDER_INTERVAL = 0.5
+
+# Bump whenever extraction output changes, so cached results are not reused
+EXTRACTOR_VERSION = '6'
+
+# Column name keywords that mark a table column as holding amounts
+AMOUNT_COLUMN_KEYWORDS = ['amount', 'balance', 'total', 'sum', 'value', 'price', 'cost']
+
+# Columns of the tidy frame returned by scan_table_amounts
+TABLE_AMOUNT_FIELDS = ['table', 'page', 'row', 'column', 'amount', 'currency', 'raw_text']
+
+# Dedupe modes for table amounts and the fields each one keys on
+#   'value' - keep the first occurrence of every amount value in the document
+#   'cell'  - keep one entry per (table, row, column, amount)
+#   'none'  - keep every extracted amount
+DEDUPE_KEYS = {
+    'value': ['amount'],
+    'cell': ['table', 'row', 'column', 'amount'],
+    'none': None,
 }
+DEFAULT_TABLE_DEDUPE = 'cell'
+
+# Aggregates computed by aggregate_amounts for every group
+AGGREGATE_FIELDS = ['count', 'total', 'average', 'min', 'max']
+
+# Columns of the transactions frame returned by classify_transaction_type
+TRANSACTION_FIELDS = ['table', 'page', 'row', 'date', 'description', 'amount', 'type']
 
 CURRENCY_SYMBOLS = {
     'INR': '₹',
@@ -36,32 +64,6 @@ CURRENCY_SYMBOLS = {
     'CNY': '¥',
 }
 
-def get_exchange_rates():
-    """Fetch real-time exchange rates (optional enhancement)"""
-    try:
-        # You can use a free API like exchangerate-api.com
-        # For now, we'll use static rates
-        return CURRENCY_RATES
-    except:
-        return CURRENCY_RATES
-
-def convert_currency(amount, from_currency='INR', to_currency='INR'):
-    """Convert amount from one currency to another"""
-    if from_currency == to_currency:
-        return amount
-    
-    rates = get_exchange_rates()
-    
-    # Convert to base currency (INR) first, then to target currency
-    if from_currency != 'INR':
-        amount_in_inr = amount / rates[from_currency]
-    else:
-        amount_in_inr = amount
-    
-    # Convert from INR to target currency
-    converted_amount = amount_in_inr * rates[to_currency]
-    return converted_amount
-
 def format_currency(amount, currency='INR'):
     """Format amount with appropriate currency symbol"""
     symbol = CURRENCY_SYMBOLS.get(currency, currency)
@@ -72,264 +74,448 @@ def format_currency(amount, currency='INR'):
         return f"{symbol}{amount:,.2f}"
 
 def extract_amounts_from_text(text, source_currency='INR'):
-    """Extract monetary amounts from text using regex patterns"""
-    patterns = [
-        r'₹\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',  # ₹1,234.56 (Rupees)
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?\s*₹',  # 1,234.56₹
-        r'\$\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',  # $1,234.56
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?\s*\$',  # 1,234.56$
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?',       # 1,234.56 (plain numbers)
-        r'(?:USD|usd|INR|inr|EUR|eur)\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',  # Currency prefix
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?\s*(?:USD|usd|INR|inr|EUR|eur)',  # Currency suffix
-    ]
-    
+    """Extract monetary amounts from text using the precompiled amount tokenizer"""
     amounts = []
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
-            # Clean the match and convert to float
-            clean_amount = re.sub(r'[^\d.,]', '', match)
-            if clean_amount and '.' in clean_amount:
-                try:
-                    amount = float(clean_amount.replace(',', ''))
-                    if amount > 0:  # Only positive amounts
-                        amounts.append({
-                            'original_amount': amount,
-                            'source_currency': source_currency,
-                            'raw_text': match
-                        })
-                except ValueError:
-                    continue
-            elif clean_amount and clean_amount.isdigit():
-                try:
-                    amount = float(clean_amount)
-                    if amount > 0:
-                        amounts.append({
-                            'original_amount': amount,
-                            'source_currency': source_currency,
-                            'raw_text': match
-                        })
-                except ValueError:
-                    continue
+    for amount, currency, raw_text, start, end in tokenize_amounts(text):
+        amounts.append({
+            'original_amount': amount,
+            'source_currency': source_currency,
+            'currency': currency,  # Currency marker found next to the number, if any
+            'raw_text': raw_text,
+            'span': (start, end)
+        })
     
     return amounts
 
-def read_pdf_text(pdf_file):
-    """Extract text from all pages of PDF"""
+def is_amount_column(col):
+    """Check whether a column name looks like it holds amounts"""
+    col_str = str(col).lower()
+    return any(keyword in col_str for keyword in AMOUNT_COLUMN_KEYWORDS)
+
+def scan_table_amounts(df, table_num=1):
+    """Extract amounts from every cell of a table with vectorized string operations
+    
+    Returns a tidy DataFrame with one row per amount and its table/page/row/column
+    provenance (the page comes from df.attrs).
+    Cells are scanned column by column, top to bottom.
+    """
+    values = df.to_numpy(dtype=object)
+    cols, rows = np.nonzero(pd.notna(values).T)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=TABLE_AMOUNT_FIELDS)
+    
+    cells = pd.Series(values[rows, cols]).astype(str)
+    matches = cells.str.extractall(AMOUNT_CELL_RE)
+    if matches.empty:
+        return pd.DataFrame(columns=TABLE_AMOUNT_FIELDS)
+    
+    # Map every match back to the cell it came from
+    cell_idx = matches.index.get_level_values(0).to_numpy()
+    amounts = (matches['number'].str.replace(',', '', regex=False) + matches['fraction'].fillna('')).astype(float)
+    currencies = matches['prefix'].fillna(matches['suffix']).str.upper().map(CURRENCY_MARKERS)
+    
+    frame = pd.DataFrame({
+        'table': table_num,
+        'page': df.attrs.get('page'),
+        'row': rows[cell_idx] + 1,
+        'column': df.columns.to_numpy()[cols[cell_idx]],
+        'amount': amounts.to_numpy(),
+        'currency': currencies.to_numpy(),
+        'raw_text': matches['raw_text'].to_numpy()
+    })
+    return frame[frame['amount'] > 0].reset_index(drop=True)
+
+def dedupe_table_amounts(amounts_frame, seen, dedupe=DEFAULT_TABLE_DEDUPE):
+    """Drop amounts whose dedupe key is already in the seen index
+    
+    seen is a set shared across tables and updated in place, so every lookup is O(1).
+    """
+    if dedupe not in DEDUPE_KEYS:
+        raise ValueError(f"Unknown dedupe mode: {dedupe}")
+    
+    key_fields = DEDUPE_KEYS[dedupe]
+    if key_fields is None or amounts_frame.empty:
+        return amounts_frame
+    
+    keep = []
+    for key in zip(*(amounts_frame[field].tolist() for field in key_fields)):
+        if key in seen:
+            keep.append(False)
+        else:
+            seen.add(key)
+            keep.append(True)
+    return amounts_frame[keep]
+
+def read_pdf_text(pdf_file, parallel=None):
+    """Extract text from all pages of PDF
+    
+    Large documents are split into page ranges and extracted on a process pool.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text_by_page = []
+        document = PdfDocument.from_file(pdf_file)
+        texts = extract_page_texts(document.source, parallel=parallel, reader=document.reader)
         
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text = page.extract_text()
-            text_by_page.append({
-                'page': page_num + 1,
-                'text': text
-            })
-        
-        return text_by_page
+        return [{'page': page_num + 1, 'text': text} for page_num, text in enumerate(texts)]
     except Exception as e:
         st.error(f"Error reading PDF text: {e}")
         return []
 
-def classify_transaction_type(df):
-    """Classify transactions as Credit (CR) or Debit (DR)"""
-    transactions = []
+def find_amount_column(columns):
+    """Return the position of the first column that holds transaction amounts"""
+    for pos, col in enumerate(columns):
+        col_str = str(col).lower()
+        if any(keyword in col_str for keyword in ['amount', 'balance', 'value']) or col_str.replace('.', '').replace(',', '').isdigit():
+            return pos
+    return None
+
+def find_type_column(columns):
+    """Return the position of the first column with explicit CR/DR markers"""
+    for pos, col in enumerate(columns):
+        col_str = str(col).upper()
+        if col_str in ['DR', 'CR', 'TYPE'] or any(keyword in col_str for keyword in ['DEBIT', 'CREDIT']):
+            return pos
+    return None
+
+def _keyword_mask(text, keywords):
+    """Vectorized 'any keyword in text' check"""
+    return text.str.contains('|'.join(re.escape(keyword) for keyword in keywords), regex=True)
+
+def classify_transaction_type(df, table_num=1):
+    """Classify transactions as Credit (CR) or Debit (DR)
     
-    for idx, row in df.iterrows():
-        transaction = {}
-        
-        # Look for amount column
-        amount_col = None
-        for col in df.columns:
-            col_str = str(col).lower()
-            if any(keyword in col_str for keyword in ['amount', 'balance', 'value']) or col_str.replace('.', '').replace(',', '').isdigit():
-                amount_col = col
-                break
-        
-        # Look for type column (explicitly CR/DR)
-        type_col = None
-        for col in df.columns:
-            col_str = str(col).upper()
-            if col_str in ['DR', 'CR', 'TYPE'] or any(keyword in col_str for keyword in ['DEBIT', 'CREDIT']):
-                type_col = col
-                break
-        
-        # Extract transaction details
-        if amount_col and pd.notna(row[amount_col]):
-            try:
-                amount_str = str(row[amount_col])
-                # Extract numeric amount
-                amount_match = re.search(r'(\d+(?:,\d{3})*(?:\.\d{2})?)', amount_str)
-                if amount_match:
-                    amount = float(amount_match.group(1).replace(',', ''))
-                    
-                    # Determine transaction type
-                    trans_type = 'Unknown'
-                    
-                    # Check explicit type column first
-                    if type_col and pd.notna(row[type_col]):
-                        type_str = str(row[type_col]).upper().strip()
-                        if type_str == 'CR' or 'CREDIT' in type_str:
-                            trans_type = 'CR'
-                        elif type_str == 'DR' or 'DEBIT' in type_str:
-                            trans_type = 'DR'
-                    
-                    # If no explicit type column, try to infer from description or other columns
-                    if trans_type == 'Unknown':
-                        row_text = ' '.join([str(val) for val in row if pd.notna(val)]).upper()
-                        if any(keyword in row_text for keyword in ['CR', 'CREDIT', 'DEPOSIT', 'RECEIVED', 'IMPS', 'NEFT', 'RTGS']):
-                            trans_type = 'CR'
-                        elif any(keyword in row_text for keyword in ['DR', 'DEBIT', 'WITHDRAWAL', 'PAID', 'UPI', 'ATM', 'POS']):
-                            trans_type = 'DR'
-                    
-                    transaction = {
-                        'amount': amount,
-                        'type': trans_type,
-                        'description': str(row.get(df.columns[1], '') if len(df.columns) > 1 else ''),
-                        'date': str(row.get(df.columns[0], '') if len(df.columns) > 0 else ''),
-                        'raw_data': dict(row)
-                    }
-                    transactions.append(transaction)
-            except Exception as e:
-                continue
-    
-    return transactions
+    Columns are resolved once per table and rows are classified with boolean
+    masks. Returns a DataFrame with one row per transaction.
+    """
+    amount_pos = find_amount_column(df.columns)
+    if amount_pos is None or df.empty:
+        return pd.DataFrame(columns=TRANSACTION_FIELDS)
+    type_pos = find_type_column(df.columns)
+    
+    # Extract numeric amounts from the whole amount column at once
+    amount_values = df.iloc[:, amount_pos]
+    has_amount = amount_values.notna().to_numpy()
+    amount_match = amount_values[has_amount].astype(str).str.extract(AMOUNT_CELL_RE)
+    matched = amount_match['number'].notna().to_numpy()
+    rows = np.flatnonzero(has_amount)[matched]
+    if len(rows) == 0:
+        return pd.DataFrame(columns=TRANSACTION_FIELDS)
+    amount_match = amount_match[matched]
+    amounts = (amount_match['number'].str.replace(',', '', regex=False) + amount_match['fraction'].fillna('')).astype(float)
+    
+    subset = df.iloc[rows]
+    is_cr = np.zeros(len(rows), dtype=bool)
+    is_dr = np.zeros(len(rows), dtype=bool)
+    
+    # Check explicit type column first
+    if type_pos is not None:
+        type_values = subset.iloc[:, type_pos]
+        type_str = type_values.astype(str).str.upper().str.strip()
+        type_known = type_values.notna().to_numpy()
+        is_cr = type_known & ((type_str == 'CR') | type_str.str.contains('CREDIT', regex=False)).to_numpy()
+        is_dr = type_known & ~is_cr & ((type_str == 'DR') | type_str.str.contains('DEBIT', regex=False)).to_numpy()
+    
+    # If no explicit type, try to infer from description or other columns
+    unknown = ~(is_cr | is_dr)
+    if unknown.any():
+        cells = subset.astype(str).where(subset.notna(), '')
+        row_text = cells.iloc[:, 0].str.cat([cells.iloc[:, pos] for pos in range(1, cells.shape[1])], sep=' ').str.upper()
+        infer_cr = _keyword_mask(row_text, ['CR', 'CREDIT', 'DEPOSIT', 'RECEIVED', 'IMPS', 'NEFT', 'RTGS']).to_numpy()
+        infer_dr = _keyword_mask(row_text, ['DR', 'DEBIT', 'WITHDRAWAL', 'PAID', 'UPI', 'ATM', 'POS']).to_numpy()
+        is_cr = is_cr | (unknown & infer_cr)
+        is_dr = is_dr | (unknown & ~infer_cr & infer_dr)
+    
+    return pd.DataFrame({
+        'table': table_num,
+        'page': df.attrs.get('page'),
+        'row': rows + 1,
+        'date': subset.iloc[:, 0].astype(str).to_numpy(),
+        'description': subset.iloc[:, 1].astype(str).to_numpy() if df.shape[1] > 1 else '',
+        'amount': amounts.to_numpy(),
+        'type': np.select([is_cr, is_dr], ['CR', 'DR'], default='Unknown')
+    })
+
+def add_month_column(frame):
+    """Add a 'month' period column parsed from the 'date' column"""
+    dates = pd.to_datetime(frame['date'], errors='coerce', dayfirst=True)
+    return frame.assign(month=dates.dt.to_period('M'))
+
+def aggregate_amounts(frame, by=None):
+    """Compute count/total/average/min/max of the amount column in one grouped pass
+    
+    by is None for a single summary dict, or a column name / list of column
+    names ('type', 'page', 'table', 'month', ...) for a DataFrame indexed by
+    the group keys. The average is derived from total and count, so the
+    amounts are not summed twice.
+    """
+    if by is None:
+        amounts = frame['amount'].to_numpy(dtype=float) if 'amount' in frame else np.array([])
+        if len(amounts) == 0:
+            return {field: 0 for field in AGGREGATE_FIELDS}
+        total = amounts.sum()
+        return {
+            'count': len(amounts),
+            'total': total,
+            'average': total / len(amounts),
+            'min': amounts.min(),
+            'max': amounts.max()
+        }
+    
+    keys = [by] if isinstance(by, str) else list(by)
+    if 'month' in keys and 'month' not in frame.columns:
+        frame = add_month_column(frame)
+    
+    grouped = frame.astype({'amount': float}).groupby(keys, sort=False)['amount'].agg(['count', 'sum', 'min', 'max'])
+    grouped['average'] = grouped['sum'] / grouped['count']
+    return grouped.rename(columns={'sum': 'total'})[AGGREGATE_FIELDS]
 
 def analyze_cr_dr_data(transactions):
-    """Analyze Credit and Debit transactions"""
-    cr_transactions = [t for t in transactions if t['type'] == 'CR']
-    dr_transactions = [t for t in transactions if t['type'] == 'DR']
-    unknown_transactions = [t for t in transactions if t['type'] == 'Unknown']
+    """Analyze Credit and Debit transactions from a transactions frame"""
+    by_type = aggregate_amounts(transactions, 'type')
+    groups = dict(tuple(transactions.groupby('type', sort=False)))
+    
+    def summarize(trans_type):
+        if trans_type in by_type.index:
+            stats = by_type.loc[trans_type]
+            summary = {
+                'count': int(stats['count']),
+                'total': float(stats['total']),
+                'average': float(stats['average']),
+                'max': float(stats['max']),
+                'min': float(stats['min'])
+            }
+        else:
+            summary = {field: 0 for field in AGGREGATE_FIELDS}
+        summary['transactions'] = groups.get(trans_type, transactions.iloc[0:0])
+        return summary
     
     analysis = {
-        'credit': {
-            'count': len(cr_transactions),
-            'total': sum(t['amount'] for t in cr_transactions),
-            'average': sum(t['amount'] for t in cr_transactions) / len(cr_transactions) if cr_transactions else 0,
-            'max': max(t['amount'] for t in cr_transactions) if cr_transactions else 0,
-            'min': min(t['amount'] for t in cr_transactions) if cr_transactions else 0,
-            'transactions': cr_transactions
-        },
-        'debit': {
-            'count': len(dr_transactions),
-            'total': sum(t['amount'] for t in dr_transactions),
-            'average': sum(t['amount'] for t in dr_transactions) / len(dr_transactions) if dr_transactions else 0,
-            'max': max(t['amount'] for t in dr_transactions) if dr_transactions else 0,
-            'min': min(t['amount'] for t in dr_transactions) if dr_transactions else 0,
-            'transactions': dr_transactions
-        },
-        'unknown': {
-            'count': len(unknown_transactions),
-            'total': sum(t['amount'] for t in unknown_transactions),
-            'transactions': unknown_transactions
-        }
+        'credit': summarize('CR'),
+        'debit': summarize('DR'),
+        'unknown': summarize('Unknown')
     }
     
     return analysis
 
-def extract_table_amounts_with_types(pdf_file):
-    """Extract amounts from PDF tables with transaction types"""
+def row_dates(rows, transactions):
+    """Transaction date of each table row (None for rows that are not classified transactions)"""
+    if transactions.empty:
+        return [None] * len(rows)
+    dates = pd.Series(rows).map(pd.Series(transactions['date'].to_numpy(), index=transactions['row'].to_numpy()))
+    return dates.astype(object).where(dates.notna(), None).tolist()
+
+def table_amount_records(df, table_num, seen, dedupe=DEFAULT_TABLE_DEDUPE):
+    """Classify one table's transactions and collect its amount records, deduplicated against seen
+    
+    Amounts on transaction rows carry the transaction date, so they can be
+    converted at the exchange rate of that date.
+    """
+    transactions = classify_transaction_type(df, table_num)
+    
+    amounts_frame = scan_table_amounts(df, table_num)
+    in_amount_column = amounts_frame['column'].map(is_amount_column).astype(bool)
+    
+    # Amounts from amount-like columns first (for backward compatibility), then all other cells
+    ordered = dedupe_table_amounts(pd.concat([amounts_frame[in_amount_column], amounts_frame[~in_amount_column]]), seen, dedupe)
+    records = [
+        {
+            'table': row.table,
+            'page': row.page,
+            'column': row.column,
+            'row': row.row,
+            'date': date,
+            'amount': row.amount
+        }
+        for row, date in zip(ordered.itertuples(index=False), row_dates(ordered['row'].to_numpy(), transactions))
+    ]
+    return records, transactions
+
+def combine_transactions(transaction_frames):
+    """Concatenate per-table transaction frames (an empty frame if there are none)"""
+    frames = [frame for frame in transaction_frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=TRANSACTION_FIELDS)
+
+def extract_table_amounts_with_types(pdf_file, dedupe=DEFAULT_TABLE_DEDUPE, failed_pages=None):
+    """Extract amounts from PDF tables with transaction types
+    
+    dedupe selects how repeated amounts are collapsed: 'value', 'cell' or 'none'.
+    Page ranges whose tables could not be extracted are appended to failed_pages.
+    """
+    document = PdfDocument.from_file(pdf_file)
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
+        # tabula needs a file on disk; the document writes it at most once
+        failed = []
+        dfs = read_pdf_tables(document.path(), document.page_count, failed_pages=failed)
+        if failed:
+            st.warning(f"⚠️ Tables could not be extracted from pages: {', '.join(f'{start}-{stop}' for start, stop in failed)}")
+            if failed_pages is not None:
+                failed_pages.extend(failed)
         
-        dfs = tabula.read_pdf(tmp_path, pages='all', multiple_tables=True)
-        
-        all_transactions = []
+        transaction_frames = []
         table_amounts = []
+        seen = set()  # Dedupe index shared across all tables
         
         for i, df in enumerate(dfs):
-            # Classify transactions in this table
-            transactions = classify_transaction_type(df)
-            all_transactions.extend(transactions)
-            
-            # Also extract basic amounts (for backward compatibility)
-            for col in df.columns:
-                col_str = str(col).lower()
-                if any(keyword in col_str for keyword in ['amount', 'balance', 'total', 'sum', 'value', 'price', 'cost']):
-                    for idx, value in enumerate(df[col]):
-                        if pd.notna(value):
-                            value_str = str(value)
-                            amounts = extract_amounts_from_text(value_str, 'INR')
-                            for amount_data in amounts:
-                                table_amounts.append({
-                                    'table': i+1,
-                                    'column': col,
-                                    'row': idx+1,
-                                    'amount': amount_data['original_amount']
-                                })
-            
-            # Check all cells for amounts
-            for col in df.columns:
-                for idx, value in enumerate(df[col]):
-                    if pd.notna(value):
-                        value_str = str(value)
-                        amounts = extract_amounts_from_text(value_str, 'INR')
-                        for amount_data in amounts:
-                            amount = amount_data['original_amount']
-                            if amount not in [ta['amount'] for ta in table_amounts]:
-                                table_amounts.append({
-                                    'table': i+1,
-                                    'column': col,
-                                    'row': idx+1,
-                                    'amount': amount
-                                })
+            records, transactions = table_amount_records(df, i + 1, seen, dedupe)
+            table_amounts.extend(records)
+            transaction_frames.append(transactions)
         
-        # Clean up temporary file
-        os.unlink(tmp_path)
-        return table_amounts, dfs, all_transactions
+        return table_amounts, dfs, combine_transactions(transaction_frames)
         
     except Exception as e:
         st.error(f"Error extracting table amounts: {e}")
-        return [], [], []
+        return [], None, pd.DataFrame(columns=TRANSACTION_FIELDS)
+    finally:
+        # Only removes the temporary file when this function created the document
+        if document is not pdf_file:
+            document.close()
 
-def process_pdf(uploaded_file, source_currency='INR'):
-    """Main function to process PDF and extract all amounts"""
-    if uploaded_file is None:
-        return None, None, None, None
+def extract_pdf_data(document, source_currency='INR'):
+    """Run text and table extraction on a PdfDocument
     
+    Returns a dict with the page texts, raw tables, text/table amounts, the
+    transactions frame, the per-page aggregates and the page ranges whose
+    tables failed. tables is None
+    when table extraction failed entirely.
+    """
     # Extract text amounts
-    pdf_text_pages = read_pdf_text(uploaded_file)
+    pdf_text_pages = read_pdf_text(document)
     
     all_amounts = []
     for page_data in pdf_text_pages:
-        page_num = page_data['page']
-        text = page_data['text']
-        amounts = extract_amounts_from_text(text, source_currency)
-        
-        for amount_data in amounts:
-            all_amounts.append({
-                'page': page_num, 
-                'amount': amount_data['original_amount'], 
-                'source': 'text',
-                'source_currency': source_currency
-            })
+        all_amounts.extend(text_amount_records(page_data['page'], page_data['text'], source_currency))
     
     # Extract table amounts with transaction types
-    table_amounts, tables, transactions = extract_table_amounts_with_types(uploaded_file)
+    failed_pages = []
+    table_amounts, tables, transactions = extract_table_amounts_with_types(document, failed_pages=failed_pages)
+    
+    return assemble_extracted(pdf_text_pages, tables, all_amounts, table_amounts, transactions, failed_pages, source_currency)
+
+def text_amount_records(page_num, text, source_currency='INR'):
+    """Amount records found in the text of one page"""
+    return [
+        {
+            'page': page_num,
+            'amount': amount_data['original_amount'],
+            'source': 'text',
+            'source_currency': source_currency
+        }
+        for amount_data in extract_amounts_from_text(text, source_currency)
+    ]
+
+def assemble_extracted(pages, tables, text_amounts, table_amounts, transactions, failed_pages, source_currency='INR'):
+    """Bundle extraction output into the dict returned by extract_pdf_data
+    
+    The amount records are kept as AmountStores (int64 minor units of the
+    PDF currency plus provenance arrays) rather than a dict per amount.
+    """
+    text_amounts = AmountStore.from_records(text_amounts, source='text', currency=source_currency)
+    table_amounts = AmountStore.from_records(table_amounts, source='table', currency=source_currency)
+    
+    # Per-page statistics, computed once for page queries, the dashboard and the charts
+    page_aggregates = PageAggregates.build(
+        AmountStore.concat([text_amounts, table_amounts]).to_frame(),
+        transactions,
+        page_count=len(pages)
+    )
+    
+    return {
+        'pages': pages,
+        'tables': tables,
+        'text_amounts': text_amounts,
+        'table_amounts': table_amounts,
+        'transactions': transactions,
+        'page_aggregates': page_aggregates,
+        'failed_pages': failed_pages
+    }
+
+def process_pdf_cache_key(digest, source_currency='INR'):
+    """Result cache key for process_pdf, from the PDF's SHA-256 digest"""
+    return cache_key(
+        digest,
+        EXTRACTOR_VERSION,
+        pipeline='app',
+        source_currency=source_currency,
+        dedupe=DEFAULT_TABLE_DEDUPE,
+        table_backend=get_table_extractor().backend  # Results of different table backends are kept apart
+    )
+
+def process_pdf(uploaded_file, source_currency='INR'):
+    """Main function to process PDF and extract all amounts"""
+    if uploaded_file is None:
+        return None, None, None, None, None
+    
+    # Reuse the stored result when this exact PDF was processed with the same settings
+    # The upload is read into memory once and shared by every extraction stage
+    with PdfDocument.from_file(uploaded_file) as document:
+        key = process_pdf_cache_key(document.digest, source_currency)
+        extracted = RESULT_CACHE.get(key)
+        if extracted is None:
+            extracted = extract_pdf_data(document, source_currency)
+            if is_cacheable(extracted):
+                RESULT_CACHE.put(key, extracted)
+    
+    return results_from_extracted(extracted)
+
+def is_cacheable(extracted):
+    """Only complete extractions are stored in the result cache"""
+    return bool(extracted['pages']) and extracted['tables'] is not None and not extracted['failed_pages']
+
+def results_from_extracted(extracted):
+    """Turn extract_pdf_data output into the tuple returned by process_pdf"""
+    all_amounts = extracted['text_amounts']
+    table_amounts = extracted['table_amounts']
+    transactions = extracted['transactions']
     
     # Analyze CR/DR data
-    cr_dr_analysis = analyze_cr_dr_data(transactions) if transactions else None
+    cr_dr_analysis = analyze_cr_dr_data(transactions) if not transactions.empty else None
     
     # Combine all amounts
-    combined_amounts = all_amounts + [
-        {**amt, 'source': 'table'} for amt in table_amounts
-    ]
+    combined_amounts = AmountStore.concat([all_amounts, table_amounts])
     
-    return combined_amounts, all_amounts, table_amounts, cr_dr_analysis
+    return combined_amounts, all_amounts, table_amounts, cr_dr_analysis, extracted['page_aggregates']
 
-def answer_business_query(query, amounts_data, cr_dr_analysis=None, display_currency='INR'):
-    """Process business queries about the amounts"""
+def answer_business_query(query, amounts_data, cr_dr_analysis=None, display_currency='INR', index=None, page_aggregates=None):
+    """Process business queries about the amounts
+    
+    Pass the analysis' AmountIndex as index and its PageAggregates as
+    page_aggregates to answer from them directly instead of rebuilding them
+    from amounts_data on every question.
+    """
     query_lower = query.lower()
     
-    if not amounts_data:
+    if len(amounts_data) == 0:
         return "No data available to analyze."
     
-    amounts_df = pd.DataFrame(amounts_data)
+    if index is None:
+        index = AmountIndex.from_frame(pd.DataFrame(amounts_data))
+    
+    # Page-specific queries ("page 3", "pages 10-40", "which page has the most amounts?")
+    page_range = re.search(r'pages?\s+(\d+)\s*(?:-|–|to)\s*(\d+)', query_lower)
+    page_numbers = re.findall(r'page\s+(\d+)', query_lower)
+    if page_range or page_numbers or 'page' in query_lower:
+        if page_aggregates is None:
+            page_aggregates = PageAggregates.build(pd.DataFrame(amounts_data, columns=['page', 'amount']))
+        if page_range:
+            first, last = sorted([int(page_range.group(1)), int(page_range.group(2))])
+            stats = page_aggregates.range_stats(first, last)
+            label = f"Pages {first}-{last}"
+        elif page_numbers:
+            first = last = int(page_numbers[0])
+            stats = page_aggregates.page_stats(first)
+            label = f"Page {first}"
+        else:
+            busiest = page_aggregates.busiest_page()
+            if busiest is None:
+                return "📄 No amounts were found on any page"
+            stats = page_aggregates.page_stats(busiest)
+            return f"📄 **Page {busiest}** has the most amounts: {stats['count']} amounts, Total: {format_currency(stats['total'], display_currency)}"
+        
+        if not stats['count']:
+            return f"📄 **{label}**: No amounts found"
+        answer = f"📄 **{label}**: {stats['count']} amounts, Total: {format_currency(stats['total'], display_currency)}"
+        if stats['cr_count'] or stats['dr_count']:
+            answer += f" (CR: {format_currency(stats['cr_total'], display_currency)}, DR: {format_currency(stats['dr_total'], display_currency)})"
+        return answer
     
     # Credit/Debit specific queries
     if cr_dr_analysis and ('credit' in query_lower or 'cr' in query_lower or 'debit' in query_lower or 'dr' in query_lower):
@@ -365,32 +551,35 @@ def answer_business_query(query, amounts_data, cr_dr_analysis=None, display_curr
             - Transaction Ratio: {cr_dr_analysis['credit']['count']}CR : {cr_dr_analysis['debit']['count']}DR
             """
     
+    # Top-k queries
+    top_match = re.search(r'\b(top|largest|biggest)\s+(\d+)', query_lower)
+    if top_match:
+        records, values = index.top(int(top_match.group(2)))
+        lines = [
+            f"- {format_currency(value, display_currency)} (Page {index.page(record) or 'N/A'})"
+            for record, value in zip(records, values)
+        ]
+        return f"🏆 **Top {len(lines)} Amounts**:\n" + "\n".join(lines)
+    
     # Total amount queries
     if any(word in query_lower for word in ['total', 'sum', 'altogether']):
-        total = amounts_df['amount'].sum()
-        return f"💰 **Total Amount**: {format_currency(total, display_currency)}"
+        return f"💰 **Total Amount**: {format_currency(index.total, display_currency)}"
     
     # Count queries
     elif any(word in query_lower for word in ['how many', 'count', 'number of']):
-        count = len(amounts_df)
-        return f"📊 **Total Records**: {count} amounts found"
+        return f"📊 **Total Records**: {len(index)} amounts found"
     
     # Average queries
     elif any(word in query_lower for word in ['average', 'mean']):
-        avg = amounts_df['amount'].mean()
-        return f"📈 **Average Amount**: {format_currency(avg, display_currency)}"
+        return f"📈 **Average Amount**: {format_currency(index.mean, display_currency)}"
     
     # Maximum queries
     elif any(word in query_lower for word in ['maximum', 'max', 'highest', 'largest']):
-        max_amount = amounts_df['amount'].max()
-        max_record = amounts_df[amounts_df['amount'] == max_amount].iloc[0]
-        return f"🔝 **Highest Amount**: {format_currency(max_amount, display_currency)} (Page {max_record.get('page', 'N/A')})"
+        return f"🔝 **Highest Amount**: {format_currency(index.max, display_currency)} (Page {index.page(index.argmax()) or 'N/A'})"
     
     # Minimum queries
     elif any(word in query_lower for word in ['minimum', 'min', 'lowest', 'smallest']):
-        min_amount = amounts_df['amount'].min()
-        min_record = amounts_df[amounts_df['amount'] == min_amount].iloc[0]
-        return f"🔻 **Lowest Amount**: {format_currency(min_amount, display_currency)} (Page {min_record.get('page', 'N/A')})"
+        return f"🔻 **Lowest Amount**: {format_currency(index.min, display_currency)} (Page {index.page(index.argmin()) or 'N/A'})"
     
     # Range queries
     elif 'between' in query_lower or 'range' in query_lower:
@@ -398,49 +587,292 @@ def answer_business_query(query, amounts_data, cr_dr_analysis=None, display_curr
         numbers = re.findall(r'\d+(?:\.\d+)?', query)
         if len(numbers) >= 2:
             low, high = float(numbers[0]), float(numbers[1])
-            filtered = amounts_df[(amounts_df['amount'] >= low) & (amounts_df['amount'] <= high)]
-            return f"🎯 **Amounts between {format_currency(low, display_currency)} - {format_currency(high, display_currency)}**: {len(filtered)} records, Total: {format_currency(filtered['amount'].sum(), display_currency)}"
+            count, total = index.between(low, high)
+            return f"🎯 **Amounts between {format_currency(low, display_currency)} - {format_currency(high, display_currency)}**: {count} records, Total: {format_currency(total, display_currency)}"
     
     # Greater than queries
     elif any(word in query_lower for word in ['greater than', 'more than', 'above']):
         numbers = re.findall(r'\d+(?:\.\d+)?', query)
         if numbers:
             threshold = float(numbers[0])
-            filtered = amounts_df[amounts_df['amount'] > threshold]
-            return f"📈 **Amounts above {format_currency(threshold, display_currency)}**: {len(filtered)} records, Total: {format_currency(filtered['amount'].sum(), display_currency)}"
+            count, total = index.above(threshold)
+            return f"📈 **Amounts above {format_currency(threshold, display_currency)}**: {count} records, Total: {format_currency(total, display_currency)}"
     
     # Less than queries
     elif any(word in query_lower for word in ['less than', 'below', 'under']):
         numbers = re.findall(r'\d+(?:\.\d+)?', query)
         if numbers:
             threshold = float(numbers[0])
-            filtered = amounts_df[amounts_df['amount'] < threshold]
-            return f"📉 **Amounts below {format_currency(threshold, display_currency)}**: {len(filtered)} records, Total: {format_currency(filtered['amount'].sum(), display_currency)}"
-    
-    # Page-specific queries
-    elif 'page' in query_lower:
-        page_numbers = re.findall(r'page\s+(\d+)', query_lower)
-        if page_numbers:
-            page_num = int(page_numbers[0])
-            page_amounts = amounts_df[amounts_df['page'] == page_num]
-            if not page_amounts.empty:
-                return f"📄 **Page {page_num}**: {len(page_amounts)} amounts, Total: {format_currency(page_amounts['amount'].sum(), display_currency)}"
-            else:
-                return f"📄 **Page {page_num}**: No amounts found"
+            count, total = index.below(threshold)
+            return f"📉 **Amounts below {format_currency(threshold, display_currency)}**: {count} records, Total: {format_currency(total, display_currency)}"
     
     # Default response with summary
     else:
-        total = amounts_df['amount'].sum()
-        count = len(amounts_df)
-        avg = amounts_df['amount'].mean()
         return f"""
         📊 **Summary Statistics**:
-        - Total Amount: {format_currency(total, display_currency)}
-        - Number of Records: {count}
-        - Average Amount: {format_currency(avg, display_currency)}
-        - Range: {format_currency(amounts_df['amount'].min(), display_currency)} - {format_currency(amounts_df['amount'].max(), display_currency)}
+        - Total Amount: {format_currency(index.total, display_currency)}
+        - Number of Records: {len(index)}
+        - Average Amount: {format_currency(index.mean, display_currency)}
+        - Range: {format_currency(index.min, display_currency)} - {format_currency(index.max, display_currency)}
         """
 
+def processed_pdf_key(uploaded_file, source_currency='INR'):
+    """Identify an upload and the settings it was processed with"""
+    return (getattr(uploaded_file, 'file_id', None) or uploaded_file.name, uploaded_file.size, source_currency)
+
+def get_processed_pdf(uploaded_file, source_currency='INR'):
+    """Return process_pdf results, memoized in session state across Streamlit reruns
+    
+    Widget interactions rerun the whole script; the PDF is only reprocessed when
+    a different file is uploaded, the PDF currency changes or the user asks for it.
+    """
+    file_key = processed_pdf_key(uploaded_file, source_currency)
+    cached = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    # Entries with 'progress' were started progressively and are not complete yet
+    if cached is None or cached['key'] != file_key or cached.get('progress') is not None:
+        with st.spinner("🔍 Analyzing PDF... This may take a moment..."):
+            results = process_pdf(uploaded_file, source_currency)
+        cached = {'key': file_key, 'results': results}
+        st.session_state[PROCESSED_PDF_STATE_KEY] = cached
+    return cached['results']
+
+def stop_processing():
+    """Stop button callback: keep what has been found so far and stop processing"""
+    state = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    if state is not None:
+        state['cancelled'] = True
+
+def resume_processing():
+    """Resume button callback: continue processing where it stopped"""
+    state = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    if state is not None:
+        state['cancelled'] = False
+        set_processed_results(state, None)
+
+def set_processed_results(state, results):
+    """Replace the results of a processed PDF, dropping indexes built from the old ones"""
+    state['results'] = results
+    state.pop('indexes', None)
+    state.pop('page_aggregates', None)
+    state.pop('exports', None)
+    state.pop('frames', None)
+
+def new_processing_progress():
+    """Session state of a progressive run, enough to resume it after any rerun"""
+    return {
+        'page_count': None,
+        'pages': [],
+        'text_amounts': [],
+        'table_next': 1,
+        'tables': [],
+        'table_amounts': [],
+        'transaction_frames': [],
+        'seen': set(),
+        'failed_pages': []
+    }
+
+def extracted_from_progress(progress, source_currency='INR'):
+    """Assemble extract_pdf_data output from a (possibly partial) progressive run"""
+    failed_page_count = sum(stop - start + 1 for start, stop in progress['failed_pages'])
+    tables_failed = progress['page_count'] and failed_page_count >= progress['page_count']
+    return assemble_extracted(
+        progress['pages'],
+        None if tables_failed else progress['tables'],
+        progress['text_amounts'],
+        progress['table_amounts'],
+        combine_transactions(progress['transaction_frames']),
+        progress['failed_pages'],
+        source_currency
+    )
+
+def render_partial_metrics(placeholder, amounts, source_currency, display_currency):
+    """Show running metrics of the amounts found so far"""
+    values = convert_currency(np.array([amt['amount'] for amt in amounts], dtype=float), source_currency, display_currency)
+    summary = aggregate_amounts(pd.DataFrame({'amount': values}))
+    with placeholder.container():
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("💰 Total so far", format_currency(summary['total'], display_currency))
+        col2.metric("📊 Records so far", f"{summary['count']}")
+        col3.metric("📈 Average so far", format_currency(summary['average'], display_currency))
+        col4.metric("🔝 Highest so far", format_currency(summary['max'], display_currency))
+
+def get_processed_pdf_progressively(uploaded_file, source_currency='INR', display_currency='INR'):
+    """Like get_processed_pdf, but processes page by page while showing partial results
+    
+    Text amounts are shown as pages are read and table amounts are merged in
+    chunk by chunk. Progress lives in session state, so a rerun triggered by
+    any widget resumes where processing was interrupted. The stop button ends
+    processing and keeps the partial results, which are never cached.
+    """
+    file_key = processed_pdf_key(uploaded_file, source_currency)
+    state = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    if state is None or state['key'] != file_key:
+        state = {'key': file_key, 'results': None, 'progress': new_processing_progress(), 'cancelled': False}
+        st.session_state[PROCESSED_PDF_STATE_KEY] = state
+    
+    progress = state.get('progress')
+    if progress is None:
+        return state['results']
+    
+    if state['cancelled']:
+        if state['results'] is None:
+            set_processed_results(state, results_from_extracted(extracted_from_progress(progress, source_currency)))
+        pages_read = len(progress['pages'])
+        st.warning(
+            f"⏸️ Processing stopped after reading {pages_read} of {progress['page_count'] or '?'} pages "
+            f"and table pages up to {progress['table_next'] - 1}. Showing partial results."
+        )
+        st.button("▶️ Resume processing", on_click=resume_processing)
+        return state['results']
+    
+    status = st.empty()
+    progress_bar = st.progress(0.0)
+    live_metrics = st.empty()
+    st.button("⏹️ Stop processing", on_click=stop_processing, help="Stop and keep the results found so far")
+    last_render = [0.0]
+    
+    def render(message, fraction, force=False):
+        now = time.monotonic()
+        if not force and now - last_render[0] < PROGRESSIVE_RENDER_INTERVAL:
+            return
+        last_render[0] = now
+        status.info(message)
+        progress_bar.progress(min(1.0, fraction))
+        render_partial_metrics(live_metrics, progress['text_amounts'] + progress['table_amounts'], source_currency, display_currency)
+    
+    with PdfDocument.from_file(uploaded_file) as document:
+        key = process_pdf_cache_key(document.digest, source_currency)
+        if progress['page_count'] is None:
+            extracted = RESULT_CACHE.get(key)
+            if extracted is not None:
+                state['progress'] = None
+                set_processed_results(state, results_from_extracted(extracted))
+                return state['results']
+            progress['page_count'] = document.page_count
+        page_count = max(1, progress['page_count'])
+        
+        # Text pass: amounts appear page by page
+        first_page = len(progress['pages'])
+        for page_num, text in enumerate(iter_page_texts(document.source, reader=document.reader, first_page=first_page), first_page + 1):
+            progress['text_amounts'].extend(text_amount_records(page_num, text, source_currency))
+            progress['pages'].append({'page': page_num, 'text': text})
+            render(f"📄 Reading text: page {page_num} of {page_count}", page_num / page_count / 2)
+        
+        # Table pass: tables are merged in chunk by chunk, in page order
+        try:
+            chunks = get_table_extractor().iter_tables_chunked(document.path(), progress['page_count'], first_page=progress['table_next'])
+            for (start, stop), result in chunks:
+                if result is None:
+                    progress['failed_pages'].append((start, stop))
+                else:
+                    for meta, df in result:
+                        df.attrs.update(meta, table=len(progress['tables']) + 1)
+                        records, transactions = table_amount_records(df, df.attrs['table'], progress['seen'])
+                        progress['tables'].append(df)
+                        progress['table_amounts'].extend(records)
+                        progress['transaction_frames'].append(transactions)
+                progress['table_next'] = stop + 1
+                render(f"📊 Extracting tables: pages {start}-{stop} of {page_count}", 0.5 + stop / page_count / 2)
+        except Exception as e:
+            st.error(f"Error extracting table amounts: {e}")
+            progress['failed_pages'].append((progress['table_next'], progress['page_count']))
+        
+        extracted = extracted_from_progress(progress, source_currency)
+        if extracted['tables'] is None:
+            st.error("Error extracting table amounts: no page could be read")
+        elif extracted['failed_pages']:
+            st.warning(f"⚠️ Tables could not be extracted from pages: {', '.join(f'{start}-{stop}' for start, stop in extracted['failed_pages'])}")
+        out_of_range = extracted['text_amounts'].out_of_range + extracted['table_amounts'].out_of_range
+        if out_of_range:
+            st.info(f"ℹ️ Left out {out_of_range} numbers too large to be amounts (account or card numbers)")
+        if is_cacheable(extracted):
+            RESULT_CACHE.put(key, extracted)
+    
+    state['progress'] = None
+    set_processed_results(state, results_from_extracted(extracted))
+    status.empty()
+    progress_bar.empty()
+    live_metrics.empty()
+    return state['results']
+
+def get_amount_frames(combined_amounts, text_amounts, table_amounts, source_currency):
+    """Return the amount stores of the processed PDF as DataFrames in the PDF currency, built once"""
+    cached = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    frames = cached.get('frames') if cached is not None else None
+    if frames is None:
+        frames = [
+            store.to_frame().assign(source_currency=source_currency) if len(store) else pd.DataFrame(columns=['page', 'amount'])
+            for store in [combined_amounts, text_amounts, table_amounts]
+        ]
+        if cached is not None:
+            cached['frames'] = frames
+    return frames
+
+def uses_dated_rates(amounts_df):
+    """Whether amounts are converted at the rates of their dates rather than by one factor"""
+    return get_rate_history() is not None and 'date' in amounts_df and amounts_df['date'].notna().any()
+
+def get_amount_index(amounts, amounts_df, source_currency, display_currency):
+    """Return the query index of the processed PDF in the display currency
+    
+    The index is sorted once, in the PDF currency, from the AmountStore
+    (so its totals are exact); other currencies scale it, which keeps the
+    order, so switching currency never sorts again. Amounts converted at
+    historical rates are re-indexed from amounts_df instead.
+    """
+    cached = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    indexes = cached.setdefault('indexes', {}) if cached is not None else {}
+    if source_currency not in indexes:
+        indexes[source_currency] = AmountIndex.from_store(amounts)
+    if display_currency not in indexes:
+        if uses_dated_rates(amounts_df):
+            indexes[display_currency] = AmountIndex.from_frame(convert_amount_frame(amounts_df, source_currency, display_currency))
+        else:
+            indexes[display_currency] = indexes[source_currency].scaled(get_rate_matrix().rate(source_currency, display_currency))
+    return indexes[display_currency]
+
+def get_export_bytes(name, frame, display_currency, fmt):
+    """Return an amounts frame serialized for download, once per display currency and format"""
+    cached = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    exports = cached.setdefault('exports', {}) if cached is not None else {}
+    key = (name, display_currency, fmt)
+    if key not in exports:
+        exports[key] = frame_to_bytes(frame, fmt)
+    return exports[key]
+
+def get_page_aggregates(page_aggregates, source_currency, display_currency, amounts_df=None, cr_dr_analysis=None):
+    """Return the per-page aggregates of the processed PDF in the display currency, converted once
+    
+    amounts_df and cr_dr_analysis are the amounts and CR/DR analysis already
+    in the display currency; they are only needed when historical rates
+    apply, since the pages can then no longer be scaled by one factor.
+    """
+    if source_currency == display_currency:
+        return page_aggregates
+    cached = st.session_state.get(PROCESSED_PDF_STATE_KEY)
+    converted = cached.setdefault('page_aggregates', {}) if cached is not None else {}
+    if display_currency not in converted:
+        if amounts_df is not None and uses_dated_rates(amounts_df):
+            transactions = pd.concat([stats['transactions'] for stats in cr_dr_analysis.values()]) if cr_dr_analysis else None
+            converted[display_currency] = PageAggregates.build(amounts_df, transactions, page_count=page_aggregates.page_count)
+        else:
+            converted[display_currency] = page_aggregates.scaled(get_rate_matrix().rate(source_currency, display_currency))
+    return converted[display_currency]
+
+def convert_cr_dr_analysis(cr_dr_analysis, source_currency, display_currency):
+    """Return a CR/DR analysis with its totals and transactions in the display currency
+    
+    Transactions are converted at the rates of their dates when a rate
+    history is loaded, so the totals are recomputed from them.
+    """
+    if cr_dr_analysis is None or source_currency == display_currency:
+        return cr_dr_analysis
+    converted = {}
+    for key, stats in cr_dr_analysis.items():
+        transactions = convert_amount_frame(stats['transactions'], source_currency, display_currency)
+        converted[key] = {**stats, **aggregate_amounts(transactions), 'transactions': transactions}
+    return converted
+
 # Main Streamlit App
 def main():
     st.markdown('<h1 class="main-header">💰 PDF Financial Analyzer</h1>', unsafe_allow_html=True)
@@ -476,8 +908,20 @@ def main():
         
         # Show conversion rate
         if source_currency != display_currency:
-            rate = CURRENCY_RATES.get(display_currency, 1) / CURRENCY_RATES.get(source_currency, 1)
+            rate = get_rate_matrix().rate(source_currency, display_currency)
             st.info(f"💱 1 {source_currency} = {rate:.4f} {display_currency}")
+            if get_rate_history() is not None:
+                st.caption("Dated transactions are converted at the rate of their date; other amounts at the latest rate.")
+        
+        progressive = st.checkbox(
+            "⚡ Show results while processing",
+            value=True,
+            help="Process page by page, updating the results as they arrive, with a button to stop early"
+        )
+        
+        if uploaded_file is not None and st.button("🔄 Reprocess PDF", help="Run extraction again instead of reusing the stored results"):
+            st.session_state.pop(PROCESSED_PDF_STATE_KEY, None)
+            RESULT_CACHE.delete(process_pdf_cache_key(pdf_digest(uploaded_file.getvalue()), source_currency))
         
         st.markdown("---")
         st.header("❓ Sample Queries")
@@ -497,24 +941,30 @@ def main():
         - "CR vs DR comparison"
         """)
     
+    if uploaded_file is None:
+        # Drop results of a previously uploaded file
+        st.session_state.pop(PROCESSED_PDF_STATE_KEY, None)
+    
     if uploaded_file is not None:
         st.success(f"📄 Uploaded: {uploaded_file.name}")
         
-        # Process PDF
-        with st.spinner("🔍 Analyzing PDF... This may take a moment..."):
-            combined_amounts, text_amounts, table_amounts, cr_dr_analysis = process_pdf(uploaded_file, source_currency)
+        # Process PDF (only once per uploaded file and PDF currency)
+        if progressive:
+            processed = get_processed_pdf_progressively(uploaded_file, source_currency, display_currency)
+        else:
+            processed = get_processed_pdf(uploaded_file, source_currency)
+        combined_amounts, text_amounts, table_amounts, cr_dr_analysis, page_aggregates = processed
         
         if combined_amounts:
-            # Convert amounts to display currency
-            if source_currency != display_currency:
-                with st.spinner("💱 Converting currencies..."):
-                    for amt_list in [combined_amounts, text_amounts, table_amounts]:
-                        for amt in amt_list:
-                            if 'amount' in amt:
-                                amt['original_amount'] = amt['amount']
-                                amt['amount'] = convert_currency(amt['amount'], source_currency, display_currency)
-                                amt['display_currency'] = display_currency
-                                amt['source_currency'] = source_currency
+            # Results stay in the PDF currency; only what is shown is converted, a column at a time
+            amount_frames = get_amount_frames(combined_amounts, text_amounts, table_amounts, source_currency)
+            amount_index = get_amount_index(combined_amounts, amount_frames[0], source_currency, display_currency)
+            combined_df, text_df, table_df = [
+                convert_amount_frame(frame, source_currency, display_currency)
+                for frame in amount_frames
+            ]
+            cr_dr_analysis = convert_cr_dr_analysis(cr_dr_analysis, source_currency, display_currency)
+            page_aggregates = get_page_aggregates(page_aggregates, source_currency, display_currency, combined_df, cr_dr_analysis)
             
             # Create tabs for different views
             tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -529,26 +979,23 @@ def main():
             with tab1:
                 st.header("📊 Financial Summary")
                 
-                amounts_df = pd.DataFrame(combined_amounts)
+                amounts_df = combined_df
+                summary = amount_index.summary()  # Totals from the exact minor-unit sums
                 
                 # Key metrics
                 col1, col2, col3, col4 = st.columns(4)
                 
                 with col1:
-                    total_amount = amounts_df['amount'].sum()
-                    st.metric("💰 Total Amount", f"{format_currency(total_amount, display_currency)}")
+                    st.metric("💰 Total Amount", f"{format_currency(summary['total'], display_currency)}")
                 
                 with col2:
-                    total_records = len(amounts_df)
-                    st.metric("📊 Total Records", f"{total_records}")
+                    st.metric("📊 Total Records", f"{summary['count']}")
                 
                 with col3:
-                    avg_amount = amounts_df['amount'].mean()
-                    st.metric("📈 Average Amount", f"{format_currency(avg_amount, display_currency)}")
+                    st.metric("📈 Average Amount", f"{format_currency(summary['average'], display_currency)}")
                 
                 with col4:
-                    max_amount = amounts_df['amount'].max()
-                    st.metric("🔝 Highest Amount", f"{format_currency(max_amount, display_currency)}")
+                    st.metric("🔝 Highest Amount", f"{format_currency(summary['max'], display_currency)}")
             
             st.markdown("---")
             
@@ -557,12 +1004,12 @@ def main():
             
             with col1:
                 st.subheader("📄 Page-wise Distribution")
-                if 'page' in amounts_df.columns:
-                    page_summary = amounts_df.groupby('page').agg({
-                        'amount': ['count', 'sum']
-                    }).round(2)
-                    page_summary.columns = ['Count', 'Total Amount']
-                    st.dataframe(page_summary, use_container_width=True)
+                page_summary = page_aggregates.pages_with_amounts()
+                if not page_summary.empty:
+                    columns = {'count': 'Count', 'total': 'Total Amount'}
+                    if cr_dr_analysis:
+                        columns.update({'cr_total': 'Credits (CR)', 'dr_total': 'Debits (DR)'})
+                    st.dataframe(page_summary[list(columns)].rename(columns=columns).round(2), use_container_width=True)
             
             with col2:
                 st.subheader("🎯 Amount Ranges")
@@ -589,7 +1036,7 @@ def main():
                 
                 if query:
                     with st.spinner("🤔 Analyzing your question..."):
-                        answer = answer_business_query(query, combined_amounts, cr_dr_analysis, display_currency)
+                        answer = answer_business_query(query, combined_df, cr_dr_analysis, display_currency, index=amount_index, page_aggregates=page_aggregates)
                     
                     st.markdown('<div class="query-box">', unsafe_allow_html=True)
                     st.markdown(f"**Your Question:** {query}")
@@ -604,17 +1051,17 @@ def main():
                 
                 with col1:
                     if st.button("💰 Total Amount"):
-                        answer = answer_business_query("total amount", combined_amounts, cr_dr_analysis, display_currency)
+                        answer = answer_business_query("total amount", combined_df, cr_dr_analysis, display_currency, index=amount_index, page_aggregates=page_aggregates)
                         st.info(answer)
                 
                 with col2:
                     if st.button("📊 Record Count"):
-                        answer = answer_business_query("how many records", combined_amounts, cr_dr_analysis, display_currency)
+                        answer = answer_business_query("how many records", combined_df, cr_dr_analysis, display_currency, index=amount_index, page_aggregates=page_aggregates)
                         st.info(answer)
                 
                 with col3:
                     if st.button("🔝 Highest Amount"):
-                        answer = answer_business_query("maximum amount", combined_amounts, cr_dr_analysis, display_currency)
+                        answer = answer_business_query("maximum amount", combined_df, cr_dr_analysis, display_currency, index=amount_index, page_aggregates=page_aggregates)
                         st.info(answer)
             
             # Tab 3: Credit/Debit Analysis
@@ -662,9 +1109,9 @@ def main():
                             st.write(f"**Lowest:** {format_currency(cr_data['min'], display_currency)}")
                             
                             # Show recent credit transactions
-                            if cr_data['transactions']:
+                            if not cr_data['transactions'].empty:
                                 st.subheader("Recent Credit Transactions")
-                                cr_df = pd.DataFrame(cr_data['transactions'])
+                                cr_df = cr_data['transactions']
                                 st.dataframe(
                                     cr_df[['date', 'description', 'amount']].head(10),
                                     use_container_width=True
@@ -682,9 +1129,9 @@ def main():
                             st.write(f"**Lowest:** {format_currency(dr_data['min'], display_currency)}")
                             
                             # Show recent debit transactions
-                            if dr_data['transactions']:
+                            if not dr_data['transactions'].empty:
                                 st.subheader("Recent Debit Transactions")
-                                dr_df = pd.DataFrame(dr_data['transactions'])
+                                dr_df = dr_data['transactions']
                                 st.dataframe(
                                     dr_df[['date', 'description', 'amount']].head(10),
                                     use_container_width=True
@@ -736,7 +1183,7 @@ def main():
             with tab4:
                 st.header("📈 Data Visualizations")
                 
-                amounts_df = pd.DataFrame(combined_amounts)
+                amounts_df = combined_df
                 
                 # Amount distribution
                 col1, col2 = st.columns(2)
@@ -752,8 +1199,8 @@ def main():
                     st.plotly_chart(fig_hist, use_container_width=True)
                 
                 with col2:
-                    if 'page' in amounts_df.columns:
-                        page_totals = amounts_df.groupby('page')['amount'].sum().reset_index()
+                    page_totals = page_aggregates.pages_with_amounts()['total'].rename('amount').reset_index()
+                    if not page_totals.empty:
                         fig_page = px.bar(
                             page_totals,
                             x='page',
@@ -783,32 +1230,36 @@ def main():
                 with col2:
                     show_table_amounts = st.checkbox("Show Table Amounts", True)
                 
+                # Parquet and Arrow keep column types for pandas, Spark, DuckDB and other columnar tools
+                download_format = st.selectbox(
+                    "Download format",
+                    available_formats(list(DOWNLOAD_FORMATS)),
+                    format_func=str.upper
+                )
+                extension, mime_type = DOWNLOAD_FORMATS[download_format]
+                
                 if show_text_amounts and text_amounts:
                     st.subheader("📝 Amounts from Text")
-                    text_df = pd.DataFrame(text_amounts)
                     st.dataframe(text_df, use_container_width=True)
                     
-                    # Download button
-                    csv = text_df.to_csv(index=False)
+                    # Download button (serialized once, not on every rerun)
                     st.download_button(
                         "📥 Download Text Amounts",
-                        csv,
-                        "text_amounts.csv",
-                        "text/csv"
+                        get_export_bytes('text_amounts', text_df, display_currency, download_format),
+                        f"text_amounts{extension}",
+                        mime_type
                     )
                 
                 if show_table_amounts and table_amounts:
                     st.subheader("📊 Amounts from Tables")
-                    table_df = pd.DataFrame(table_amounts)
                     st.dataframe(table_df, use_container_width=True)
                     
-                    # Download button
-                    csv = table_df.to_csv(index=False)
+                    # Download button (serialized once, not on every rerun)
                     st.download_button(
                         "📥 Download Table Amounts",
-                        csv,
-                        "table_amounts.csv",
-                        "text/csv"
+                        get_export_bytes('table_amounts', table_df, display_currency, download_format),
+                        f"table_amounts{extension}",
+                        mime_type
                     )
         
         else:
@@ -0,0 +1,157 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+import PyPDF2
+
+# Block size used when hashing or copying file-backed documents
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class PdfDocument:
+    """An uploaded PDF held once and shared by every extraction stage
+
+    A document is either held in memory (data) or backed by a file on disk
+    (path). In-memory documents are read straight from their bytes; a
+    temporary file is only written when a backend strictly needs a path
+    (tabula), at most once per document, and removed again by close().
+    File-backed documents are never loaded into memory unless data is asked for.
+    """
+
+    def __init__(self, data=None, name='document.pdf', digest=None, path=None, owns_path=False):
+        if data is None and path is None:
+            raise ValueError("A PdfDocument needs either data or a path")
+        self._data = bytes(data) if data is not None else None
+        self.name = name
+        self._digest = digest
+        self._reader = None
+        self._file = None
+        self._path = path
+        self._owns_path = owns_path and path is not None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, pdf_file):
+        """Build a document from an uploaded file object (Streamlit UploadedFile, BytesIO, open file)"""
+        if isinstance(pdf_file, cls):
+            return pdf_file
+        data = pdf_file.getvalue() if hasattr(pdf_file, 'getvalue') else pdf_file.read()
+        return cls(data, name=getattr(pdf_file, 'name', 'document.pdf'))
+
+    @classmethod
+    def from_path(cls, pdf_path, name=None, digest=None, owns_path=False):
+        """Build a file-backed document from a PDF on disk (the file doubles as its path)
+
+        With owns_path the file is treated as a temporary copy and removed by close().
+        """
+        return cls(name=name or os.path.basename(pdf_path), digest=digest, path=pdf_path, owns_path=owns_path)
+
+    @classmethod
+    def from_source(cls, source, name='document.pdf', digest=None):
+        """Build a document from PDF bytes or a path, as returned by the source property"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls(source, name=name, digest=digest)
+        return cls.from_path(source, name=name, digest=digest)
+
+    @property
+    def data(self):
+        """The PDF bytes (read from disk on first use for file-backed documents)"""
+        with self._lock:
+            if self._data is None:
+                with open(self._path, 'rb') as f:
+                    self._data = f.read()
+            return self._data
+
+    @property
+    def source(self):
+        """Bytes for in-memory documents, otherwise the file path (both can be sent to worker processes)"""
+        return self._data if self._data is not None else self._path
+
+    @property
+    def size(self):
+        if self._data is not None:
+            return len(self._data)
+        return os.path.getsize(self._path)
+
+    @property
+    def digest(self):
+        """SHA-256 hex digest of the PDF bytes (computed once)"""
+        if self._digest is None:
+            if self._data is not None:
+                self._digest = hashlib.sha256(self._data).hexdigest()
+            else:
+                digest = hashlib.sha256()
+                with open(self._path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+                        digest.update(chunk)
+                self._digest = digest.hexdigest()
+        return self._digest
+
+    def stream(self):
+        """Return a fresh binary stream over the PDF (the caller closes it)"""
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self._path, 'rb')
+
+    @property
+    def reader(self):
+        """PyPDF2 reader over the document, parsed once"""
+        with self._lock:
+            if self._reader is None:
+                self._file = self.stream()
+                self._reader = PyPDF2.PdfReader(self._file)
+            return self._reader
+
+    @property
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def path(self):
+        """Return a filesystem path for backends that cannot read from memory
+
+        The temporary file is written on first use only and reused afterwards.
+        """
+        with self._lock:
+            if self._path is None:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+                    tmp_file.write(self._data)
+                    self._path = tmp_file.name
+                self._owns_path = True
+            return self._path
+
+    def save(self, destination):
+        """Store the PDF at destination, moving an owned temporary file instead of copying it"""
+        with self._lock:
+            if self._path is not None and self._owns_path and self._file is None:
+                shutil.move(self._path, destination)
+                self._path = destination
+                self._owns_path = False
+            elif self._data is not None:
+                with open(destination, 'wb') as f:
+                    f.write(self._data)
+            else:
+                shutil.copyfile(self._path, destination)
+
+    def close(self):
+        """Close the reader's file and remove the temporary file, if one was written"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._reader = None
+            if self._path is not None and self._owns_path:
+                try:
+                    os.unlink(self._path)
+                except FileNotFoundError:
+                    pass
+                self._path = None
+                self._owns_path = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,176 @@
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+# Documents with fewer pages are extracted serially; handing pages to the pool would cost more than it saves
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_ANALYZER_PARALLEL_MIN_PAGES', 50))
+# Worker processes of the text extraction pool, shared by every document extracted at the same
+# time in this process (0 = one per CPU core)
+TEXT_WORKERS = int(os.environ.get('PDF_ANALYZER_TEXT_WORKERS', 0))
+# Page ranges handed out per worker, so uneven pages still balance across the pool
+CHUNKS_PER_WORKER = 4
+# Parsed documents each pool worker keeps, so a document is parsed once per worker
+WORKER_READER_CACHE = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+_worker_readers = OrderedDict()
+
+
+def _open_reader(pdf_source):
+    """Parse a PDF given as bytes or as a file path"""
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return PyPDF2.PdfReader(io.BytesIO(pdf_source))
+    return PyPDF2.PdfReader(pdf_source)
+
+
+def _extract_page_range(pdf_path, version, start, stop):
+    """Extract the text of pages [start, stop) inside a pool worker
+
+    Readers are cached per (path, version), so every range of a document
+    after the first reuses the worker's parsed copy.
+    """
+    key = (pdf_path, version)
+    reader = _worker_readers.get(key)
+    if reader is None:
+        reader = _open_reader(pdf_path)
+        _worker_readers[key] = reader
+        while len(_worker_readers) > WORKER_READER_CACHE:
+            _worker_readers.popitem(last=False)
+    else:
+        _worker_readers.move_to_end(key)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def pool_size():
+    """Worker processes of the text extraction pool"""
+    return TEXT_WORKERS or os.cpu_count() or 1
+
+
+def get_text_pool():
+    """Return the process-wide text extraction pool, starting it on first use
+
+    The pool lives as long as the process, like the tabula pool backend, so
+    only the first large document pays for starting the workers.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a process that may already host a JVM or server threads
+            _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_text_pool(pool):
+    """Drop a broken pool so the next large document starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_text_pool():
+    """Stop the pool workers"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def auto_worker_count(page_count):
+    """Pick a worker count for a document: the pool size, at most one per 8 pages"""
+    return max(1, min(pool_size(), math.ceil(page_count / 8)))
+
+
+def page_ranges(page_count, chunks):
+    """Split [0, page_count) into at most `chunks` contiguous ranges"""
+    size = max(1, math.ceil(page_count / max(1, chunks)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def iter_page_texts(pdf_source, parallel=None, workers=None, reader=None, first_page=0):
+    """Yield the text of every page of a PDF (bytes or file path) in page order, as soon as it is extracted
+
+    parallel=None picks automatically: documents with at least
+    PARALLEL_MIN_PAGES pages to go are split into page ranges for the shared
+    text extraction pool, smaller ones are extracted serially. Concurrent
+    documents queue on the same pool, so at most TEXT_WORKERS processes run
+    however many are extracted at once. In-memory PDFs are written to a
+    temporary file for the pool. If the pool fails, the remaining pages are
+    extracted serially. An already parsed reader over the same PDF is reused
+    when given. first_page (0-based) skips the pages before it. Closing the
+    generator early cancels the page ranges that have not started yet.
+    """
+    if reader is None:
+        reader = _open_reader(pdf_source)
+    page_count = len(reader.pages)
+    remaining = page_count - first_page
+    workers = workers or auto_worker_count(remaining)
+
+    if parallel is None:
+        parallel = remaining >= PARALLEL_MIN_PAGES and workers > 1
+
+    done = first_page
+    if parallel and workers > 1 and remaining > 0:
+        tmp_path = None
+        pool = None
+        futures = []
+        try:
+            pdf_path = pdf_source
+            if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+                    tmp_file.write(pdf_source)
+                    pdf_path = tmp_path = tmp_file.name
+            stat = os.stat(pdf_path)
+            version = (stat.st_mtime_ns, stat.st_size)
+            ranges = [(start + first_page, stop + first_page) for start, stop in page_ranges(remaining, workers * CHUNKS_PER_WORKER)]
+            pool = get_text_pool()
+            futures = [pool.submit(_extract_page_range, pdf_path, version, start, stop) for start, stop in ranges]
+            for future in futures:
+                for text in future.result():
+                    done += 1
+                    yield text
+            return
+        except Exception as e:
+            print(f"Parallel text extraction failed, falling back to serial: {e}")
+            if pool is not None and getattr(pool, '_broken', False):
+                _reset_text_pool(pool)
+        finally:
+            for future in futures:
+                future.cancel()
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+
+    for page_num in range(done, page_count):
+        yield reader.pages[page_num].extract_text()
+
+
+def extract_page_texts(pdf_source, parallel=None, workers=None, reader=None, progress=None):
+    """Return the text of every page of a PDF (bytes or file path) in page order
+
+    See iter_page_texts for parallel, workers and reader. progress, if
+    given, is called as progress(pages_done, page_count).
+    """
+    if reader is None:
+        reader = _open_reader(pdf_source)
+    page_count = len(reader.pages)
+
+    texts = []
+    for text in iter_page_texts(pdf_source, parallel=parallel, workers=workers, reader=reader):
+        texts.append(text)
+        if progress:
+            progress(len(texts), page_count)
+    return texts
@@ -1,165 +1,279 @@
-import tabula
-import pandas as pd
+import argparse
+import glob
+import json
+import multiprocessing
 import os
-import re
-import PyPDF2
-from decimal import Decimal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from amount_store import AmountStore
+from amount_tokenizer import tokenize_amounts
+from exporters import EXPORT_FORMATS, available_formats, export_path, export_statement
+from pdf_document import PdfDocument
+from pdf_text import extract_page_texts
+from tabula_backend import read_pdf_tables
+
+# Each worker process runs its own tabula JVM, so by default only half the cores get one
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_OUTPUT_DIR = 'pdfxl_output'
+MANIFEST_NAME = 'manifest.jsonl'
+SUMMARY_NAME = 'summary.csv'
+
+# Columns of the consolidated summary, one row per statement
+SUMMARY_FIELDS = [
+    'file', 'status', 'output', 'error', 'pages', 'tables', 'table_failed_pages',
+    'text_count', 'text_total', 'text_min', 'text_max',
+    'table_count', 'table_total', 'table_min', 'table_max', 'seconds'
+]
+
+AMOUNT_COLUMN_KEYWORDS = ['amount', 'balance', 'total', 'sum', 'value', 'price', 'cost']
 
 def extract_amounts_from_text(text):
-    """Extract monetary amounts from text using regex patterns"""
-    # Patterns to match various currency formats
-    patterns = [
-        r'\$\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',  # $1,234.56
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?\s*\$',  # 1,234.56$
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?',       # 1,234.56 (plain numbers)
-        r'(?:USD|usd)\s*\d{1,3}(?:,\d{3})*(?:\.\d{2})?',  # USD1,234.56
-        r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?\s*(?:USD|usd)',  # 1,234.56USD
-    ]
-    
-    amounts = []
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
-            # Clean the match and convert to float
-            clean_amount = re.sub(r'[^\d.,]', '', match)
-            if clean_amount and '.' in clean_amount:
-                try:
-                    amount = float(clean_amount.replace(',', ''))
-                    if amount > 0:  # Only positive amounts
-                        amounts.append(amount)
-                except ValueError:
-                    continue
-    
-    return amounts
-
-def read_pdf_text(pdf_path):
+    """Extract monetary amounts (with a decimal part) from text"""
+    return [amount for amount, _, _, _, _ in tokenize_amounts(text, require_decimals=True)]
+
+def read_pdf_text(document, parallel=None):
     """Extract text from all pages of PDF"""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text_by_page = []
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                text_by_page.append({
-                    'page': page_num + 1,
-                    'text': text
-                })
-            
-            return text_by_page
+        texts = extract_page_texts(document.source, parallel=parallel, reader=document.reader)
+
+        return [{'page': page_num + 1, 'text': text} for page_num, text in enumerate(texts)]
     except Exception as e:
         print(f"Error reading PDF text: {e}")
         return []
 
-# Check if input PDF exists
-pdf_file = "Statement_1758526731293.pdf"
-if not os.path.exists(pdf_file):
-    print(f"Error: {pdf_file} not found in the current directory")
-    exit(1)
-
-print(f"Processing PDF: {pdf_file}")
-
-try:
-    # Method 1: Extract text and search for amounts
-    print("\n=== EXTRACTING AMOUNTS FROM TEXT ===")
-    pdf_text_pages = read_pdf_text(pdf_file)
-    
-    all_amounts = []
-    for page_data in pdf_text_pages:
-        page_num = page_data['page']
-        text = page_data['text']
-        amounts = extract_amounts_from_text(text)
-        
-        if amounts:
-            print(f"\nPage {page_num} - Found {len(amounts)} amounts:")
-            for amount in amounts:
-                print(f"  ${amount:,.2f}")
-                all_amounts.append({'page': page_num, 'amount': amount})
-        else:
-            print(f"\nPage {page_num} - No amounts found")
-    
-    # Method 2: Extract tables and look for amount columns
-    print("\n=== EXTRACTING AMOUNTS FROM TABLES ===")
-    dfs = tabula.read_pdf(pdf_file, pages='all', multiple_tables=True)
-    
+def extract_table_amounts(dfs):
+    """Collect the amounts of every table, amount-like columns first, each cell listed once"""
     table_amounts = []
+    seen_cells = set()  # (table, row, column, amount) keys already recorded
     for i, df in enumerate(dfs):
-        print(f"\nTable {i+1} structure:")
-        print(f"Columns: {list(df.columns)}")
-        print(f"Shape: {df.shape}")
-        
         # Look for columns that might contain amounts
-        amount_columns = []
-        for col in df.columns:
-            col_str = str(col).lower()
-            if any(keyword in col_str for keyword in ['amount', 'balance', 'total', 'sum', 'value', 'price', 'cost']):
-                amount_columns.append(col)
-        
-        if amount_columns:
-            print(f"Found potential amount columns: {amount_columns}")
-            for col in amount_columns:
-                # Try to extract numeric values from the column
-                for idx, value in enumerate(df[col]):
-                    if pd.notna(value):
-                        # Convert to string and extract amounts
-                        value_str = str(value)
-                        amounts = extract_amounts_from_text(value_str)
-                        for amount in amounts:
-                            table_amounts.append({
-                                'table': i+1,
-                                'column': col,
-                                'row': idx+1,
-                                'amount': amount
-                            })
-        
-        # Also check all cells for amounts
-        for col in df.columns:
+        amount_columns = [col for col in df.columns if any(keyword in str(col).lower() for keyword in AMOUNT_COLUMN_KEYWORDS)]
+
+        # Amount columns first, then all cells
+        for col in amount_columns + list(df.columns):
             for idx, value in enumerate(df[col]):
                 if pd.notna(value):
-                    value_str = str(value)
-                    amounts = extract_amounts_from_text(value_str)
-                    for amount in amounts:
-                        if amount not in [ta['amount'] for ta in table_amounts]:  # Avoid duplicates
+                    for amount in extract_amounts_from_text(str(value)):
+                        key = (i+1, idx+1, col, amount)
+                        if key not in seen_cells:  # Avoid listing the same cell twice
+                            seen_cells.add(key)
                             table_amounts.append({
                                 'table': i+1,
                                 'column': col,
                                 'row': idx+1,
                                 'amount': amount
                             })
-    
-    # Create summary
+    return table_amounts
+
+def amount_stats(amounts, prefix):
+    """Count, total and range of amount records, keyed for the summary (the total summed exactly in minor units)"""
+    summary = AmountStore.from_records(amounts).summary()
+    return {
+        f'{prefix}_count': summary['count'],
+        f'{prefix}_total': summary['total'],
+        f'{prefix}_min': summary['min'] if summary['count'] else None,
+        f'{prefix}_max': summary['max'] if summary['count'] else None
+    }
+
+def process_statement(pdf_file, output_stem, fmt='xlsx', parallel_text=None):
+    """Extract the amounts of one statement and export them next to output_stem (runs in a worker process)"""
+    started = time.monotonic()
+    with PdfDocument.from_path(pdf_file) as document:  # Opened once, shared by the text and table passes
+        # Method 1: Extract text and search for amounts
+        pdf_text_pages = read_pdf_text(document, parallel=parallel_text)
+        all_amounts = [
+            {'page': page_data['page'], 'amount': amount}
+            for page_data in pdf_text_pages
+            for amount in extract_amounts_from_text(page_data['text'])
+        ]
+
+        # Method 2: Extract tables and look for amount columns
+        failed_pages = []
+        dfs = read_pdf_tables(document.path(), document.page_count, failed_pages=failed_pages)
+        table_amounts = extract_table_amounts(dfs)
+        page_count = document.page_count
+
+    export_statement(output_stem, dfs, all_amounts, table_amounts, fmt)
+    return {
+        'pages': page_count,
+        'tables': len(dfs),
+        'table_failed_pages': ' '.join(f'{start}-{stop}' for start, stop in failed_pages),
+        **amount_stats(all_amounts, 'text'),
+        **amount_stats(table_amounts, 'table'),
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+def find_statements(inputs, recursive=False):
+    """Expand files, directories and glob patterns into a sorted list of PDF paths"""
+    found = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*.pdf') if recursive else os.path.join(pattern, '*.pdf')
+        for path in glob.glob(pattern, recursive=recursive):
+            if os.path.isfile(path) and path.lower().endswith('.pdf'):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+def output_stem(pdf_file, base_dir):
+    """Output name for a statement (without extension), unique for statements with the same name in different directories"""
+    relative = os.path.relpath(pdf_file, base_dir)
+    return os.path.splitext(relative)[0].replace(os.sep, '__').replace('..', '_')
+
+def file_fingerprint(pdf_file):
+    """Size and modification time, so a statement replaced since the last run is processed again"""
+    stat = os.stat(pdf_file)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def load_manifest(manifest_path):
+    """Latest checkpoint entry per statement; a line torn by an interrupted run is ignored"""
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry['file']] = entry
+    return entries
+
+def append_manifest(manifest, entry):
+    """Checkpoint one finished statement; flushed to disk so a crash loses at most this line"""
+    manifest.write(json.dumps(entry) + '\n')
+    manifest.flush()
+    os.fsync(manifest.fileno())
+
+def is_finished(entry, pdf_file, fmt, retry_failed):
+    """Whether a checkpoint entry lets this run skip the statement"""
+    if entry is None or {key: entry.get(key) for key in ['size', 'mtime']} != file_fingerprint(pdf_file):
+        return False
+    if entry.get('format', 'xlsx') != fmt:
+        return False
+    return entry['status'] == 'done' or (entry['status'] == 'failed' and not retry_failed)
+
+def write_summary(summary_path, entries):
+    """Write the consolidated summary (one row per statement) and return it as a DataFrame"""
+    summary = pd.DataFrame(entries).reindex(columns=SUMMARY_FIELDS)
+    # Failed statements have no counts; nullable integers keep the others from turning into floats
+    summary = summary.astype({field: 'Int64' for field in ['pages', 'tables', 'text_count', 'table_count']})
+    partial_path = summary_path + '.partial'
+    summary.to_csv(partial_path, index=False)
+    os.replace(partial_path, summary_path)
+    return summary
+
+def run_batch(pdf_files, output_dir, fmt='xlsx', workers=DEFAULT_WORKERS, resume=True, retry_failed=True):
+    """Process statements across a process pool, checkpointing each one in the manifest
+
+    Returns the latest manifest entry of every statement in pdf_files.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not resume and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    checkpoints = load_manifest(manifest_path)
+
+    base_dir = os.path.commonpath([os.path.dirname(path) for path in pdf_files]) if pdf_files else ''
+    pending = [path for path in pdf_files if not is_finished(checkpoints.get(path), path, fmt, retry_failed)]
+    print(f"{len(pdf_files)} statements, {len(pdf_files) - len(pending)} already processed, {len(pending)} to go")
+
+    finished = len(pdf_files) - len(pending)
+
+    def record(manifest, pdf_file, stem, fingerprint, stats=None, error=None):
+        nonlocal finished
+        entry = {
+            'file': pdf_file,
+            'status': 'failed' if error else 'done',
+            'output': None if error else export_path(stem, fmt),
+            'format': fmt,
+            'error': error,
+            **fingerprint,
+            **(stats or {})
+        }
+        append_manifest(manifest, entry)
+        checkpoints[pdf_file] = entry
+        finished += 1
+        label = f"failed: {error}" if error else f"{stats['text_count']} text / {stats['table_count']} table amounts ({stats['seconds']:.1f}s)"
+        print(f"[{finished}/{len(pdf_files)}] {os.path.relpath(pdf_file, base_dir)}: {label}")
+
+    jobs = {path: (os.path.join(output_dir, output_stem(path, base_dir)), file_fingerprint(path)) for path in pending}
+    with open(manifest_path, 'a', encoding='utf-8') as manifest:
+        if workers <= 1 or len(pending) <= 1:
+            # Serial runs keep the process pool for large documents' text
+            for pdf_file, (stem, fingerprint) in jobs.items():
+                try:
+                    record(manifest, pdf_file, stem, fingerprint, stats=process_statement(pdf_file, stem, fmt))
+                except Exception as e:
+                    record(manifest, pdf_file, stem, fingerprint, error=str(e))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            try:
+                # Statements are the unit of parallelism, so each one reads its pages serially
+                futures = {
+                    pool.submit(process_statement, pdf_file, stem, fmt, False): pdf_file
+                    for pdf_file, (stem, _) in jobs.items()
+                }
+                for future in as_completed(futures):
+                    pdf_file = futures[future]
+                    stem, fingerprint = jobs[pdf_file]
+                    try:
+                        record(manifest, pdf_file, stem, fingerprint, stats=future.result())
+                    except Exception as e:
+                        record(manifest, pdf_file, stem, fingerprint, error=str(e))
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    return [checkpoints[path] for path in pdf_files if path in checkpoints]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Extract amounts from PDF statements into Excel workbooks or Parquet/Arrow files, in parallel and resumably."
+    )
+    parser.add_argument('inputs', nargs='+', help="PDF files, directories or glob patterns (quote patterns to keep the shell from expanding them)")
+    parser.add_argument('-o', '--output-dir', default=DEFAULT_OUTPUT_DIR, help=f"Where the outputs, the manifest and the summary go (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('-f', '--format', default='xlsx', choices=EXPORT_FORMATS, help="Output per statement: an Excel workbook, or a directory of Parquet or Arrow IPC files (default: xlsx)")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS, help=f"Statements processed at the same time (default: {DEFAULT_WORKERS})")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories and ** patterns recursively")
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help="Ignore the manifest and process every statement again")
+    parser.add_argument('--skip-failed', dest='retry_failed', action='store_false', help="On resume, do not retry statements that failed before")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.format not in available_formats([args.format]):
+        print(f"Error: {args.format} output needs pyarrow (pip install pyarrow)")
+        return 1
+    pdf_files = find_statements(args.inputs, recursive=args.recursive)
+    if not pdf_files:
+        print(f"Error: no PDF files found in {', '.join(args.inputs)}")
+        return 1
+
+    try:
+        entries = run_batch(pdf_files, args.output_dir, fmt=args.format, workers=args.workers, resume=args.resume, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; run the same command again to resume from {os.path.join(args.output_dir, MANIFEST_NAME)}")
+        return 130
+
+    summary_path = os.path.join(args.output_dir, SUMMARY_NAME)
+    summary = write_summary(summary_path, entries)
+    done = summary[summary['status'] == 'done']
+
     print("\n=== SUMMARY ===")
-    print(f"Total amounts found in text: {len(all_amounts)}")
-    print(f"Total amounts found in tables: {len(table_amounts)}")
-    
-    if all_amounts:
-        print(f"Text amounts range: ${min(amt['amount'] for amt in all_amounts):,.2f} - ${max(amt['amount'] for amt in all_amounts):,.2f}")
-        print(f"Text amounts total: ${sum(amt['amount'] for amt in all_amounts):,.2f}")
-    
-    if table_amounts:
-        print(f"Table amounts range: ${min(amt['amount'] for amt in table_amounts):,.2f} - ${max(amt['amount'] for amt in table_amounts):,.2f}")
-        print(f"Table amounts total: ${sum(amt['amount'] for amt in table_amounts):,.2f}")
-    
-    # Save results to Excel
-    with pd.ExcelWriter("amounts_extracted.xlsx", engine='openpyxl') as writer:
-        # Save original tables
-        for i, df in enumerate(dfs):
-            sheet_name = f"Table_{i+1}"
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # Save text amounts
-        if all_amounts:
-            text_amounts_df = pd.DataFrame(all_amounts)
-            text_amounts_df.to_excel(writer, sheet_name="Text_Amounts", index=False)
-        
-        # Save table amounts
-        if table_amounts:
-            table_amounts_df = pd.DataFrame(table_amounts)
-            table_amounts_df.to_excel(writer, sheet_name="Table_Amounts", index=False)
-    
-    print("\nResults saved to: amounts_extracted.xlsx")
-    
-except Exception as e:
-    print(f"Error processing PDF: {e}")
-    exit(1)
\ No newline at end of file
+    print(f"Statements processed: {len(done)} of {len(summary)}")
+    print(f"Total amounts found in text: {int(done['text_count'].sum())}")
+    print(f"Total amounts found in tables: {int(done['table_count'].sum())}")
+    print(f"Text amounts total: ${done['text_total'].sum():,.2f}")
+    print(f"Table amounts total: ${done['table_total'].sum():,.2f}")
+    failed = summary[summary['status'] == 'failed']
+    if len(failed):
+        print(f"Failed statements: {len(failed)} (see {summary_path})")
+    print(f"\nResults saved to: {args.output_dir}")
+    return 1 if len(failed) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
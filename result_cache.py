@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+
+# Where processed results are stored and how much disk they may use
+CACHE_DIR = os.environ.get('PDF_ANALYZER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdf_analyzer_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('PDF_ANALYZER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+CACHE_SUFFIX = '.pkl.gz'
+
+
+def pdf_digest(pdf_bytes):
+    """Return the SHA-256 hex digest of the PDF contents"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def cache_key(digest, version, **settings):
+    """Build a cache key from the PDF digest, extractor version and settings"""
+    payload = json.dumps({'digest': digest, 'version': version, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of processed PDFs with LRU eviction
+
+    Entries are gzip-compressed pickles named after their key. Reading an
+    entry refreshes its modification time, so eviction removes the least
+    recently used entries first once the directory grows past max_bytes.
+
+    Because entries are unpickled, the directory must be private: it is
+    created with mode 0700, and a directory owned by another user or
+    writable by others is refused, which turns the cache off.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _private_directory(self):
+        """Create the cache directory if needed and check that only we can write to it"""
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            info = os.lstat(self.directory)
+        except OSError as e:
+            print(f"Result cache directory error: {e}")
+            return False
+        if not stat.S_ISDIR(info.st_mode):
+            print(f"Result cache disabled: {self.directory} is not a directory")
+            return False
+        if hasattr(os, 'geteuid') and info.st_uid != os.geteuid():
+            print(f"Result cache disabled: {self.directory} is owned by another user")
+            return False
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            print(f"Result cache disabled: {self.directory} is writable by other users")
+            return False
+        return True
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        if not self._private_directory():
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Corrupt or incompatible entry - drop it and treat as a miss
+            print(f"Result cache read error: {e}")
+            self.delete(key)
+            return None
+
+    def put(self, key, value):
+        """Store value under key and evict old entries if over the size cap"""
+        if not self._private_directory():
+            return
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=3) as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))  # Atomic, so readers never see partial entries
+        except Exception as e:
+            print(f"Result cache write error: {e}")
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+            return
+        self.evict()
+
+    def delete(self, key):
+        """Remove a single entry"""
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                return
+            for name in names:
+                if not name.endswith(CACHE_SUFFIX):
+                    continue
+                try:
+                    info = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, name))
+                total += info.st_size
+
+            entries.sort()
+            for mtime, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+# Shared by the Streamlit app and the FastAPI service
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,306 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+import tabula
+
+# Table extraction backend:
+#   'auto'       - with JPype installed, 'pool' when more than one analysis can run at once
+#                  and 'inprocess' otherwise; without JPype, 'subprocess'
+#   'inprocess'  - one warm JVM inside this process (via JPype), reused by every call;
+#                  calls are serialized, so concurrent analyses wait for each other's tables
+#   'pool'       - a small pool of long-lived worker processes, each with its own warm JVM
+#   'subprocess' - tabula's default: launch a new JVM for every call
+TABLE_BACKEND = os.environ.get('PDF_ANALYZER_TABLE_BACKEND', 'auto')
+# Pool workers; 0 means one per concurrent analysis (at least 2)
+TABLE_WORKERS = int(os.environ.get('PDF_ANALYZER_TABLE_WORKERS', 0))
+TABLE_TIMEOUT = float(os.environ.get('PDF_ANALYZER_TABLE_TIMEOUT', 300))
+
+# Documents are split into chunks of this many pages for table extraction
+TABLE_CHUNK_PAGES = int(os.environ.get('PDF_ANALYZER_TABLE_CHUNK_PAGES', 10))
+# How often a failed chunk is retried before its pages are reported as failed
+TABLE_CHUNK_RETRIES = int(os.environ.get('PDF_ANALYZER_TABLE_CHUNK_RETRIES', 1))
+
+TABLE_BACKENDS = ['auto', 'inprocess', 'pool', 'subprocess']
+
+
+def jpype_available():
+    """Check whether tabula can run tabula-java inside the Python process"""
+    try:
+        import jpype  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _blank_pdf():
+    """Return the bytes of a one-page blank PDF used to warm up the JVM"""
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _read_chunk(pdf_path, start, stop, force_subprocess):
+    """Extract the tables on pages start..stop (1-based, inclusive) with their page provenance
+
+    Returns (metadata, DataFrame) pairs. Every page is a separate tabula call:
+    tabula-java's JSON output carries no page numbers, so reading page by page
+    is the only way each table knows its exact page. The PDF is loaded once
+    per page; with the in-process and pool backends that costs a PDF parse,
+    with the subprocess backend a JVM start as well.
+    """
+    tables = []
+    for page in range(start, stop + 1):
+        dfs = tabula.read_pdf(pdf_path, pages=page, multiple_tables=True, force_subprocess=force_subprocess)
+        tables.extend(({'page': page, 'page_start': page, 'page_end': page}, df) for df in dfs)
+    return tables
+
+
+def page_chunks(page_count, chunk_pages=TABLE_CHUNK_PAGES):
+    """Split pages 1..page_count into (start, stop) ranges of at most chunk_pages pages"""
+    chunk_pages = max(1, chunk_pages)
+    return [(start, min(start + chunk_pages - 1, page_count)) for start in range(1, page_count + 1, chunk_pages)]
+
+
+def _warm_up_jvm():
+    """Start the JVM and load tabula-java by extracting from a blank page"""
+    tabula.read_pdf(io.BytesIO(_blank_pdf()), pages=1, multiple_tables=True, silent=True)
+    return os.getpid()
+
+
+def _ping():
+    """Health check run inside a pool worker"""
+    import jpype
+    return os.getpid(), jpype.isJVMStarted()
+
+
+class TableExtractor:
+    """Managed tabula backend that keeps a warm JVM alive across requests
+
+    In 'pool' mode workers are started once and reused; a crashed or hung
+    worker pool is torn down and restarted, and the failed call is retried
+    once on the fresh pool. The in-process JVM shares one tabula-java command
+    parser, so in-process calls are serialized; concurrency is the number of
+    analyses that may extract tables at the same time, and above 1 'auto'
+    picks the pool instead.
+    """
+
+    def __init__(self, backend=TABLE_BACKEND, workers=TABLE_WORKERS, timeout=TABLE_TIMEOUT, concurrency=1):
+        if backend not in TABLE_BACKENDS:
+            raise ValueError(f"Unknown table backend: {backend}")
+        if backend == 'auto':
+            if not jpype_available():
+                backend = 'subprocess'
+            else:
+                backend = 'pool' if concurrency > 1 else 'inprocess'
+        self.backend = backend
+        self.workers = max(1, workers or max(2, concurrency))
+        self.timeout = timeout
+        self.restarts = 0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._jvm_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: never fork a process that may already host a JVM or server threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_up_jvm
+                )
+            return self._pool
+
+    def _restart_pool(self, pool):
+        """Tear down a broken or hung pool; the next call starts a fresh one
+
+        Only the pool the caller used is torn down, so threads that hit the
+        same failure at once do not kill the pool another one just started.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.restarts += 1
+        # Kill workers that may be stuck inside the JVM before dropping the pool
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        """Run fn on the pool, retrying once on a fresh pool if the pool broke
+
+        ProcessPoolExecutor cannot tell which worker runs a call, so a call
+        that times out restarts the whole pool. Calls other analyses had in
+        flight on it then fail with BrokenProcessPool and are retried once
+        on the new pool.
+        """
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return pool.submit(fn, *args).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                if attempt:
+                    raise
+            except FutureTimeoutError:
+                self._restart_pool(pool)
+                raise
+
+    def _call(self, fn, *args):
+        """Run fn on the configured backend"""
+        if self.backend == 'pool':
+            return self._submit(fn, *args)
+        if self.backend == 'inprocess':
+            with self._jvm_lock:
+                return fn(*args)
+        return fn(*args)
+
+    def _read_chunk_with_retry(self, pdf_path, chunk):
+        start, stop = chunk
+        error = None
+        for attempt in range(TABLE_CHUNK_RETRIES + 1):
+            try:
+                return self._call(_read_chunk, pdf_path, start, stop, self.backend == 'subprocess')
+            except Exception as e:
+                error = e
+        print(f"Table extraction failed for pages {start}-{stop}: {error}")
+        return None
+
+    def iter_tables_chunked(self, pdf_path, page_count, chunk_pages=TABLE_CHUNK_PAGES, first_page=1, progress=None):
+        """Yield ((start, stop), tables) for each chunk of pages first_page..page_count, in page order
+
+        Chunks run concurrently where the backend allows and are yielded as
+        soon as they and every chunk before them are done. tables is a list of
+        (metadata, DataFrame) pairs, or None if the chunk still failed after
+        retrying. progress, if given, is called as progress(pages_done, page_count)
+        whenever a chunk finishes. Closing the generator early cancels the
+        chunks that have not started yet.
+        """
+        chunks = [(start + first_page - 1, stop + first_page - 1) for start, stop in page_chunks(page_count - first_page + 1, chunk_pages)]
+        if not chunks:
+            return
+
+        pages_done = [first_page - 1]
+        progress_lock = threading.Lock()
+
+        def read_chunk(chunk):
+            result = self._read_chunk_with_retry(pdf_path, chunk)
+            if progress:
+                with progress_lock:
+                    pages_done[0] += chunk[1] - chunk[0] + 1
+                    progress(pages_done[0], page_count)
+            return result
+
+        # The in-process JVM runs one call at a time; pool workers and subprocesses run side by side
+        concurrency = 1 if self.backend == 'inprocess' else min(self.workers, len(chunks))
+        threads = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            for chunk, result in zip(chunks, threads.map(read_chunk, chunks)):
+                yield chunk, result
+        finally:
+            threads.shutdown(wait=False, cancel_futures=True)
+
+    def read_tables_chunked(self, pdf_path, page_count, chunk_pages=TABLE_CHUNK_PAGES, failed_pages=None, progress=None):
+        """Extract tables chunk by chunk, running chunks concurrently where the backend allows
+
+        Tables come back in document order. Each DataFrame carries its
+        provenance in df.attrs: 'table' (global 1-based number), 'page',
+        'page_start' and 'page_end'. Chunks that still fail after retrying
+        are skipped and their (start, stop) ranges appended to failed_pages,
+        also when every chunk failed and RuntimeError is raised.
+        progress, if given, is called as progress(pages_done, page_count)
+        whenever a chunk finishes.
+        """
+        results = list(self.iter_tables_chunked(pdf_path, page_count, chunk_pages, progress=progress))
+        tables = []
+        failed = 0
+        for chunk, result in results:
+            if result is None:
+                failed += 1
+                if failed_pages is not None:
+                    failed_pages.append(chunk)
+                continue
+            for meta, df in result:
+                df.attrs.update(meta)
+                tables.append(df)
+
+        if results and failed == len(results):
+            raise RuntimeError(f"Table extraction failed for all {len(results)} page chunks")
+
+        for table_num, df in enumerate(tables, 1):
+            df.attrs['table'] = table_num
+        return tables
+
+    def warm_up(self):
+        """Start the JVM(s) ahead of the first request"""
+        try:
+            if self.backend == 'pool':
+                pool = self._get_pool()
+                futures = [pool.submit(_ping) for _ in range(self.workers)]
+                for future in futures:
+                    future.result(timeout=self.timeout)
+            elif self.backend == 'inprocess':
+                self._call(_warm_up_jvm)
+        except Exception as e:
+            print(f"Table backend warm-up error: {e}")
+
+    def health_check(self):
+        """Report whether the backend can serve requests, restarting a broken pool"""
+        status = {'backend': self.backend, 'workers': self.workers, 'restarts': self.restarts}
+        try:
+            if self.backend == 'pool':
+                self._submit(_ping)
+            elif self.backend == 'inprocess':
+                import jpype
+                if not jpype.isJVMStarted():
+                    self._call(_warm_up_jvm)
+                status['jvm_started'] = jpype.isJVMStarted()
+            status['healthy'] = True
+        except Exception as e:
+            status['healthy'] = False
+            status['error'] = str(e)
+        return status
+
+    def shutdown(self):
+        """Stop pool workers (the in-process JVM lives as long as the process)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_table_extractor(concurrency=1):
+    """Return the process-wide table extractor, creating it on first use
+
+    concurrency (analyses that may run at the same time) only matters for
+    the first call, which picks the backend.
+    """
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = TableExtractor(concurrency=concurrency)
+        return _extractor
+
+
+def read_pdf_tables(pdf_path, page_count=None, failed_pages=None, progress=None):
+    """Extract all tables from a PDF through the shared warm backend, in page chunks
+
+    See TableExtractor.read_tables_chunked for provenance, failed_pages and progress.
+    """
+    if page_count is None:
+        with open(pdf_path, 'rb') as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+    return get_table_extractor().read_tables_chunked(pdf_path, page_count, failed_pages=failed_pages, progress=progress)
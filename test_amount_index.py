@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+from amount_index import AmountIndex
+
+
+@pytest.fixture
+def index():
+    # Record numbers 0..6; record 3 is missing and left out of the index
+    return AmountIndex([50.0, 10.0, 200.0, math.nan, 10.0, 75.5, 200.0], pages=[1, 1, 2, 2, None, 3, 3])
+
+
+def test_missing_amounts_are_skipped(index):
+    assert len(index) == 6
+    assert index.total == pytest.approx(545.5)
+    assert index.summary() == {'count': 6, 'total': pytest.approx(545.5), 'average': pytest.approx(545.5 / 6), 'min': 10.0, 'max': 200.0}
+
+
+def test_between_is_inclusive_on_both_ends(index):
+    assert index.between(10, 75.5) == (4, pytest.approx(145.5))
+    assert index.between(11, 74) == (1, pytest.approx(50.0))
+    assert index.between(300, 400) == (0, 0.0)
+
+
+def test_above_and_below_are_strict(index):
+    assert index.above(75.5) == (2, pytest.approx(400.0))
+    assert index.below(50) == (2, pytest.approx(20.0))
+    assert index.above(1000) == (0, 0.0)
+    assert index.below(0) == (0, 0.0)
+
+
+def test_top_keeps_ties_in_record_order(index):
+    records, values = index.top(3)
+    assert records.tolist() == [2, 6, 5]
+    assert values.tolist() == [200.0, 200.0, 75.5]
+
+
+def test_top_clamps_k(index):
+    records, _ = index.top(100)
+    assert len(records) == 6
+    records, _ = index.top(-1)
+    assert len(records) == 0
+
+
+def test_argmax_argmin_and_pages(index):
+    assert index.argmax() == 2
+    assert index.argmin() == 1
+    assert index.page(5) == 3
+    assert index.page(4) is None
+
+
+def test_scaled_keeps_order_and_scales_totals(index):
+    scaled = index.scaled(2.0)
+    assert scaled.total == pytest.approx(1091.0)
+    assert scaled.between(20, 151) == (4, pytest.approx(291.0))
+    assert scaled.top(1)[0].tolist() == [2]
+
+
+def test_empty_index():
+    index = AmountIndex([])
+    assert len(index) == 0
+    assert index.total == 0.0
+    assert index.mean == 0.0
+    assert index.between(0, 10) == (0, 0.0)
+    assert len(index.top(5)[0]) == 0
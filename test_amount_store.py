@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from amount_index import AmountIndex
+from amount_store import MAX_AMOUNT, AmountStore, exact_sum, minor_units
+
+
+def test_totals_are_exact_in_minor_units():
+    store = AmountStore.from_columns([0.1] * 10 + [0.2] * 10)
+    assert store.minor.tolist() == [10] * 10 + [20] * 10
+    assert store.total == 3.0
+    assert store.summary() == {'count': 20, 'total': 3.0, 'average': 0.15, 'min': 0.1, 'max': 0.2}
+
+
+def test_yen_has_no_minor_unit():
+    assert minor_units('JPY') == 1 and minor_units('INR') == 100 and minor_units() == 100
+    store = AmountStore.from_columns([1500, 2500.4], currency='JPY')
+    assert store.minor.tolist() == [1500, 2500]
+    assert store.total == 4000
+    # 9e15 yen fits in int64 as whole yen
+    assert AmountStore.from_columns([9e15], currency='JPY').minor.tolist() == [9 * 10 ** 15]
+
+
+def test_index_uses_the_store_currency():
+    index = AmountIndex.from_store(AmountStore.from_columns([300, 100, 200], currency='JPY'))
+    assert index.between(100, 200) == (2, 300.0)
+    assert index.top(1)[1].tolist() == [300.0]
+
+
+def test_out_of_range_amounts_are_counted_and_reported(capsys):
+    store = AmountStore.from_columns([12.5, MAX_AMOUNT, -MAX_AMOUNT * 10, math.nan], page=[1, 2, 3, 4])
+    assert store.minor.tolist() == [1250]
+    assert store.page.tolist() == [1]
+    assert store.out_of_range == 2
+    assert 'Left out 2 amounts' in capsys.readouterr().out
+    combined = AmountStore.concat([store, AmountStore.from_columns([MAX_AMOUNT]), AmountStore.empty()])
+    assert combined.out_of_range == 3 and len(combined) == 1
+
+
+def test_records_round_trip_with_unknown_fields():
+    records = [
+        {'page': 1, 'amount': 10.0, 'source': 'text'},
+        {'table': 1, 'page': 2, 'column': 'Debit', 'row': 3, 'date': '2024-01-05', 'amount': 2.5, 'source': 'table'}
+    ]
+    store = AmountStore.from_records(records)
+    assert store.fields == ['table', 'page', 'column', 'row', 'date', 'amount', 'source']
+    assert store.records() == [
+        {'table': None, 'page': 1, 'column': None, 'row': None, 'date': None, 'amount': 10.0, 'source': 'text'},
+        {'table': 1, 'page': 2, 'column': 'Debit', 'row': 3, 'date': '2024-01-05', 'amount': 2.5, 'source': 'table'}
+    ]
+    frame = store.to_frame()
+    assert pd.isna(frame['table'][0]) and pd.isna(frame['column'][0])
+
+
+def test_concat_keeps_fields_and_rejects_mixed_currencies():
+    text = AmountStore.from_records([{'page': 1, 'amount': 1.0}], source='text', currency='INR')
+    table = AmountStore.from_records([{'table': 1, 'amount': 2.0}], source='table', currency='INR')
+    combined = AmountStore.concat([text, table])
+    assert combined.currency == 'INR'
+    assert combined.table.tolist() == [0, 1] and combined.page.tolist() == [1, 0]
+    assert combined.source.tolist() == [0, 1]
+    assert AmountStore.concat([], currency='JPY').currency == 'JPY'
+    with pytest.raises(ValueError):
+        AmountStore.concat([text, AmountStore.from_columns([5], currency='JPY')])
+
+
+def test_exact_sum_does_not_overflow():
+    minor = np.array([2 ** 62, 2 ** 62, 2 ** 62], dtype=np.int64)
+    assert exact_sum(minor) == 3 * 2 ** 62
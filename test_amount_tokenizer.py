@@ -0,0 +1,88 @@
+import pandas as pd
+
+from amount_tokenizer import AMOUNT_CELL_RE, CURRENCY_MARKERS, tokenize_amounts
+
+
+def amounts(text, **kwargs):
+    """Return (amount, currency, raw_text) for every token in text"""
+    return [(amount, currency, raw) for amount, currency, raw, _, _ in tokenize_amounts(text, **kwargs)]
+
+
+def test_currency_prefix():
+    assert amounts('Paid ₹1,234.56 today') == [(1234.56, 'INR', '₹1,234.56')]
+    assert amounts('$ 99.95') == [(99.95, 'USD', '$ 99.95')]
+    assert amounts('USD 1,234.56') == [(1234.56, 'USD', 'USD 1,234.56')]
+    assert amounts('Rs. 500.00') == [(500.0, 'INR', 'Rs. 500.00')]
+
+
+def test_currency_suffix():
+    assert amounts('1,234.56 INR') == [(1234.56, 'INR', '1,234.56 INR')]
+    assert amounts('1,234.56₹') == [(1234.56, 'INR', '1,234.56₹')]
+    assert amounts('250.00 EUR') == [(250.0, 'EUR', '250.00 EUR')]
+
+
+def test_currency_code_without_space():
+    assert amounts('INR1,234.56') == [(1234.56, 'INR', 'INR1,234.56')]
+    assert amounts('USD1,234.56') == [(1234.56, 'USD', 'USD1,234.56')]
+    assert amounts('Rs500') == [(500.0, 'INR', 'Rs500')]
+
+
+def test_currency_code_with_dot_and_no_space():
+    assert amounts('Rs.500') == [(500.0, 'INR', 'Rs.500')]
+    assert amounts('Rs.500.00') == [(500.0, 'INR', 'Rs.500.00')]
+    assert amounts('Rs.1,234.56') == [(1234.56, 'INR', 'Rs.1,234.56')]
+    assert amounts('INR.500') == [(500.0, 'INR', 'INR.500')]
+    assert amounts('INR.1,234.56') == [(1234.56, 'INR', 'INR.1,234.56')]
+
+
+def test_cell_pattern_matches_dotted_prefix():
+    matches = pd.Series(['Rs.1,234.56', 'INR.500']).str.extract(AMOUNT_CELL_RE)
+    assert matches['raw_text'].tolist() == ['Rs.1,234.56', 'INR.500']
+    assert matches['prefix'].str.upper().map(CURRENCY_MARKERS).tolist() == ['INR', 'INR']
+
+
+def test_currency_code_inside_word_is_ignored():
+    assert amounts('rsvp 10') == [(10.0, None, '10')]
+    assert amounts('USDT 5') == [(5.0, None, '5')]
+
+
+def test_suffix_not_taken_from_next_amount():
+    assert amounts('10.00 INR 20.00') == [(10.0, None, '10.00'), (20.0, 'INR', 'INR 20.00')]
+
+
+def test_lakh_and_crore_grouping():
+    assert amounts('1,23,456.78') == [(123456.78, None, '1,23,456.78')]
+    assert amounts('₹12,34,56,789.00') == [(123456789.0, 'INR', '₹12,34,56,789.00')]
+
+
+def test_thousands_grouping_and_plain_numbers():
+    assert amounts('1,234,567.89') == [(1234567.89, None, '1,234,567.89')]
+    assert amounts('1234.5') == [(1234.5, None, '1234.5')]
+    assert amounts('1,234') == [(1234.0, None, '1,234')]
+    assert amounts('12.345') == [(12.345, None, '12.345')]
+
+
+def test_number_after_a_decimal_point_is_not_restarted():
+    assert amounts('1.5.6') == [(1.5, None, '1.5')]
+
+
+def test_dates_are_split_and_dropped_with_require_decimals():
+    assert amounts('12/03/2024') == [(12.0, None, '12'), (3.0, None, '03'), (2024.0, None, '2024')]
+    assert amounts('Date 12-03-2024 amount 45.00', require_decimals=True) == [(45.0, None, '45.00')]
+
+
+def test_account_numbers_stay_whole():
+    text = 'A/c No. 123456789012 balance 1,000.50'
+    assert amounts(text) == [(123456789012.0, None, '123456789012'), (1000.5, None, '1,000.50')]
+    assert amounts(text, require_decimals=True) == [(1000.5, None, '1,000.50')]
+
+
+def test_zero_and_empty():
+    assert amounts('0.00') == []
+    assert amounts('') == []
+    assert amounts(None) == []
+
+
+def test_spans():
+    ((_, _, raw, start, end),) = tokenize_amounts('Total: $12.50')
+    assert 'Total: $12.50'[start:end] == raw
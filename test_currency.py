@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import currency
+from currency import CURRENCY_RATES, RateHistory
+
+
+@pytest.fixture
+def history():
+    return RateHistory.from_frame(pd.DataFrame({
+        'date': ['2024-01-01', '2024-01-01', '2024-02-01', '2024-03-01'],
+        'currency': ['USD', 'EUR', 'USD', 'EUR'],
+        'rate': [0.0120, 0.0110, 0.0125, 0.0115]
+    }))
+
+
+def test_long_and_wide_files_give_the_same_rates(history):
+    wide = RateHistory.from_frame(pd.DataFrame({
+        'Date': ['2024-03-01', '2024-01-01', '2024-02-01'],
+        'USD': [None, 0.0120, 0.0125],
+        'EUR': [0.0115, 0.0110, None]
+    }))
+    dates = ['2024-01-15', '2024-02-15', '2024-03-15']
+    for code in ['USD', 'EUR', 'INR', 'GBP']:
+        assert wide.factors(dates, 'INR', code) == pytest.approx(history.factors(dates, 'INR', code))
+
+
+def test_rates_are_as_of_the_date(history):
+    factors = history.factors(['2023-12-01', '2024-01-31', '2024-02-01', '15/03/2024', None], 'INR', 'USD')
+    # Before the first row: first row; gaps: last known rate; no date: latest
+    assert factors == pytest.approx([0.0120, 0.0120, 0.0125, 0.0125, 0.0125])
+
+
+def test_missing_currencies_keep_static_rates(history):
+    latest = history.latest()
+    assert latest['INR'] == 1.0
+    assert latest['GBP'] == CURRENCY_RATES['GBP']
+    assert latest['EUR'] == pytest.approx(0.0115)
+
+
+def test_convert_mixed_source_currencies(history):
+    amounts = pd.Series([100.0, 100.0, 1000.0])
+    converted = history.convert(amounts, ['2024-01-10', '2024-02-10', '2024-02-10'], np.array(['USD', 'EUR', 'INR']), 'INR')
+    assert converted.tolist() == pytest.approx([100 / 0.0120, 100 / 0.0110, 1000.0])
+    with pytest.raises(KeyError):
+        history.factors(['2024-01-10'], np.array(['XYZ']), 'INR')
+
+
+def test_history_without_dates_is_rejected():
+    with pytest.raises(ValueError):
+        RateHistory.from_frame(pd.DataFrame({'date': ['not a date'], 'USD': [0.012]}))
+
+
+def test_missing_history_file_is_reported_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(currency, 'RATE_HISTORY_FILE', str(tmp_path / 'exchange_rates.csv'))
+    monkeypatch.setattr(currency, '_rate_history', None)
+    monkeypatch.setattr(currency, '_rate_history_loaded', False)
+    assert currency.get_rate_history() is None
+    assert currency.get_rate_history() is None
+    assert capsys.readouterr().out.count('No exchange rate history') == 1
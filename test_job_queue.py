@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from job_queue import SCHEMA, JobQueue
+from pdf_document import PdfDocument
+
+
+def make_queue(tmp_path, handler=None, **kwargs):
+    return JobQueue(handler or (lambda pdf_path, params, progress: None), directory=str(tmp_path / 'jobs'), **kwargs)
+
+
+def submit(queue, data=b'%PDF-1.4 statement'):
+    return queue.submit(PdfDocument(data, name='statement.pdf'), {'currency': 'USD'})
+
+
+def test_job_runs_to_done_with_progress(tmp_path):
+    finished = threading.Event()
+
+    def handler(pdf_path, params, progress):
+        with open(pdf_path, 'rb') as f:
+            data = f.read()
+        progress('text', 1, 1)
+        return {'size': len(data), 'params': params}
+
+    queue = make_queue(tmp_path, handler)
+    job_id = submit(queue)
+    original_finish = queue._finish
+    queue._finish = lambda *args, **kwargs: (original_finish(*args, **kwargs), finished.set())
+    queue.start()
+    try:
+        assert finished.wait(10)
+    finally:
+        queue.stop()
+
+    job = queue.get(job_id)
+    assert job['status'] == 'done' and job['attempts'] == 1
+    assert job['progress'] == {'text': {'done': 1, 'total': 1}}
+    assert queue.result(job_id) == {'size': 18, 'params': {'currency': 'USD', 'filename': 'statement.pdf'}}
+    assert not os.path.exists(queue._pdf_path(job_id))
+    assert os.stat(queue.directory).st_mode & 0o777 == 0o700
+
+
+def test_recover_requeues_jobs_of_an_earlier_process_with_our_pid(tmp_path):
+    earlier = make_queue(tmp_path)
+    job_id = submit(earlier)
+    assert earlier._claim()[0] == job_id
+
+    # Same pid, new run (a restarted container): the job is orphaned
+    restarted = make_queue(tmp_path)
+    restarted.recover()
+    assert restarted.get(job_id)['status'] == 'queued'
+
+
+def test_recover_keeps_jobs_of_this_run(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = submit(queue)
+    queue._claim()
+    queue.recover()
+    assert queue.get(job_id)['status'] == 'running'
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    job_id = submit(make_queue(tmp_path))
+    for attempt in range(2):
+        queue = make_queue(tmp_path, max_attempts=2)
+        queue.recover()
+        assert queue._claim()[0] == job_id  # The worker then dies mid-job
+
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.recover()
+    job = queue.get(job_id)
+    assert job['status'] == 'failed' and job['attempts'] == 2
+    assert not os.path.exists(queue._pdf_path(job_id))
+
+
+def test_old_database_is_migrated(tmp_path):
+    directory = tmp_path / 'jobs'
+    directory.mkdir(mode=0o700)
+    old_schema = SCHEMA.replace('    worker_token TEXT,\n', '').replace('    attempts INTEGER NOT NULL DEFAULT 0,\n', '')
+    with sqlite3.connect(str(directory / 'jobs.sqlite3')) as connection:
+        connection.execute(old_schema)
+        connection.execute("INSERT INTO jobs (id, status, worker_pid) VALUES ('old', 'running', NULL)")
+
+    queue = make_queue(tmp_path)
+    queue.recover()
+    assert queue.get('old')['status'] == 'queued'
+    assert queue.get('old')['attempts'] == 0
+
+
+def test_refuses_directory_writable_by_others(tmp_path):
+    directory = tmp_path / 'jobs'
+    directory.mkdir()
+    os.chmod(directory, 0o777)
+    with pytest.raises(PermissionError):
+        submit(make_queue(tmp_path))
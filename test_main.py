@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    """The API with analysis stubbed out, recording how many batch documents ran at once"""
+    running = {'now': 0, 'peak': 0, 'peak_in_flight': 0}
+    lock = threading.Lock()
+
+    def analyze_upload(source, filename, digest, source_currency, display_currency):
+        with lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+            running['peak_in_flight'] = max(running['peak_in_flight'], main._analyses_in_flight)
+        time.sleep(0.05)
+        with lock:
+            running['now'] -= 1
+        metrics = {'count': 1, 'total': 10.0, 'avg': 10.0, 'max': 10.0, 'min': 10.0}
+        return {'success': True, 'amounts': [{'amount': 10.0}], 'metrics': metrics, 'cr_dr_analysis': None,
+                'page_count': 1, 'display_currency': display_currency}
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(main, 'analyze_upload', analyze_upload)
+    monkeypatch.setattr(main, '_analysis_executor', executor)
+    monkeypatch.setattr(main, 'BATCH_WORKERS', 3)
+    yield running
+    executor.shutdown()
+    assert main._analyses_in_flight == 0
+
+
+def post_batch(count):
+    files = [('files', (f'statement{i}.pdf', b'%PDF-1.4', 'application/pdf')) for i in range(count)]
+    return TestClient(main.app).post('/analyze/batch', files=files)
+
+
+def test_batch_runs_documents_side_by_side_when_admission_has_room(batch_server, monkeypatch):
+    monkeypatch.setattr(main, 'ANALYSIS_WORKERS', 4)
+    monkeypatch.setattr(main, 'ANALYSIS_QUEUE_SIZE', 0)
+    response = post_batch(5)
+    assert response.status_code == 200
+    assert response.json()['summary']['succeeded'] == 5
+    assert batch_server['peak'] == 3
+    assert batch_server['peak_in_flight'] == 3
+
+
+def test_batch_never_runs_past_the_admission_limit(batch_server, monkeypatch):
+    monkeypatch.setattr(main, 'ANALYSIS_WORKERS', 2)
+    monkeypatch.setattr(main, 'ANALYSIS_QUEUE_SIZE', 0)
+    busy = main.AnalysisSlot()  # Another request is analyzing; the batch takes the last place
+    try:
+        response = post_batch(4)
+    finally:
+        busy.release()
+    assert response.status_code == 200
+    assert batch_server['peak'] == 1
+    assert batch_server['peak_in_flight'] == 2
+
+
+def test_reserve_analysis_slots_stops_at_the_limit(monkeypatch):
+    monkeypatch.setattr(main, 'ANALYSIS_WORKERS', 2)
+    monkeypatch.setattr(main, 'ANALYSIS_QUEUE_SIZE', 1)
+    slots = main.reserve_analysis_slots(5)
+    assert len(slots) == 3 and main.analysis_busy()
+    for slot in slots:
+        slot.release()
+    assert main.reserve_analysis_slots(0) == []
+    assert main._analyses_in_flight == 0
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from result_cache import CACHE_SUFFIX, ResultCache, cache_key
+
+
+def make_cache(tmp_path, max_bytes=1024 * 1024):
+    return ResultCache(str(tmp_path / 'cache'), max_bytes=max_bytes)
+
+
+def test_round_trip_and_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get('missing') is None
+    cache.put('key', {'amounts': [1.5, 2.5]})
+    assert cache.get('key') == {'amounts': [1.5, 2.5]}
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = make_cache(tmp_path)
+    payload = os.urandom(4000)  # Incompressible, so every entry has about the same size
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, payload)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    size = os.path.getsize(cache._path('a'))
+
+    cache.get('a')  # Refreshes a, so b is now the oldest
+    cache.max_bytes = 2 * size
+    cache.evict()
+
+    assert cache.get('b') is None
+    assert cache.get('a') == payload
+    assert cache.get('c') == payload
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('key', 'value')
+    with open(cache._path('key'), 'wb') as f:
+        f.write(b'not gzip')
+    assert cache.get('key') is None
+    assert not os.path.exists(cache._path('key'))
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('key', threading.Lock())  # Locks cannot be pickled
+    assert cache.get('key') is None
+    assert os.listdir(cache.directory) == []
+
+
+def test_refuses_directory_writable_by_others(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('key', 'value')
+    os.chmod(cache.directory, 0o777)
+    assert cache.get('key') is None
+    cache.put('other', 'value')
+    assert not os.path.exists(os.path.join(cache.directory, 'other' + CACHE_SUFFIX))
+
+
+def test_key_depends_on_every_setting():
+    key = cache_key('digest', '5', pipeline='api', table_backend='pool')
+    assert key == cache_key('digest', '5', table_backend='pool', pipeline='api')
+    assert key != cache_key('digest', '5', pipeline='api', table_backend='inprocess')
+    assert key != cache_key('digest', '6', pipeline='api', table_backend='pool')
+    assert key != cache_key('other', '5', pipeline='api', table_backend='pool')
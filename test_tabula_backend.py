@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from tabula_backend import TableExtractor, page_chunks
+
+
+class FakePool:
+    def __init__(self):
+        self._processes = {}
+        self.shut_down = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_page_chunks():
+    assert page_chunks(25, 10) == [(1, 10), (11, 20), (21, 25)]
+    assert page_chunks(3, 0) == [(1, 1), (2, 2), (3, 3)]
+    assert page_chunks(0, 10) == []
+
+
+def test_restart_only_tears_down_the_pool_that_failed():
+    extractor = TableExtractor(backend='pool', workers=2)
+    broken, fresh = FakePool(), FakePool()
+    extractor._pool = broken
+    extractor._restart_pool(broken)
+    assert extractor._pool is None and broken.shut_down
+    assert extractor.restarts == 1
+
+    # A second thread reporting the same broken pool must not kill its replacement
+    extractor._pool = fresh
+    extractor._restart_pool(broken)
+    assert extractor._pool is fresh and not fresh.shut_down
+    assert extractor.restarts == 1
+
+
+def test_auto_backend_follows_concurrency(monkeypatch):
+    monkeypatch.setattr('tabula_backend.jpype_available', lambda: True)
+    assert TableExtractor(backend='auto').backend == 'inprocess'
+    pool = TableExtractor(backend='auto', workers=0, concurrency=5)
+    assert pool.backend == 'pool' and pool.workers == 5
+    monkeypatch.setattr('tabula_backend.jpype_available', lambda: False)
+    assert TableExtractor(backend='auto', concurrency=5).backend == 'subprocess'
+
+
+def test_tables_carry_their_page(monkeypatch):
+    def read_pdf(pdf_path, pages, multiple_tables, force_subprocess):
+        return [pd.DataFrame({'amount': [pages]})] if pages % 2 else []
+    monkeypatch.setattr('tabula.read_pdf', read_pdf)
+    tables = TableExtractor(backend='inprocess').read_tables_chunked('statement.pdf', 5, chunk_pages=2)
+    assert [(df.attrs['table'], df.attrs['page']) for df in tables] == [(1, 1), (2, 3), (3, 5)]
+
+
+def test_failed_chunks_are_reported_even_when_all_fail(monkeypatch):
+    def read_pdf(*args, **kwargs):
+        raise OSError('tabula crashed')
+    monkeypatch.setattr('tabula.read_pdf', read_pdf)
+    failed_pages = []
+    with pytest.raises(RuntimeError):
+        TableExtractor(backend='inprocess').read_tables_chunked('statement.pdf', 3, chunk_pages=2, failed_pages=failed_pages)
+    assert failed_pages == [(1, 2), (3, 3)]
@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from upload_stream import FIELD_MAX_BYTES, DocumentSpool, UploadError, UploadTooLarge, read_upload_form
+
+BOUNDARY = 'statementboundary'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+PDF = b'%PDF-1.4 ' + bytes(range(256)) * 8
+LIMITS = {'.pdf': 100_000}
+
+
+def body(*parts):
+    """Build a multipart body from (name, filename or None, bytes) parts"""
+    out = b''
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        out += f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + data + b'\r\n'
+    return out + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def read(data, chunk_size=100, content_type=CONTENT_TYPE, max_bytes=1_000_000, file_limits=LIMITS, memory_bytes=1_000_000, max_files=1):
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+    return asyncio.run(read_upload_form(chunks(), content_type, max_bytes, file_limits, memory_bytes, max_files))
+
+
+def test_fields_and_file_arrive_in_small_chunks():
+    fields, files = read(body(('currency', None, b'EUR'), ('file', 'statement.pdf', PDF)), chunk_size=7)
+    assert fields == {'currency': 'EUR'}
+    [(field, filename, document)] = files
+    with document:
+        assert (field, filename) == ('file', 'statement.pdf')
+        assert document.data == PDF
+        assert document.digest == hashlib.sha256(PDF).hexdigest()
+
+
+def test_large_file_is_spooled_to_disk():
+    _, [(_, _, document)] = read(body(('file', 'statement.pdf', PDF)), memory_bytes=100)
+    path = document.path()
+    assert os.path.exists(path)
+    assert document.data == PDF
+    document.close()
+    assert not os.path.exists(path)
+
+
+def test_unknown_suffix_is_skipped():
+    _, files = read(body(('file', 'notes.txt', b'hello')))
+    assert files == [('file', 'notes.txt', None)]
+
+
+def test_body_over_limit_is_rejected():
+    with pytest.raises(UploadTooLarge):
+        read(body(('file', 'statement.pdf', PDF)), max_bytes=1000)
+
+
+def test_file_over_its_limit_is_rejected():
+    with pytest.raises(UploadTooLarge):
+        read(body(('file', 'statement.pdf', PDF)), file_limits={'.pdf': 1000})
+
+
+def test_too_many_files_are_rejected():
+    with pytest.raises(UploadTooLarge):
+        read(body(('file', 'a.pdf', PDF), ('file', 'b.pdf', PDF)))
+
+
+def test_long_field_is_rejected():
+    with pytest.raises(UploadTooLarge):
+        read(body(('currency', None, b'x' * (FIELD_MAX_BYTES + 1))))
+
+
+def test_not_multipart_is_rejected():
+    with pytest.raises(UploadError):
+        read(b'{}', content_type='application/json')
+
+
+def test_spool_discard_removes_temp_file():
+    spool = DocumentSpool('statement.pdf', memory_bytes=10)
+    spool.write(PDF)
+    path = spool._spool.name
+    spool.discard()
+    assert not os.path.exists(path)
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+
+from pdf_document import PdfDocument
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    import multipart
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+# Largest accepted value of a plain (non-file) form field
+FIELD_MAX_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """A request body that is not a usable multipart upload"""
+
+
+class UploadTooLarge(UploadError):
+    """An upload, or one file in it, is over its size limit"""
+
+    def __init__(self, limit, message=None):
+        super().__init__(message or f"Upload exceeds the limit of {limit:,} bytes")
+        self.limit = limit
+
+
+class DocumentSpool:
+    """Build a PdfDocument from chunks as they arrive, hashing them on the way
+
+    Up to memory_bytes stay in memory; once the document grows past that it
+    moves to a temporary file owned by the document. Going over max_bytes
+    raises UploadTooLarge. write() may block on disk, so async callers run it
+    on an executor.
+    """
+
+    def __init__(self, name, memory_bytes, max_bytes=None):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._spool = None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self._digest.update(chunk)
+        if self._spool is None and self.size > self.memory_bytes:
+            self._spool = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+            self._spool.write(self._buffer.getvalue())
+            self._buffer = None
+        (self._spool or self._buffer).write(chunk)
+
+    def finish(self):
+        """Return the finished PdfDocument (the caller closes it)"""
+        if self._spool is None:
+            return PdfDocument(self._buffer.getvalue(), name=self.name, digest=self._digest.hexdigest())
+        self._spool.close()
+        return PdfDocument.from_path(self._spool.name, name=self.name, digest=self._digest.hexdigest(), owns_path=True)
+
+    def discard(self):
+        """Drop what was written so far"""
+        if self._spool is not None:
+            self._spool.close()
+            try:
+                os.unlink(self._spool.name)
+            except FileNotFoundError:
+                pass
+            self._spool = None
+        self._buffer = None
+
+
+class _FormParser:
+    """python-multipart callbacks collecting fields and spooling files"""
+
+    def __init__(self, file_limits, memory_bytes, max_files):
+        self.file_limits = file_limits
+        self.memory_bytes = memory_bytes
+        self.max_files = max_files
+        self.fields = {}
+        self.files = []
+        self.spools = []
+        self.pending = []  # (spool, data) writes left for the event loop to hand to an executor
+        self._header_name = b''
+        self._header_value = b''
+        self._disposition = b''
+        self._part = None
+
+    def on_part_begin(self):
+        self._disposition = b''
+        self._part = None
+
+    def on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b'content-disposition':
+            self._disposition = self._header_value
+        self._header_name = b''
+        self._header_value = b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b'name' not in options:
+            raise UploadError('Every form part needs a Content-Disposition name')
+        name = options[b'name'].decode('utf-8', 'replace')
+        if b'filename' not in options:
+            self._part = {'name': name, 'data': bytearray(), 'spool': None}
+            return
+
+        if len(self.files) >= self.max_files:
+            raise UploadTooLarge(self.max_files, f"Upload exceeds the limit of {self.max_files} files")
+        filename = options[b'filename'].decode('utf-8', 'replace')
+        limit = self.file_limits.get(os.path.splitext(filename)[1].lower())
+        spool = None
+        if limit is not None:
+            spool = DocumentSpool(filename, self.memory_bytes, max_bytes=limit)
+            self.spools.append(spool)
+        self._part = {'name': name, 'filename': filename, 'spool': spool}
+        self.files.append(self._part)
+
+    def on_part_data(self, data, start, end):
+        part = self._part
+        if 'filename' not in part:
+            part['data'] += data[start:end]
+            if len(part['data']) > FIELD_MAX_BYTES:
+                raise UploadTooLarge(FIELD_MAX_BYTES, f"Form field {part['name']} is too long")
+        elif part['spool'] is not None:
+            self.pending.append((part['spool'], data[start:end]))
+
+    def on_part_end(self):
+        part = self._part
+        if 'filename' not in part:
+            self.fields[part['name']] = part['data'].decode('utf-8', 'replace')
+
+
+async def read_upload_form(chunks, content_type, max_bytes, file_limits, memory_bytes, max_files=1):
+    """Parse a multipart/form-data body from an async iterator of chunks while it arrives
+
+    Files are hashed and spooled (in memory up to memory_bytes, then on
+    disk) as their bytes come in, and the body is rejected with
+    UploadTooLarge as soon as it passes max_bytes or a file passes its limit,
+    whether or not a Content-Length was sent. file_limits maps lower-case
+    file suffixes to per-file size limits; files with any other suffix are
+    read past without being stored.
+
+    Returns (fields, files): fields maps form field names to strings and
+    files lists (field name, filename, PdfDocument or None) in body order.
+    The caller closes the documents.
+    """
+    _, params = parse_options_header(content_type or '')
+    boundary = params.get(b'boundary')
+    if not (content_type or '').lower().startswith('multipart/form-data') or not boundary:
+        raise UploadError('Expected a multipart/form-data upload')
+
+    loop = asyncio.get_running_loop()
+    form = _FormParser(file_limits, memory_bytes, max_files)
+    parser = multipart.MultipartParser(boundary, {
+        'on_part_begin': form.on_part_begin,
+        'on_part_data': form.on_part_data,
+        'on_part_end': form.on_part_end,
+        'on_header_field': form.on_header_field,
+        'on_header_value': form.on_header_value,
+        'on_header_end': form.on_header_end,
+        'on_headers_finished': form.on_headers_finished,
+    })
+    received = 0
+    try:
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            parser.write(chunk)
+            for spool, data in form.pending:
+                await loop.run_in_executor(None, spool.write, data)
+            form.pending.clear()
+        parser.finalize()
+        files = [(part['name'], part['filename'], part['spool'] and part['spool'].finish()) for part in form.files]
+    except BaseException as e:
+        for spool in form.spools:
+            spool.discard()
+        if isinstance(e, FormParserError):
+            raise UploadError('Invalid multipart upload') from e
+        raise
+    return form.fields, files